@@ -0,0 +1,59 @@
+import math
+import threading
+import time
+
+import requests
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+
+def ejecutar(url_base, escenario, peticiones=200, concurrencia=8):
+    # Lanza `peticiones` llamadas del escenario repartidas entre `concurrencia`
+    # hilos, cada uno con su propia conexión keep-alive. El escenario recibe la
+    # sesión HTTP y la URL base y devuelve la respuesta de la petición medida.
+    duraciones = []
+    errores = []
+    siguiente = iter(range(peticiones))
+    lock = threading.Lock()
+
+    def trabajador():
+        sesion = requests.Session()
+        while True:
+            with lock:
+                if next(siguiente, None) is None:
+                    return
+            inicio = time.perf_counter()
+            try:
+                respuesta = escenario(sesion, url_base)
+                ok = respuesta.status_code < 400
+            except requests.RequestException as e:
+                respuesta, ok = e, False
+            duracion = time.perf_counter() - inicio
+            with lock:
+                duraciones.append(duracion)
+                if not ok:
+                    errores.append(getattr(respuesta, "status_code", str(respuesta)))
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+
+    duraciones.sort()
+    return {
+        "peticiones": len(duraciones),
+        "errores": len(errores),
+        "estados_error": sorted({str(e) for e in errores}),
+        "rps": round(len(duraciones) / total, 1) if total else 0.0,
+        "p50_ms": round(percentil(duraciones, 50) * 1000, 2),
+        "p95_ms": round(percentil(duraciones, 95) * 1000, 2),
+        "p99_ms": round(percentil(duraciones, 99) * 1000, 2),
+    }
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# Benchmark de la API: siembra una base local con datos sintéticos, levanta la
+# API y un servidor FHIR simulado, y mide cada escenario con carga concurrente.
+#
+#   cd app
+#   python -m bench.ejecutar --pacientes 2000 --peticiones 500 --concurrencia 16 --json base.json
+#   python -m bench.ejecutar --comparar base.json --tolerancia 0.2   # sale con 1 si el p95 empeora
+
+CONSULTA = {
+    "pesoafuera": 70.5, "tallaafuera": 1.65, "tallasentado": 0.85, "pesoadentro": 70.1,
+    "tallaadentro": 1.64, "frecuencia_cardiaca": 72, "nivel_oxigeno": 98, "temperatura": 36.6,
+}
+MUSCULOS = {c: 20.0 for c in (
+    "bicep", "tricep", "subescapular", "supriliaco", "bicep_relajado", "bicep_contraido",
+    "antebrazo", "abdomen", "muslo", "gemelo", "torax", "gluteo",
+)}
+HUESOS = {c: 20 for c in ("biacromial", "bitrocanter", "biliaco", "torax", "humero", "carpo", "femur", "tobillo")}
+PACIENTE = {
+    "nombre": "Paciente Benchmark", "edad": 40, "telefono": "5512345678", "genero": "F",
+    "fecha_nacimiento": "1985-06-15", "ocupacion": "Docente",
+}
+
+
+def argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark de la API de la nutrióloga")
+    parser.add_argument("--db", help="URL de la base a sembrar (se borra); por defecto un SQLite temporal")
+    parser.add_argument("--url", help="URL de una API ya levantada; si no se indica se levanta una local")
+    parser.add_argument("--sin-sembrar", action="store_true", help="usar los datos que ya tiene la base")
+    parser.add_argument("--pacientes", type=int, default=1000)
+    parser.add_argument("--consultas", type=int, default=10, help="consultas por paciente")
+    parser.add_argument("--medidas", type=int, default=4, help="medidas de cada tipo por paciente")
+    parser.add_argument("--peticiones", type=int, default=200, help="peticiones por escenario")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--latencia-fhir-ms", type=float, default=20.0)
+    parser.add_argument("--escenarios", help="lista separada por comas; por defecto todos")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    parser.add_argument("--comparar", help="resultados previos (--json) contra los que comparar el p95")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="aumento de p95 permitido, 0.2 = 20%%")
+    return parser.parse_args()
+
+
+def escenarios(ids_pacientes, ids_consultas, rnd):
+    # Cada escenario hace una petición y devuelve la respuesta; cubre todos los routers de main.py
+    creadas = []
+    lock = threading.Lock()
+    paciente = lambda: rnd.choice(ids_pacientes)
+    consulta = lambda: rnd.choice(ids_consultas)
+    hace_90_dias = (date.today() - timedelta(days=90)).isoformat()
+
+    def crear_consulta(s, url):
+        respuesta = s.post(f"{url}/consultas/", json={**CONSULTA, "fecha": date.today().isoformat(), "id_paciente": paciente()})
+        if respuesta.status_code == 200:
+            with lock:
+                creadas.append(respuesta.json()["id_consulta"])
+        return respuesta
+
+    def eliminar_consulta(s, url):
+        with lock:
+            id_consulta = creadas.pop() if creadas else None
+        if id_consulta is None:
+            id_consulta = crear_consulta(s, url).json()["id_consulta"]
+            with lock:
+                creadas.remove(id_consulta)
+        return s.delete(f"{url}/consultas/{id_consulta}")
+
+    return {
+        "listar_pacientes": lambda s, url: s.get(f"{url}/pacientes/"),
+        "obtener_paciente": lambda s, url: s.get(f"{url}/pacientes/{paciente()}"),
+        "buscar_paciente": lambda s, url: s.get(f"{url}/pacientes/buscar", params={"q": rnd.choice(["ana", "garcia", "luis lop", "maria"])}),
+        "crear_paciente": lambda s, url: s.post(f"{url}/pacientes/", json=PACIENTE),
+        "modificar_paciente": lambda s, url: s.patch(f"{url}/pacientes/{paciente()}", json={"ocupacion": "Comerciante"}),
+        "expediente_paciente": lambda s, url: s.get(f"{url}/expedientes/paciente/{paciente()}"),
+        "listar_expedientes": lambda s, url: s.get(f"{url}/expedientes/"),
+        "historial_consultas": lambda s, url: s.get(f"{url}/consultas/paciente/{paciente()}"),
+        "consultas_90_dias": lambda s, url: s.get(f"{url}/consultas/paciente/{paciente()}", params={"desde": hace_90_dias}),
+        "obtener_consulta": lambda s, url: s.get(f"{url}/consultas/{consulta()}"),
+        "crear_consulta": crear_consulta,
+        "modificar_consulta": lambda s, url: s.patch(f"{url}/consultas/{consulta()}", json={"temperatura": 36.8}),
+        "eliminar_consulta": eliminar_consulta,
+        "historial_musculos": lambda s, url: s.get(f"{url}/medidas_musculos/paciente/{paciente()}"),
+        "crear_musculos": lambda s, url: s.post(f"{url}/medidas_musculos/", json={**MUSCULOS, "fecha": date.today().isoformat(), "id_paciente": paciente()}),
+        "historial_huesos": lambda s, url: s.get(f"{url}/medidas_huesos/paciente/{paciente()}"),
+        "crear_huesos": lambda s, url: s.post(f"{url}/medidas_huesos/", json={**HUESOS, "fecha": date.today().isoformat(), "id_paciente": paciente()}),
+        "patient_fhir": lambda s, url: s.post(f"{url}/patient", json={"id_paciente": paciente()}),
+        "expediente_fhir": lambda s, url: s.post(f"{url}/expediente_fhir", json={"id_paciente": paciente()}),
+        "estadisticas_cache": lambda s, url: s.get(f"{url}/cache/estadisticas"),
+        "metricas": lambda s, url: s.get(f"{url}/metrics"),
+    }
+
+
+def levantar_api(app):
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    servidor = uvicorn.Server(config)
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    puerto = servidor.servers[0].sockets[0].getsockname()[1]
+    return servidor, f"http://127.0.0.1:{puerto}"
+
+
+def comparar(resultados, anterior, tolerancia):
+    regresiones = []
+    for nombre, actual in resultados.items():
+        base = anterior.get(nombre)
+        if base and base["p95_ms"] > 0 and actual["p95_ms"] > base["p95_ms"] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: p95 {base['p95_ms']} ms -> {actual['p95_ms']} ms")
+    return regresiones
+
+
+def main():
+    args = argumentos()
+    from bench import fhir_simulado
+
+    servidor_fhir, url_fhir = fhir_simulado.iniciar(args.latencia_fhir_ms)
+    # La configuración se lee al importar la aplicación, así que va antes de importarla
+    os.environ["DATABASE_URL"] = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    os.environ["FHIR_SERVER_URL"] = url_fhir
+
+    from sqlalchemy import select
+    from config.database import engine
+    from models.models import Consulta, Paciente
+    from bench.carga import ejecutar
+    from bench.sembrar import sembrar
+
+    if not args.sin_sembrar:
+        inicio = time.perf_counter()
+        sembrar(engine, args.pacientes, args.consultas, args.medidas, args.semilla)
+        print(f"Base sembrada en {time.perf_counter() - inicio:.1f} s ({engine.url.render_as_string(hide_password=True)})")
+    with engine.connect() as conexion:
+        ids_pacientes = conexion.execute(select(Paciente.id_paciente)).scalars().all()
+        ids_consultas = conexion.execute(select(Consulta.id_consulta).limit(10000)).scalars().all()
+    if not ids_pacientes or not ids_consultas:
+        sys.exit("La base no tiene pacientes o consultas; quite --sin-sembrar")
+
+    if args.url:
+        url_api = args.url.rstrip("/")
+    else:
+        import main as aplicacion
+        _, url_api = levantar_api(aplicacion.app)
+
+    todos = escenarios(ids_pacientes, ids_consultas, random.Random(args.semilla))
+    nombres = args.escenarios.split(",") if args.escenarios else list(todos)
+    desconocidos = [n for n in nombres if n not in todos]
+    if desconocidos:
+        sys.exit(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+    resultados = {}
+    print(f"{'escenario':<22}{'peticiones':>11}{'errores':>9}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for nombre in nombres:
+        r = resultados[nombre] = ejecutar(url_api, todos[nombre], args.peticiones, args.concurrencia)
+        print(f"{nombre:<22}{r['peticiones']:>11}{r['errores']:>9}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+        if r["errores"]:
+            print(f"{'':<22}estados con error: {', '.join(r['estados_error'])}")
+
+    servidor_fhir.shutdown()
+    if args.json:
+        with open(args.json, "w") as archivo:
+            json.dump(resultados, archivo, indent=2)
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            regresiones = comparar(resultados, json.load(archivo), args.tolerancia)
+        if regresiones:
+            print("Regresiones de rendimiento:\n  " + "\n  ".join(regresiones))
+            sys.exit(1)
+        print("Sin regresiones respecto a", args.comparar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Servidor FHIR mínimo para las rutas /patient y /expediente_fhir: responde lo
+# que esas rutas esperan de HAPI, con una latencia fija configurable.
+class ManejadorFhir(BaseHTTPRequestHandler):
+    latencia = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/fhir+json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _leer_cuerpo(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(largo) if largo else b""
+
+    def do_GET(self):
+        time.sleep(self.latencia)
+        url = urlparse(self.path)
+        if url.path.rstrip("/").endswith("/Patient"):
+            nombre = parse_qs(url.query).get("name", [""])[0]
+            entrada = {"resource": {"resourceType": "Patient", "id": "1", "name": [{"given": [nombre]}]}}
+            self._responder(200, {"resourceType": "Bundle", "type": "searchset", "entry": [entrada]})
+        else:
+            self._responder(404, {"resourceType": "OperationOutcome"})
+
+    def do_POST(self):
+        self._leer_cuerpo()
+        time.sleep(self.latencia)
+        ruta = urlparse(self.path).path.rstrip("/")
+        if ruta.endswith("/Patient"):
+            self._responder(201, {"resourceType": "Patient", "id": "1"})
+        else:
+            self._responder(200, {"resourceType": "Bundle", "type": "transaction-response", "entry": []})
+
+    do_PUT = do_POST
+
+
+def iniciar(latencia_ms=0.0):
+    # Devuelve (servidor, url_base); el servidor corre en un hilo de fondo
+    manejador = type("ManejadorFhirConLatencia", (ManejadorFhir,), {"latencia": latencia_ms / 1000})
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/fhir"
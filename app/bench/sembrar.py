@@ -0,0 +1,119 @@
+import json
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import insert, select
+
+from config.database import Base
+from models.models import Paciente, Expediente, Consulta, MedidasMusculos, MedidasHuesos
+from services.particiones import crear_particion
+
+LOTE = 1000
+
+NOMBRES = ["Ana", "Beatriz", "Carlos", "Daniela", "Eduardo", "Fernanda", "Gabriel", "Héctor", "Irene", "José",
+           "Karla", "Luis", "María", "Néstor", "Olga", "Pedro", "Rocío", "Sofía", "Tomás", "Valeria"]
+APELLIDOS = ["García", "Hernández", "López", "Martínez", "González", "Pérez", "Rodríguez", "Sánchez",
+             "Ramírez", "Cruz", "Flores", "Gómez", "Morales", "Vázquez", "Jiménez", "Reyes"]
+
+
+def datos_expediente():
+    # Misma estructura que guarda el front; es la que lee /expediente_fhir
+    return json.dumps({
+        "antecedentesMedicos": {"motivo": "Control de peso", "saludActual": "Buena"},
+        "antecedentesPatologicos": {
+            "enfermedadesInfecciosas": ["Varicela"], "otrosInfecciosos": "Ninguno",
+            "enfermedadesCronicas": ["Hipertensión"], "otrosCronicos": "Ninguno",
+            "consumo": ["Café"], "otroConsumo": "Ninguno",
+            "alergias": "Ninguna", "cirugias": "Ninguna",
+        },
+        "antecedentesObstetricos": {
+            "opciones": ["Embarazos"], "periodosMenstruales": "Regulares", "anticonceptivos": "No",
+            "cuales": "Ninguno", "tiempoUso": "0", "climaterio": "No",
+        },
+        "tratamiento": {"opciones": ["Ninguno"], "otros": "Ninguno", "alopatas": "No"},
+        "farmacosNutricion": {"cambiosApetito": "No", "bocaSeca": "No", "nauseas": "No", "hiperglucemia": "No"},
+        "sintomasActuales": {"opciones": ["Cansancio"]},
+        "problemasNutricion": {"dietas": "No", "transtornos": "No"},
+        "estiloVida": {
+            "actividadFisica": "Moderada",
+            "ejercicio": {"tipo": "Caminar", "frecuencia": "Diario"},
+            "indicadoresDieteticos": {"comidasDia": "3", "preparacionComidas": "En casa"},
+            "apetito": {
+                "tipo": "Normal",
+                "controlPeso": {
+                    "opcion": "No", "razon": "Ninguna", "resultados": "Ninguno", "medicamentos": "No",
+                    "cuales": "Ninguno", "cambioPeso": "No", "cirugiaPeso": "No", "consumoAgua": "2 litros",
+                },
+            },
+        },
+    })
+
+
+def _insertar_por_lotes(conexion, modelo, filas):
+    for i in range(0, len(filas), LOTE):
+        conexion.execute(insert(modelo), filas[i:i + LOTE])
+
+
+def sembrar(motor, pacientes=1000, consultas_por_paciente=10, medidas_por_paciente=4, semilla=1):
+    # Borra y vuelve a crear todas las tablas de `motor`; solo para bases de benchmark
+    rnd = random.Random(semilla)
+    Base.metadata.drop_all(bind=motor)
+    Base.metadata.create_all(bind=motor)
+    hoy = date.today()
+
+    def fecha_aleatoria():
+        return hoy - timedelta(days=rnd.randint(0, 730))
+
+    with motor.begin() as conexion:
+        _insertar_por_lotes(conexion, Paciente, [
+            {
+                "nombre": f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+                "edad": rnd.randint(5, 90),
+                "telefono": f"55{rnd.randint(10000000, 99999999)}",
+                "genero": rnd.choice("MF"),
+                "fecha_nacimiento": hoy - timedelta(days=rnd.randint(5 * 365, 90 * 365)),
+                "ocupacion": rnd.choice(["Estudiante", "Docente", "Comerciante", "Ingeniera", "Jubilado"]),
+            }
+            for _ in range(pacientes)
+        ])
+        ids = conexion.execute(select(Paciente.id_paciente)).scalars().all()
+
+    consultas, musculos, huesos = [], [], []
+    for id_paciente in ids:
+        for _ in range(consultas_por_paciente):
+            consultas.append({
+                "fecha": fecha_aleatoria(), "id_paciente": id_paciente,
+                "pesoafuera": round(rnd.uniform(40, 120), 1), "tallaafuera": round(rnd.uniform(1.4, 1.95), 2),
+                "tallasentado": round(rnd.uniform(0.7, 1.0), 2), "pesoadentro": round(rnd.uniform(40, 120), 1),
+                "tallaadentro": round(rnd.uniform(1.4, 1.95), 2), "frecuencia_cardiaca": rnd.randint(55, 100),
+                "nivel_oxigeno": rnd.randint(92, 100), "temperatura": round(rnd.uniform(36, 37.5), 1),
+            })
+        for _ in range(medidas_por_paciente):
+            musculos.append({
+                "fecha": fecha_aleatoria(), "id_paciente": id_paciente,
+                **{c: round(rnd.uniform(5, 60), 1) for c in (
+                    "bicep", "tricep", "subescapular", "supriliaco", "bicep_relajado", "bicep_contraido",
+                    "antebrazo", "abdomen", "muslo", "gemelo", "torax", "gluteo",
+                )},
+            })
+            huesos.append({
+                "fecha": fecha_aleatoria(), "id_paciente": id_paciente,
+                **{c: rnd.randint(5, 45) for c in (
+                    "biacromial", "bitrocanter", "biliaco", "torax", "humero", "carpo", "femur", "tobillo",
+                )},
+            })
+
+    # Con particionado activo cada mes sembrado necesita su partición
+    for tabla, filas in (("consulta", consultas), ("medidas_musculos", musculos), ("medidas_huesos", huesos)):
+        for fecha in {f["fecha"].replace(day=1) for f in filas}:
+            crear_particion(motor, tabla, fecha)
+
+    datos = datos_expediente()
+    with motor.begin() as conexion:
+        _insertar_por_lotes(conexion, Expediente, [
+            {"fecha_modificacion": hoy, "datos": datos, "id_paciente": id_paciente} for id_paciente in ids
+        ])
+        _insertar_por_lotes(conexion, Consulta, consultas)
+        _insertar_por_lotes(conexion, MedidasMusculos, musculos)
+        _insertar_por_lotes(conexion, MedidasHuesos, huesos)
+    return ids
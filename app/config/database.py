@@ -1,14 +1,84 @@
-from sqlalchemy import create_engine
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.schema import CreateSchema
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Particionado por rango de `fecha` de consulta y medidas: "mensual", "anual" o vacío
+PARTICIONES_FECHA = os.getenv("PARTICIONES_FECHA", "")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Multi-clínica: la clínica llega en el encabezado X-Clinica. Por defecto todas
+# comparten la base principal; las clínicas grandes se pueden mover a su propia
+# base o esquema, p. ej.
+#   CLINICAS_BASES='{"norte": "postgresql://usuario@servidor/norte"}'
+#   CLINICAS_ESQUEMAS='{"sur": "clinica_sur"}'
+CLINICA_PREDETERMINADA = os.getenv("CLINICA_PREDETERMINADA", "principal")
+CLINICAS_PERMITIDAS = {c.strip() for c in os.getenv("CLINICAS", "").split(",") if c.strip()}
+CLINICAS_BASES = json.loads(os.getenv("CLINICAS_BASES", "{}"))
+CLINICAS_ESQUEMAS = json.loads(os.getenv("CLINICAS_ESQUEMAS", "{}"))
+
+clinica_actual = ContextVar("clinica_actual", default=CLINICA_PREDETERMINADA)
+
+
+def crear_motor(url):
+    motor = create_engine(url)
+    if motor.dialect.name == "sqlite":
+        # SQLite no valida llaves foráneas si no se activa en cada conexión
+        @event.listens_for(motor, "connect")
+        def activar_llaves_foraneas(conexion, _):
+            conexion.execute("PRAGMA foreign_keys=ON")
+    return motor
+
+
+engine = crear_motor(DATABASE_URL)
+PARTICIONADO = PARTICIONES_FECHA in ("mensual", "anual") and engine.dialect.name == "postgresql"
+
+motores_clinicas = {clinica: crear_motor(url) for clinica, url in CLINICAS_BASES.items()}
+motores_clinicas.update({
+    clinica: engine.execution_options(schema_translate_map={None: esquema})
+    for clinica, esquema in CLINICAS_ESQUEMAS.items()
+})
+
+
+def crear_esquema(motor):
+    esquema = (motor.get_execution_options().get("schema_translate_map") or {}).get(None)
+    if esquema:
+        with motor.begin() as conexion:
+            conexion.execute(CreateSchema(esquema, if_not_exists=True))
+
+
+def motor_de_clinica(clinica: str):
+    return motores_clinicas.get(clinica, engine)
+
+
+def clinica_de_sesion(db: Session):
+    return db.info["clinica"]
+
+
+class SesionClinica(Session):
+    # Cada sesión queda ligada a la clínica de la petición que la creó y todas
+    # sus sentencias van a la base o esquema de esa clínica
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.info.setdefault("clinica", clinica_actual.get())
+
+    def get_bind(self, mapper=None, **kwargs):
+        return motor_de_clinica(self.info["clinica"])
+
+
+SessionLocal = sessionmaker(class_=SesionClinica, autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
+
+
+def get_db(request: Request):
+    # Sesión compartida por toda la petición; la confirma o revierte una sola
+    # vez MiddlewareUnidadDeTrabajo al terminar
+    return request.state.unidad_de_trabajo.sesion()
@@ -0,0 +1,109 @@
+from sqlalchemy import delete, insert, literal, select, update
+from sqlalchemy.orm import Session
+from config.database import clinica_de_sesion
+from models.models import Paciente
+from services.sincronizacion import registrar_cambios
+
+
+class ConflictoVersion(Exception):
+    def __init__(self, version_actual=None):
+        super().__init__("El registro fue modificado por otro usuario")
+        self.version_actual = version_actual
+
+
+class PacienteNoEncontrado(Exception):
+    def __init__(self):
+        super().__init__("El ID del paciente no existe")
+
+
+def de_la_clinica(db: Session, models):
+    # Toda consulta del CRUD se limita a la clínica de la sesión
+    return models.id_clinica == clinica_de_sesion(db)
+
+
+def registrar_cambio(db: Session, models, registro, operacion: str):
+    # Cada escritura hecha con estas funciones queda en la bitácora de /sync
+    id_registro = getattr(registro, models.__mapper__.primary_key[0].key)
+    registrar_cambios(db, models.__tablename__, operacion, [(id_registro, registro.id_paciente)])
+
+
+def paciente_existe(db: Session, id_paciente):
+    return select(Paciente.id_paciente).where(
+        Paciente.id_paciente == id_paciente, Paciente.id_clinica == clinica_de_sesion(db)
+    ).exists()
+
+
+def insertar(db: Session, models, valores: dict):
+    # Un solo INSERT ... RETURNING; devuelve None si el paciente referenciado no
+    # existe en la clínica de la sesión. La existencia del paciente se revisa
+    # en la misma sentencia (INSERT ... SELECT ... WHERE EXISTS) en lugar de
+    # esperar el error de llave foránea, que obligaría a revertir la
+    # transacción completa de la petición.
+    valores = {**valores, "id_clinica": clinica_de_sesion(db)}
+    if models.__mapper__.primary_key[0].key == "id_paciente":
+        consulta = insert(models).values(**valores)
+    else:
+        columnas = list(valores)
+        consulta = insert(models).from_select(
+            columnas,
+            select(*(literal(valores[c], models.__table__.c[c].type) for c in columnas)).where(
+                paciente_existe(db, valores["id_paciente"])
+            ),
+        )
+    registro = db.execute(consulta.returning(models)).scalar_one_or_none()
+    if registro is None:
+        return None
+    registrar_cambio(db, models, registro, "crear")
+    return registro
+
+
+def actualizar_por_id(db: Session, models, columna_id, id_registro, valores: dict, version: int | None = None):
+    # Actualiza con un solo UPDATE ... RETURNING. Devuelve (registro, id_paciente_anterior);
+    # el registro es None si no existe, se lanza ConflictoVersion si la versión no coincide
+    # y PacienteNoEncontrado si se mueve a un paciente que no está en la clínica.
+    def ejecutar(*condiciones):
+        consulta = (
+            update(models)
+            .where(columna_id == id_registro, de_la_clinica(db, models), *condiciones)
+            .values(**valores, version=models.version + 1)
+            .returning(models)
+        )
+        return db.execute(
+            consulta, execution_options={"synchronize_session": False, "populate_existing": True}
+        ).scalar_one_or_none()
+
+    condiciones = [models.version == version] if version is not None else []
+    # Se asume que el registro no cambia de paciente; si sí cambia hace falta
+    # conocer el paciente anterior para invalidar su historial
+    cambia_paciente = "id_paciente" in valores and columna_id is not models.id_paciente
+    if cambia_paciente:
+        condiciones.append(models.id_paciente == valores["id_paciente"])
+    registro = ejecutar(*condiciones)
+    if registro is not None:
+        registrar_cambio(db, models, registro, "actualizar")
+        return registro, registro.id_paciente
+
+    actual = db.execute(select(models.id_paciente, models.version).where(columna_id == id_registro, de_la_clinica(db, models))).first()
+    if actual is None:
+        return None, None
+    if version is not None and actual.version != version:
+        raise ConflictoVersion(actual.version)
+    # El paciente nuevo se revisa en la misma sentencia, como en insertar, para
+    # no llegar al error de la llave foránea compuesta
+    existe = [paciente_existe(db, valores["id_paciente"])] if cambia_paciente else []
+    registro = ejecutar(models.version == actual.version, *existe)
+    if registro is None:
+        if existe and not db.execute(select(existe[0])).scalar():
+            raise PacienteNoEncontrado()
+        raise ConflictoVersion()
+    registrar_cambio(db, models, registro, "actualizar")
+    return registro, actual.id_paciente
+
+
+def eliminar_por_id(db: Session, models, columna_id, id_registro):
+    # DELETE ... RETURNING; las tablas hijas se borran en la base con ON DELETE CASCADE
+    consulta = delete(models).where(columna_id == id_registro, de_la_clinica(db, models)).returning(models)
+    registro = db.execute(consulta, execution_options={"synchronize_session": False}).scalar_one_or_none()
+    if registro is not None:
+        registrar_cambio(db, models, registro, "eliminar")
+    return registro
@@ -1,38 +1,77 @@
+from datetime import date
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import ConsultaCreate, ConsultaUpdate
+from schemas.schemas import ConsultaCreate, ConsultaUpdate, ConsultaPatch
 from models.models import Consulta as models
+from services import cache
+from services.outbox import registrar_evento
+from services.trazas import trazado
+from services.particiones import asegurar_particion
+from crud.comun import actualizar_por_id, de_la_clinica, eliminar_por_id, insertar
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+@trazado()
 def create_consulta(db: Session, consulta: ConsultaCreate):
-    db_consulta = models(**consulta.model_dump())
-    db.add(db_consulta)
-    db.commit()
-    db.refresh(db_consulta)
+    asegurar_particion(db, "consulta", consulta.fecha)
+    db_consulta = insertar(db, models, consulta.model_dump())
+    if db_consulta is None:
+        return None
+    cache.invalidar(db, f"consultas:paciente:{db_consulta.id_paciente}", "consultas:lista", f"fhir:Observation:paciente:{db_consulta.id_paciente}")
+    registrar_evento(db, "consulta", db_consulta.id_consulta, db_consulta.id_paciente, "crear")
     return db_consulta
 
+@trazado()
 def get_consulta_by_id(db: Session, id_consulta: int):
-    return db.query(models).filter(models.id_consulta == id_consulta).first()
+    return db.query(models).filter(de_la_clinica(db, models), models.id_consulta == id_consulta).first()
 
-def get_consulta_by_id_paciente(db: Session, id_paciente: int):
-    return db.query(models).filter(models.id_paciente == id_paciente).all()
+@trazado()
+def get_consulta_by_id_paciente(db: Session, id_paciente: int, desde: date | None = None, hasta: date | None = None):
+    # Filtrar por fecha permite a PostgreSQL descartar particiones completas
+    consulta = db.query(models).filter(de_la_clinica(db, models), models.id_paciente == id_paciente)
+    if desde is not None:
+        consulta = consulta.filter(models.fecha >= desde)
+    if hasta is not None:
+        consulta = consulta.filter(models.fecha <= hasta)
+    consulta = consulta.order_by(models.fecha)
+    if desde is not None or hasta is not None:
+        return consulta.all()
+    return cache.obtener(db, f"consultas:paciente:{id_paciente}", models, consulta.all)
 
+@trazado()
 def get_consultas(db: Session, skip=0, limit: int = 100):
-    return db.query(models).offset(skip).limit(limit).all()
+    return db.query(models).filter(de_la_clinica(db, models)).offset(skip).limit(limit).all()
 
-def update_consulta(db: Session, consulta: models, consulta_update: ConsultaUpdate):
-    for key, value in consulta_update.dict().items():
-        setattr(consulta, key, value)
-    db.commit()
-    db.refresh(consulta)
+@trazado()
+def update_consulta(db: Session, id_consulta: int, consulta_update: ConsultaUpdate | ConsultaPatch, version: int | None = None, parcial: bool = False):
+    valores = consulta_update.model_dump(exclude_unset=parcial)
+    asegurar_particion(db, "consulta", valores.get("fecha"))
+    consulta, id_paciente_anterior = actualizar_por_id(
+        db, models, models.id_consulta, id_consulta, valores, version
+    )
+    if consulta is None:
+        return None
+    cache.invalidar(
+        db,
+        f"consultas:{id_consulta}",
+        "consultas:lista",
+        f"consultas:paciente:{id_paciente_anterior}",
+        f"consultas:paciente:{consulta.id_paciente}",
+        f"fhir:Observation:paciente:{id_paciente_anterior}",
+        f"fhir:Observation:paciente:{consulta.id_paciente}",
+    )
+    registrar_evento(db, "consulta", id_consulta, consulta.id_paciente, "actualizar")
     return consulta
 
-def delete_consulta(db: Session, consulta: models):
-    db.delete(consulta)
-    db.commit()
+@trazado()
+def delete_consulta(db: Session, id_consulta: int):
+    consulta = eliminar_por_id(db, models, models.id_consulta, id_consulta)
+    if consulta is None:
+        return None
+    cache.invalidar(
+        db,
+        f"consultas:{id_consulta}",
+        "consultas:lista",
+        f"consultas:paciente:{consulta.id_paciente}",
+        f"fhir:Observation:paciente:{consulta.id_paciente}",
+    )
+    registrar_evento(db, "consulta", id_consulta, consulta.id_paciente, "eliminar")
+    return consulta
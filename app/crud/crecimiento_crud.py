@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+from models.models import Consulta, Paciente
+from services.trazas import trazado
+from crud.comun import de_la_clinica
+
+
+def _mediciones(db: Session):
+    # Una sola consulta: cada consulta junto con la fecha de nacimiento y el sexo del paciente
+    return (
+        select(
+            Consulta.id_consulta, Consulta.id_paciente, Consulta.fecha, Consulta.pesoafuera, Consulta.tallaafuera,
+            Paciente.fecha_nacimiento, Paciente.genero,
+        )
+        .join(Paciente, and_(Paciente.id_paciente == Consulta.id_paciente, Paciente.id_clinica == Consulta.id_clinica))
+        .where(de_la_clinica(db, Consulta))
+        .order_by(Consulta.id_paciente, Consulta.fecha)
+    )
+
+
+@trazado()
+def get_mediciones_paciente(db: Session, id_paciente: int):
+    return db.execute(_mediciones(db).where(Consulta.id_paciente == id_paciente)).all()
+
+
+@trazado()
+def get_mediciones_cohorte(db: Session, ids_pacientes: list[int] | None, edad_maxima: int):
+    consulta = _mediciones(db)
+    if ids_pacientes is not None:
+        consulta = consulta.where(Consulta.id_paciente.in_(ids_pacientes))
+    else:
+        nacidos_desde = date.today() - timedelta(days=round(edad_maxima * 365.25))
+        consulta = consulta.where(Paciente.fecha_nacimiento > nacidos_desde)
+    return db.execute(consulta).all()
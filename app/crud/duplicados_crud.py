@@ -0,0 +1,152 @@
+from datetime import datetime, timezone
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+from config.database import clinica_de_sesion
+from models.models import Paciente, Expediente, Consulta, MedidasMusculos, MedidasHuesos, PosibleDuplicado
+from models.models import paciente_consulta, paciente_musculos
+from schemas.schemas import PacientePatch
+from services import cache
+from services.outbox import registrar_eventos
+from services.sincronizacion import registrar_cambios
+from services.trazas import trazado
+from crud.comun import de_la_clinica
+from crud.paciente_crud import claves_paciente, delete_paciente, update_paciente
+
+# (modelo, columna id, prefijo de caché, recurso del outbox)
+TABLAS_HIJAS = [
+    (Expediente, Expediente.id_expediente, "expediente", "expediente"),
+    (Consulta, Consulta.id_consulta, "consultas", "consulta"),
+    (MedidasMusculos, MedidasMusculos.id_musculos, "medidas_musculos", None),
+    (MedidasHuesos, MedidasHuesos.id_huesos, "medidas_huesos", None),
+]
+# Datos del paciente que se toman del duplicado si el que se conserva no los tiene
+CAMPOS_COMPLEMENTARIOS = ("edad", "telefono", "genero", "fecha_nacimiento", "ocupacion")
+
+
+class ExpedientesEnConflicto(Exception):
+    pass
+
+
+@trazado()
+def get_datos_pacientes(db: Session):
+    return db.execute(
+        select(Paciente.id_paciente, Paciente.nombre, Paciente.fecha_nacimiento, Paciente.telefono, Paciente.genero)
+        .where(de_la_clinica(db, Paciente))
+    ).all()
+
+
+@trazado()
+def guardar_posibles_duplicados(db: Session, pares):
+    # Los pares ya revisados conservan su estado; a los pendientes se les
+    # actualiza el puntaje. Devuelve cuántos pares son nuevos.
+    clinica = clinica_de_sesion(db)
+    existentes = {
+        (d.id_paciente_a, d.id_paciente_b): d
+        for d in db.query(PosibleDuplicado).filter(de_la_clinica(db, PosibleDuplicado)).all()
+    }
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+    nuevos = 0
+    for a, b, puntaje, motivos in pares:
+        duplicado = existentes.get((a, b))
+        if duplicado is None:
+            db.add(PosibleDuplicado(
+                id_clinica=clinica, id_paciente_a=a, id_paciente_b=b, puntaje=puntaje, motivos=motivos, detectado_en=ahora,
+            ))
+            nuevos += 1
+        elif duplicado.estado == "pendiente":
+            duplicado.puntaje, duplicado.motivos = puntaje, motivos
+    db.flush()
+    return nuevos
+
+
+@trazado()
+def get_posibles_duplicados(db: Session, estado: str = "pendiente", skip: int = 0, limit: int = 100):
+    duplicados = (
+        db.query(PosibleDuplicado)
+        .filter(de_la_clinica(db, PosibleDuplicado), PosibleDuplicado.estado == estado)
+        .order_by(PosibleDuplicado.puntaje.desc(), PosibleDuplicado.id_duplicado)
+        .offset(skip).limit(limit).all()
+    )
+    ids = {i for d in duplicados for i in (d.id_paciente_a, d.id_paciente_b)}
+    pacientes = {
+        p.id_paciente: p for p in db.query(Paciente).filter(de_la_clinica(db, Paciente), Paciente.id_paciente.in_(ids)).all()
+    } if ids else {}
+    return duplicados, pacientes
+
+
+@trazado()
+def get_posible_duplicado(db: Session, id_duplicado: int):
+    return db.query(PosibleDuplicado).filter(
+        de_la_clinica(db, PosibleDuplicado), PosibleDuplicado.id_duplicado == id_duplicado
+    ).first()
+
+
+@trazado()
+def descartar_duplicado(db: Session, duplicado: PosibleDuplicado):
+    duplicado.estado = "descartado"
+    db.flush()
+    return duplicado
+
+
+@trazado()
+def fusionar_pacientes(db: Session, duplicado: PosibleDuplicado, id_conservar: int):
+    # Un UPDATE por tabla hija mueve todos los registros del paciente que se
+    # elimina al que se conserva; todo queda en la transacción de la petición
+    id_eliminar = duplicado.id_paciente_b if id_conservar == duplicado.id_paciente_a else duplicado.id_paciente_a
+    pacientes = {
+        p.id_paciente: p for p in db.query(Paciente).filter(
+            de_la_clinica(db, Paciente), Paciente.id_paciente.in_([id_conservar, id_eliminar])
+        ).with_for_update().all()
+    }
+    if len(pacientes) < 2:
+        return None
+    # Un paciente tiene un solo expediente y no hay forma segura de combinar dos;
+    # el bloqueo de los pacientes impide que se cree otro mientras tanto
+    con_expediente = db.execute(
+        select(Expediente.id_paciente).distinct().where(
+            de_la_clinica(db, Expediente), Expediente.id_paciente.in_([id_conservar, id_eliminar])
+        )
+    ).scalars().all()
+    if len(con_expediente) == 2:
+        raise ExpedientesEnConflicto()
+    conservar, eliminar = pacientes[id_conservar], pacientes[id_eliminar]
+
+    movidos = {}
+    for modelo, columna_id, prefijo, recurso in TABLAS_HIJAS:
+        ids = db.execute(
+            update(modelo)
+            .where(de_la_clinica(db, modelo), modelo.id_paciente == id_eliminar)
+            .values(id_paciente=id_conservar, version=modelo.version + 1)
+            .returning(columna_id),
+            execution_options={"synchronize_session": False},
+        ).scalars().all()
+        movidos[modelo.__tablename__] = len(ids)
+        cache.invalidar(db, *(f"{prefijo}:{i}" for i in ids))
+        registrar_cambios(db, modelo.__tablename__, "actualizar", [(i, id_conservar) for i in ids])
+        if recurso is not None:
+            registrar_eventos(db, recurso, "actualizar", [(i, id_conservar) for i in ids])
+    for asociacion in (paciente_consulta, paciente_musculos):
+        db.execute(update(asociacion).where(asociacion.c.id_paciente == id_eliminar).values(id_paciente=id_conservar))
+
+    complementos = {
+        campo: getattr(eliminar, campo) for campo in CAMPOS_COMPLEMENTARIOS
+        if getattr(conservar, campo) in (None, "") and getattr(eliminar, campo) not in (None, "")
+    }
+    if complementos:
+        update_paciente(db, id_conservar, PacientePatch(**complementos), parcial=True)
+    cache.invalidar(db, *claves_paciente(id_conservar))
+    delete_paciente(db, id_eliminar)
+
+    # Los demás pares del paciente eliminado ya no aplican; se vuelven a
+    # detectar contra el que se conserva en la siguiente corrida
+    db.execute(
+        delete(PosibleDuplicado).where(
+            de_la_clinica(db, PosibleDuplicado),
+            PosibleDuplicado.id_duplicado != duplicado.id_duplicado,
+            or_(PosibleDuplicado.id_paciente_a == id_eliminar, PosibleDuplicado.id_paciente_b == id_eliminar),
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    duplicado.estado = "fusionado"
+    db.flush()
+    return {"id_paciente": id_conservar, "id_paciente_eliminado": id_eliminar, "movidos": movidos}
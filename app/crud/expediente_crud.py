@@ -1,39 +1,76 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import ExpedienteCreate, ExpedienteUpdate
+from schemas.schemas import ExpedienteCreate, ExpedienteUpdate, ExpedientePatch
 from models.models import Expediente as models
 from models.models import Paciente as paciente_model
+from services import cache
+from services.outbox import registrar_evento
+from services.trazas import trazado
+from crud.comun import actualizar_por_id, de_la_clinica, eliminar_por_id, insertar
+from crud.revision_expediente_crud import registrar_revision
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+@trazado()
 def create_expediente(db: Session, expediente: ExpedienteCreate):
-    db_expediente = models(**expediente.model_dump())
-    db.add(db_expediente)
-    db.commit()
-    db.refresh(db_expediente)
+    db_expediente = insertar(db, models, expediente.model_dump())
+    if db_expediente is None:
+        return None
+    cache.invalidar(db, f"expediente:paciente:{db_expediente.id_paciente}", "expediente:lista")
+    registrar_evento(db, "expediente", db_expediente.id_expediente, db_expediente.id_paciente, "crear")
+    registrar_revision(db, db_expediente)
     return db_expediente
 
+@trazado()
 def get_expediente_by_id(db: Session, id_expediente: int):
-    return db.query(models).filter(models.id_expediente == id_expediente).first()
+    return db.query(models).filter(de_la_clinica(db, models), models.id_expediente == id_expediente).first()
 
+@trazado()
 def get_expediente_by_id_paciente(db: Session, id_paciente: int):
-    return db.query(models).filter(models.id_paciente == id_paciente).first()
+    return cache.obtener(
+        db, f"expediente:paciente:{id_paciente}", models,
+        lambda: db.query(models).filter(de_la_clinica(db, models), models.id_paciente == id_paciente).first(),
+    )
 
+@trazado()
 def get_expedientes(db: Session, skip=0, limit: int = 100):
-    return db.query(models).offset(skip).limit(limit).all()
+    return db.query(models).filter(de_la_clinica(db, models)).offset(skip).limit(limit).all()
 
-def update_expediente(db: Session, expediente: models, expediente_update: ExpedienteUpdate):
-    for key, value in expediente_update.dict().items():
-        setattr(expediente, key, value)
-    db.commit()
-    db.refresh(expediente)
+@trazado()
+def update_expediente(db: Session, id_expediente: int, expediente_update: ExpedienteUpdate | ExpedientePatch, version: int | None = None, parcial: bool = False):
+    valores = expediente_update.model_dump(exclude_unset=parcial)
+    anterior = None
+    if "datos" in valores:
+        # Se bloquea la fila para que la diferencia sea contra la versión que se reemplaza
+        anterior = db.execute(
+            select(models.datos, models.version, models.fecha_modificacion)
+            .where(de_la_clinica(db, models), models.id_expediente == id_expediente)
+            .with_for_update()
+        ).first()
+    expediente, id_paciente_anterior = actualizar_por_id(db, models, models.id_expediente, id_expediente, valores, version)
+    if expediente is None:
+        return None
+    if anterior is not None and anterior.datos != expediente.datos:
+        registrar_revision(db, expediente, anterior)
+    cache.invalidar(
+        db,
+        f"expediente:{id_expediente}",
+        "expediente:lista",
+        f"expediente:paciente:{id_paciente_anterior}",
+        f"expediente:paciente:{expediente.id_paciente}",
+    )
+    registrar_evento(db, "expediente", id_expediente, expediente.id_paciente, "actualizar")
     return expediente
 
-def delete_expediente(db: Session, expediente: models):
-    db.delete(expediente)
-    db.commit()
+@trazado()
+def delete_expediente(db: Session, id_expediente: int):
+    expediente = eliminar_por_id(db, models, models.id_expediente, id_expediente)
+    if expediente is None:
+        return None
+    cache.invalidar(
+        db,
+        f"expediente:{id_expediente}",
+        "expediente:lista",
+        f"expediente:paciente:{expediente.id_paciente}",
+    )
+    registrar_evento(db, "expediente", id_expediente, expediente.id_paciente, "eliminar")
+    return expediente
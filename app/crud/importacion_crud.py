@@ -0,0 +1,63 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from config.database import clinica_de_sesion
+from models.models import Paciente, Consulta, MedidasMusculos, MedidasHuesos
+from services import cache
+from services.busqueda_pacientes import programar_agregar
+from services.outbox import registrar_eventos
+from services.sincronizacion import registrar_cambios
+from services.particiones import asegurar_particion
+from services.trazas import trazado
+from crud.paciente_crud import claves_paciente
+
+TABLAS_MEDIDAS = {
+    "consulta": (Consulta, Consulta.id_consulta, "consultas"),
+    "medidas_musculos": (MedidasMusculos, MedidasMusculos.id_musculos, "medidas_musculos"),
+    "medidas_huesos": (MedidasHuesos, MedidasHuesos.id_huesos, "medidas_huesos"),
+}
+
+
+@trazado()
+def insertar_pacientes(db: Session, pacientes: list[dict]):
+    # Un INSERT de varias filas; devuelve los ids en el mismo orden que `pacientes`
+    if not pacientes:
+        return []
+    clinica = clinica_de_sesion(db)
+    ids = db.execute(
+        insert(Paciente).returning(Paciente.id_paciente, sort_by_parameter_order=True),
+        [{**p, "id_clinica": clinica} for p in pacientes],
+    ).scalars().all()
+    for id_paciente, paciente in zip(ids, pacientes):
+        programar_agregar(db, id_paciente, paciente["nombre"])
+        cache.invalidar(db, *claves_paciente(id_paciente))
+    registrar_eventos(db, "paciente", "crear", [(id_paciente, id_paciente) for id_paciente in ids])
+    registrar_cambios(db, "pacientes", "crear", [(id_paciente, id_paciente) for id_paciente in ids])
+    return ids
+
+
+def asegurar_particiones(db: Session, tabla: str, fechas):
+    # Se llama antes de insertar nada: el DDL corre en otra conexión y esperaría
+    # los candados que la transacción del lote ya tuviera sobre la tabla padre
+    for fecha in set(fechas):
+        asegurar_particion(db, tabla, fecha)
+
+
+@trazado()
+def insertar_medidas(db: Session, tabla: str, filas: list[dict]):
+    if not filas:
+        return []
+    modelo, columna_id, prefijo = TABLAS_MEDIDAS[tabla]
+    clinica = clinica_de_sesion(db)
+    insertados = db.execute(
+        insert(modelo).returning(columna_id, modelo.id_paciente, sort_by_parameter_order=True),
+        [{**f, "id_clinica": clinica} for f in filas],
+    ).all()
+    pacientes = {id_paciente for _, id_paciente in insertados}
+    cache.invalidar(db, f"{prefijo}:lista", *(
+        clave for id_paciente in pacientes
+        for clave in (f"{prefijo}:paciente:{id_paciente}", f"fhir:Observation:paciente:{id_paciente}")
+    ))
+    registrar_cambios(db, tabla, "crear", insertados)
+    if tabla == "consulta":
+        registrar_eventos(db, "consulta", "crear", insertados)
+    return insertados
@@ -1,39 +1,74 @@
 
+from datetime import date
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import MedidasHuesosCreate, MedidasHuesosUpdate
+from schemas.schemas import MedidasHuesosCreate, MedidasHuesosUpdate, MedidasHuesosPatch
 from models.models import MedidasHuesos as models
+from services import cache
+from services.trazas import trazado
+from services.particiones import asegurar_particion
+from crud.comun import actualizar_por_id, de_la_clinica, eliminar_por_id, insertar
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+@trazado()
 def create_medidas_huesos(db: Session, medidas_huesos: MedidasHuesosCreate):
-    db_medidas_huesos = models(**medidas_huesos.model_dump())
-    db.add(db_medidas_huesos)
-    db.commit()
-    db.refresh(db_medidas_huesos)
+    asegurar_particion(db, "medidas_huesos", medidas_huesos.fecha)
+    db_medidas_huesos = insertar(db, models, medidas_huesos.model_dump())
+    if db_medidas_huesos is None:
+        return None
+    cache.invalidar(db, f"medidas_huesos:paciente:{db_medidas_huesos.id_paciente}", "medidas_huesos:lista", f"fhir:Observation:paciente:{db_medidas_huesos.id_paciente}")
     return db_medidas_huesos
 
+@trazado()
 def get_medidas_huesos_by_id(db: Session, id_huesos: int):
-    return db.query(models).filter(models.id_huesos == id_huesos).first()
+    return db.query(models).filter(de_la_clinica(db, models), models.id_huesos == id_huesos).first()
 
-def get_medidas_huesos_by_id_paciente(db: Session, id_paciente: int):
-    return db.query(models).filter(models.id_paciente == id_paciente).all()
+@trazado()
+def get_medidas_huesos_by_id_paciente(db: Session, id_paciente: int, desde: date | None = None, hasta: date | None = None):
+    # Filtrar por fecha permite a PostgreSQL descartar particiones completas
+    consulta = db.query(models).filter(de_la_clinica(db, models), models.id_paciente == id_paciente)
+    if desde is not None:
+        consulta = consulta.filter(models.fecha >= desde)
+    if hasta is not None:
+        consulta = consulta.filter(models.fecha <= hasta)
+    consulta = consulta.order_by(models.fecha)
+    if desde is not None or hasta is not None:
+        return consulta.all()
+    return cache.obtener(db, f"medidas_huesos:paciente:{id_paciente}", models, consulta.all)
     
+@trazado()
 def get_medidas_huesos(db: Session, skip=0, limit: int = 100):
-    return db.query(models).offset(skip).limit(limit).all()
+    return db.query(models).filter(de_la_clinica(db, models)).offset(skip).limit(limit).all()
 
-def update_medidas_huesos(db: Session, medidas_huesos: models, medidas_huesos_update: MedidasHuesosUpdate):
-    for key, value in medidas_huesos_update.dict().items():
-        setattr(medidas_huesos, key, value)
-    db.commit()
-    db.refresh(medidas_huesos)
+@trazado()
+def update_medidas_huesos(db: Session, id_huesos: int, medidas_huesos_update: MedidasHuesosUpdate | MedidasHuesosPatch, version: int | None = None, parcial: bool = False):
+    valores = medidas_huesos_update.model_dump(exclude_unset=parcial)
+    asegurar_particion(db, "medidas_huesos", valores.get("fecha"))
+    medidas_huesos, id_paciente_anterior = actualizar_por_id(
+        db, models, models.id_huesos, id_huesos, valores, version
+    )
+    if medidas_huesos is None:
+        return None
+    cache.invalidar(
+        db,
+        f"medidas_huesos:{id_huesos}",
+        "medidas_huesos:lista",
+        f"medidas_huesos:paciente:{id_paciente_anterior}",
+        f"medidas_huesos:paciente:{medidas_huesos.id_paciente}",
+        f"fhir:Observation:paciente:{id_paciente_anterior}",
+        f"fhir:Observation:paciente:{medidas_huesos.id_paciente}",
+    )
     return medidas_huesos
 
-def delete_medidas_huesos(db: Session, medidas_huesos: models):
-    db.delete(medidas_huesos)
-    db.commit()
+@trazado()
+def delete_medidas_huesos(db: Session, id_huesos: int):
+    medidas_huesos = eliminar_por_id(db, models, models.id_huesos, id_huesos)
+    if medidas_huesos is None:
+        return None
+    cache.invalidar(
+        db,
+        f"medidas_huesos:{id_huesos}",
+        "medidas_huesos:lista",
+        f"medidas_huesos:paciente:{medidas_huesos.id_paciente}",
+        f"fhir:Observation:paciente:{medidas_huesos.id_paciente}",
+    )
+    return medidas_huesos
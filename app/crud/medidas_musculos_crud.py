@@ -1,38 +1,73 @@
+from datetime import date
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import MedidasMusculosCreate, MedidasMusculosUpdate
+from schemas.schemas import MedidasMusculosCreate, MedidasMusculosUpdate, MedidasMusculosPatch
 from models.models import MedidasMusculos as models
+from services import cache
+from services.trazas import trazado
+from services.particiones import asegurar_particion
+from crud.comun import actualizar_por_id, de_la_clinica, eliminar_por_id, insertar
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+@trazado()
 def create_medidas_musculos(db: Session, medidas_musculos: MedidasMusculosCreate):
-    db_medidas_musculos = models(**medidas_musculos.model_dump())
-    db.add(db_medidas_musculos)
-    db.commit()
-    db.refresh(db_medidas_musculos)
+    asegurar_particion(db, "medidas_musculos", medidas_musculos.fecha)
+    db_medidas_musculos = insertar(db, models, medidas_musculos.model_dump())
+    if db_medidas_musculos is None:
+        return None
+    cache.invalidar(db, f"medidas_musculos:paciente:{db_medidas_musculos.id_paciente}", "medidas_musculos:lista", f"fhir:Observation:paciente:{db_medidas_musculos.id_paciente}")
     return db_medidas_musculos
 
+@trazado()
 def get_medidas_musculos_by_id(db: Session, id_musculos: int):
-    return db.query(models).filter(models.id_musculos == id_musculos).first()
+    return db.query(models).filter(de_la_clinica(db, models), models.id_musculos == id_musculos).first()
 
-def get_medidas_musculos_by_id_paciente(db: Session, id_paciente: int):
-    return db.query(models).filter(models.id_paciente == id_paciente).all()
+@trazado()
+def get_medidas_musculos_by_id_paciente(db: Session, id_paciente: int, desde: date | None = None, hasta: date | None = None):
+    # Filtrar por fecha permite a PostgreSQL descartar particiones completas
+    consulta = db.query(models).filter(de_la_clinica(db, models), models.id_paciente == id_paciente)
+    if desde is not None:
+        consulta = consulta.filter(models.fecha >= desde)
+    if hasta is not None:
+        consulta = consulta.filter(models.fecha <= hasta)
+    consulta = consulta.order_by(models.fecha)
+    if desde is not None or hasta is not None:
+        return consulta.all()
+    return cache.obtener(db, f"medidas_musculos:paciente:{id_paciente}", models, consulta.all)
     
+@trazado()
 def get_medidas_musculos(db: Session, skip=0, limit: int = 100):
-    return db.query(models).offset(skip).limit(limit).all()
+    return db.query(models).filter(de_la_clinica(db, models)).offset(skip).limit(limit).all()
 
-def update_medidas_musculos(db: Session, medidas_musculos: models, medidas_musculos_update: MedidasMusculosUpdate):
-    for key, value in medidas_musculos_update.dict().items():
-        setattr(medidas_musculos, key, value)
-    db.commit()
-    db.refresh(medidas_musculos)
+@trazado()
+def update_medidas_musculos(db: Session, id_musculos: int, medidas_musculos_update: MedidasMusculosUpdate | MedidasMusculosPatch, version: int | None = None, parcial: bool = False):
+    valores = medidas_musculos_update.model_dump(exclude_unset=parcial)
+    asegurar_particion(db, "medidas_musculos", valores.get("fecha"))
+    medidas_musculos, id_paciente_anterior = actualizar_por_id(
+        db, models, models.id_musculos, id_musculos, valores, version
+    )
+    if medidas_musculos is None:
+        return None
+    cache.invalidar(
+        db,
+        f"medidas_musculos:{id_musculos}",
+        "medidas_musculos:lista",
+        f"medidas_musculos:paciente:{id_paciente_anterior}",
+        f"medidas_musculos:paciente:{medidas_musculos.id_paciente}",
+        f"fhir:Observation:paciente:{id_paciente_anterior}",
+        f"fhir:Observation:paciente:{medidas_musculos.id_paciente}",
+    )
     return medidas_musculos
 
-def delete_medidas_musculos(db: Session, medidas_musculos: models):
-    db.delete(medidas_musculos)
-    db.commit()
+@trazado()
+def delete_medidas_musculos(db: Session, id_musculos: int):
+    medidas_musculos = eliminar_por_id(db, models, models.id_musculos, id_musculos)
+    if medidas_musculos is None:
+        return None
+    cache.invalidar(
+        db,
+        f"medidas_musculos:{id_musculos}",
+        "medidas_musculos:lista",
+        f"medidas_musculos:paciente:{medidas_musculos.id_paciente}",
+        f"fhir:Observation:paciente:{medidas_musculos.id_paciente}",
+    )
+    return medidas_musculos
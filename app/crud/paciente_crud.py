@@ -1,40 +1,174 @@
+from datetime import date, datetime
+from sqlalchemy import Date, delete, insert, literal, select
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import PacienteCreate, PacienteUpdate
+from config.database import clinica_de_sesion
+from schemas.schemas import PacienteCreate, PacienteUpdate, PacientePatch
 from models.models import Paciente as models
+from models.models import Cambio, Consulta, Expediente, MedidasMusculos, MedidasHuesos, RevisionExpediente
+from models.models import pacientes_archivo, expedientes_archivo, consulta_archivo, medidas_musculos_archivo, medidas_huesos_archivo
+from models.models import revisiones_expediente_archivo
+from services.busqueda_pacientes import indice_pacientes, programar_agregar, programar_eliminar
+from services import cache
+from services.outbox import registrar_evento
+from services.sincronizacion import registrar_cambios
+from services.trazas import trazado
+from crud.comun import actualizar_por_id, de_la_clinica, eliminar_por_id, insertar
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-  
+# Las tablas hijas se copian antes que pacientes; el DELETE final las limpia por cascada
+TABLAS_ARCHIVO = [
+    (Expediente.__table__, expedientes_archivo),
+    (RevisionExpediente.__table__, revisiones_expediente_archivo),
+    (Consulta.__table__, consulta_archivo),
+    (MedidasMusculos.__table__, medidas_musculos_archivo),
+    (MedidasHuesos.__table__, medidas_huesos_archivo),
+    (models.__table__, pacientes_archivo),
+]
+
+
+@trazado()
 def create_paciente(db: Session, paciente: PacienteCreate):
-        db_paciente = models(**paciente.model_dump())
-        db.add(db_paciente)
-        db.commit()
-        db.refresh(db_paciente)
-        return (db_paciente)
+    db_paciente = insertar(db, models, paciente.model_dump())
+    if db_paciente is None:
+        return None
+    cache.invalidar(db, f"paciente:{db_paciente.id_paciente}", "paciente:lista", f"fhir:Patient:{db_paciente.id_paciente}")
+    programar_agregar(db, db_paciente.id_paciente, db_paciente.nombre)
+    registrar_evento(db, "paciente", db_paciente.id_paciente, db_paciente.id_paciente, "crear")
+    return db_paciente
 
 
+@trazado()
 def get_paciente_by_id(db: Session, id_paciente: int):
-    return db.query(models).filter(models.id_paciente == id_paciente).first()
+    return cache.obtener(
+        db, f"paciente:{id_paciente}", models,
+        lambda: db.query(models).filter(de_la_clinica(db, models), models.id_paciente == id_paciente).first(),
+    )
 
 
+@trazado()
 def get_pacientes(db: Session, skip = 0, limit: int = 100):
-    return db.query(models).offset(skip).limit(limit).all()
+    return db.query(models).filter(de_la_clinica(db, models)).offset(skip).limit(limit).all()
+
+
+@trazado()
+def buscar_pacientes(db: Session, q: str, limit: int = 10):
+    indice = indice_pacientes(clinica_de_sesion(db))
+    if indice.necesita_carga():
+        indice.cargar(db.query(models.id_paciente, models.nombre).filter(de_la_clinica(db, models)).all())
+    ids = [id_paciente for id_paciente, _ in indice.buscar(q, limit)]
+    if not ids:
+        return []
+    pacientes = {p.id_paciente: p for p in db.query(models).filter(de_la_clinica(db, models), models.id_paciente.in_(ids)).all()}
+    return [pacientes[id_paciente] for id_paciente in ids if id_paciente in pacientes]
+
+
+@trazado()
+def update_paciente(db: Session, id_paciente: int, paciente_update: PacienteUpdate | PacientePatch, version: int | None = None, parcial: bool = False):
+    paciente, _ = actualizar_por_id(
+        db, models, models.id_paciente, id_paciente, paciente_update.model_dump(exclude_unset=parcial), version
+    )
+    if paciente is None:
+        return None
+    cache.invalidar(db, f"paciente:{id_paciente}", "paciente:lista", f"fhir:Patient:{id_paciente}")
+    programar_agregar(db, paciente.id_paciente, paciente.nombre)
+    registrar_evento(db, "paciente", id_paciente, id_paciente, "actualizar")
+    return paciente
+
 
+def claves_paciente(id_paciente: int):
+    return (
+        f"paciente:{id_paciente}",
+        "paciente:lista",
+        f"expediente:paciente:{id_paciente}",
+        f"consultas:paciente:{id_paciente}",
+        f"medidas_musculos:paciente:{id_paciente}",
+        f"medidas_huesos:paciente:{id_paciente}",
+        "expediente:lista",
+        "consultas:lista",
+        "medidas_musculos:lista",
+        "medidas_huesos:lista",
+        f"fhir:Patient:{id_paciente}",
+        f"fhir:Observation:paciente:{id_paciente}",
+    )
 
-def update_paciente(db: Session, paciente: models, paciente_update:PacienteUpdate):
-    for key, value in paciente_update.dict().items():
-        setattr(paciente, key, value)
-    db.commit()
-    db.refresh(paciente)
+
+@trazado()
+def delete_paciente(db: Session, id_paciente: int):
+    paciente = eliminar_por_id(db, models, models.id_paciente, id_paciente)
+    if paciente is None:
+        return None
+    cache.invalidar(db, *claves_paciente(id_paciente))
+    programar_eliminar(db, id_paciente)
+    registrar_evento(db, "paciente", id_paciente, id_paciente, "eliminar")
     return paciente
 
 
-def delete_paciente(db: Session, paciente: models):
-    db.delete(paciente)
-    db.commit()
+def _de_pacientes(db: Session, tabla, ids: list[int]):
+    if "id_paciente" in tabla.c:
+        return tabla.c.id_paciente.in_(ids)
+    # Las revisiones se ligan al paciente por su expediente
+    return tabla.c.id_expediente.in_(
+        select(Expediente.id_expediente).where(Expediente.id_paciente.in_(ids), de_la_clinica(db, Expediente))
+    )
+
+
+def _archivar(db: Session, ids: list[int]):
+    hoy = date.today()
+    for tabla, archivo in TABLAS_ARCHIVO:
+        columnas = [c.name for c in tabla.columns]
+        db.execute(
+            insert(archivo).from_select(
+                columnas + ["fecha_archivo"],
+                select(*tabla.columns, literal(hoy, Date)).where(
+                    _de_pacientes(db, tabla, ids), tabla.c.id_clinica == clinica_de_sesion(db)
+                ),
+            )
+        )
+    db.execute(delete(models).where(models.id_paciente.in_(ids), de_la_clinica(db, models)), execution_options={"synchronize_session": False})
+    for id_paciente in ids:
+        cache.invalidar(db, *claves_paciente(id_paciente))
+    # Para las tabletas un paciente archivado es un paciente eliminado
+    registrar_cambios(db, "pacientes", "eliminar", [(id_paciente, id_paciente) for id_paciente in ids])
+
+
+@trazado()
+def archivar_paciente(db: Session, id_paciente: int):
+    paciente = get_paciente_by_id(db, id_paciente)
+    if paciente is None:
+        return None
+    _archivar(db, [id_paciente])
+    programar_eliminar(db, id_paciente)
     return paciente
+
+
+@trazado()
+def archivar_lote_inactivos(db: Session, antes_de: date, lote: int = 500):
+    # Archiva hasta `lote` pacientes sin actividad desde `antes_de` y devuelve
+    # cuántos fueron. Cuentan como actividad las consultas y medidas, la
+    # última modificación del expediente y cualquier escritura registrada en la
+    # bitácora de /sync (altas y ediciones del paciente). Un paciente sin
+    # ningún registro posterior también es inactivo. La bitácora solo guarda
+    # CAMBIOS_DIAS días, así que un `antes_de` más antiguo no ve las escrituras
+    # purgadas.
+    def sin_actividad(modelo, columna, desde):
+        return ~select(modelo.id_paciente).where(
+            modelo.id_paciente == models.id_paciente, modelo.id_clinica == models.id_clinica, columna >= desde
+        ).exists()
+
+    inactivos = (
+        select(models.id_paciente)
+        .where(
+            de_la_clinica(db, models),
+            sin_actividad(Consulta, Consulta.fecha, antes_de),
+            sin_actividad(MedidasMusculos, MedidasMusculos.fecha, antes_de),
+            sin_actividad(MedidasHuesos, MedidasHuesos.fecha, antes_de),
+            sin_actividad(Expediente, Expediente.fecha_modificacion, antes_de),
+            sin_actividad(Cambio, Cambio.creado_en, datetime.combine(antes_de, datetime.min.time())),
+        )
+        .limit(lote)
+    )
+    ids = db.execute(inactivos).scalars().all()
+    if ids:
+        _archivar(db, ids)
+        for id_paciente in ids:
+            programar_eliminar(db, id_paciente)
+    return len(ids)
@@ -0,0 +1,88 @@
+import json
+from datetime import datetime, timezone
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from config.database import clinica_de_sesion
+from models.models import RevisionExpediente as models
+from services.revisiones import REVISIONES_INSTANTANEA, a_json, aplicar, compactar, diferencias
+from services.trazas import trazado
+from crud.comun import de_la_clinica
+
+
+def _guardar(db: Session, id_expediente: int, expediente, diferencia: str | None):
+    db.execute(insert(models).values(
+        id_clinica=clinica_de_sesion(db),
+        id_expediente=id_expediente,
+        version=expediente.version,
+        fecha_modificacion=expediente.fecha_modificacion,
+        creado_en=datetime.now(timezone.utc).replace(tzinfo=None),
+        diferencia=diferencia,
+        instantanea=expediente.datos if diferencia is None else None,
+    ))
+
+
+@trazado()
+def registrar_revision(db: Session, expediente, anterior=None):
+    # Guarda la diferencia contra `anterior` (datos, version y fecha_modificacion
+    # antes del cambio); el costo de escritura es el del cambio y no el del
+    # documento completo
+    recientes = db.execute(
+        select(models.version, models.diferencia.is_(None))
+        .where(de_la_clinica(db, models), models.id_expediente == expediente.id_expediente)
+        .order_by(models.version.desc())
+        .limit(REVISIONES_INSTANTANEA)
+    ).all()
+    if anterior is not None and not recientes:
+        # Expediente anterior al historial: su estado previo es la primera instantánea
+        _guardar(db, expediente.id_expediente, anterior, None)
+        recientes = [(anterior.version, True)]
+
+    diferencia = None
+    # Sin instantánea en las últimas REVISIONES_INSTANTANEA revisiones toca una
+    if anterior is not None and any(instantanea for _, instantanea in recientes):
+        documento_anterior, anterior_valido = a_json(anterior.datos)
+        documento_nuevo, nuevo_valido = a_json(expediente.datos)
+        if anterior_valido and nuevo_valido:
+            diferencia = compactar(diferencias(documento_anterior, documento_nuevo))
+            # Si el cambio es casi todo el documento conviene guardarlo completo
+            if len(diferencia) > len(expediente.datos) / 2:
+                diferencia = None
+    _guardar(db, expediente.id_expediente, expediente, diferencia)
+
+
+@trazado()
+def get_revisiones(db: Session, id_expediente: int, skip: int = 0, limit: int = 100):
+    return db.execute(
+        select(models.version, models.fecha_modificacion, models.creado_en, models.diferencia)
+        .where(de_la_clinica(db, models), models.id_expediente == id_expediente)
+        .order_by(models.version.desc())
+        .offset(skip).limit(limit)
+    ).all()
+
+
+@trazado()
+def get_version_expediente(db: Session, id_expediente: int, version: int):
+    # Parte de la última instantánea anterior a la versión pedida y aplica las
+    # diferencias que siguen. Devuelve (revisión, datos) o None si la versión
+    # es anterior al historial.
+    filtro = (de_la_clinica(db, models), models.id_expediente == id_expediente)
+    desde = (
+        select(models.version)
+        .where(*filtro, models.diferencia.is_(None), models.version <= version)
+        .order_by(models.version.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    revisiones = db.execute(
+        select(models).where(*filtro, models.version >= desde, models.version <= version).order_by(models.version)
+    ).scalars().all()
+    if not revisiones:
+        return None
+    ultima = revisiones[-1]
+    if ultima.diferencia is None:
+        # Se devuelve el texto tal cual se guardó
+        return ultima, ultima.instantanea
+    documento, _ = a_json(revisiones[0].instantanea)
+    for revision in revisiones[1:]:
+        documento = aplicar(documento, json.loads(revision.diferencia))
+    return ultima, json.dumps(documento, ensure_ascii=False)
@@ -0,0 +1,76 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from config.database import clinica_de_sesion
+from models.models import Cambio, SecuenciaCambios
+from models.models import Paciente, Expediente, Consulta, MedidasMusculos, MedidasHuesos
+from schemas import schemas
+from services.trazas import trazado
+
+TABLAS_SYNC = {
+    "pacientes": (Paciente, Paciente.id_paciente, schemas.Paciente),
+    "expedientes": (Expediente, Expediente.id_expediente, schemas.Expediente),
+    "consulta": (Consulta, Consulta.id_consulta, schemas.Consulta),
+    "medidas_musculos": (MedidasMusculos, MedidasMusculos.id_musculos, schemas.MedidasMusculos),
+    "medidas_huesos": (MedidasHuesos, MedidasHuesos.id_huesos, schemas.MedidasHuesos),
+}
+
+
+@trazado()
+def get_secuencia(db: Session):
+    # (última secuencia, purgado hasta) de la clínica de la sesión
+    fila = db.execute(
+        select(SecuenciaCambios.valor, SecuenciaCambios.purgado_hasta)
+        .where(SecuenciaCambios.id_clinica == clinica_de_sesion(db))
+    ).first()
+    return (fila.valor, fila.purgado_hasta) if fila else (0, 0)
+
+
+@trazado()
+def get_cambios_desde(db: Session, desde: int, limite: int):
+    # Devuelve el estado final de cada registro que cambió después de `desde`:
+    # si un registro cambió varias veces solo viaja una vez, y si ya no existe
+    # se manda como eliminado
+    cambios = db.execute(
+        select(Cambio.secuencia, Cambio.tabla, Cambio.id_registro, Cambio.operacion)
+        .where(Cambio.id_clinica == clinica_de_sesion(db), Cambio.secuencia > desde)
+        .order_by(Cambio.secuencia)
+        .limit(limite + 1)
+    ).all()
+    hay_mas = len(cambios) > limite
+    cambios = cambios[:limite]
+
+    ultimos = {}
+    for cambio in cambios:
+        ultimos[(cambio.tabla, cambio.id_registro)] = cambio.operacion
+    resultado = {}
+    for tabla, (modelo, columna_id, esquema) in TABLAS_SYNC.items():
+        ids = {id_registro for (t, id_registro) in ultimos if t == tabla}
+        if not ids:
+            continue
+        vigentes = [id_registro for id_registro in ids if ultimos[(tabla, id_registro)] != "eliminar"]
+        filas = db.execute(
+            select(modelo).where(modelo.id_clinica == clinica_de_sesion(db), columna_id.in_(vigentes))
+        ).scalars().all() if vigentes else []
+        guardados = [esquema.model_validate(fila).model_dump(mode="json") for fila in filas]
+        existentes = {getattr(fila, columna_id.key) for fila in filas}
+        resultado[tabla] = {"guardados": guardados, "eliminados": sorted(ids - existentes)}
+    return {
+        "siguiente": cambios[-1].secuencia if cambios else desde,
+        "hay_mas": hay_mas,
+        "cambios": resultado,
+    }
+
+
+@trazado()
+def get_cambios_posteriores(db: Session, desde: int, id_paciente: int | None, limite: int):
+    # Cambios tal cual, en orden; sirve para reponer lo que un cliente de
+    # /eventos se perdió mientras estaba desconectado
+    consulta = (
+        select(Cambio.secuencia, Cambio.tabla, Cambio.id_registro, Cambio.id_paciente, Cambio.operacion)
+        .where(Cambio.id_clinica == clinica_de_sesion(db), Cambio.secuencia > desde)
+        .order_by(Cambio.secuencia)
+        .limit(limite)
+    )
+    if id_paciente is not None:
+        consulta = consulta.where(Cambio.id_paciente == id_paciente)
+    return [dict(fila._mapping) for fila in db.execute(consulta)]
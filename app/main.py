@@ -1,11 +1,26 @@
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
-from config.database  import engine, Base
-import routes.paciente_route, routes.expediente_route, routes.consulta_route, routes.medidas_musculos_route, routes.medidas_huesos_route, routes.patient_fhir_route, routes.expediente_fhir_route
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+from config.database  import engine, Base, crear_esquema, motores_clinicas
+import routes.paciente_route, routes.expediente_route, routes.consulta_route, routes.medidas_musculos_route, routes.medidas_huesos_route, routes.patient_fhir_route, routes.expediente_fhir_route, routes.cache_route, routes.metricas_route, routes.estado_fhir_route, routes.exportacion_fhir_route, routes.fhir_route, routes.importacion_fhir_route, routes.sincronizacion_route, routes.eventos_route, routes.crecimiento_route, routes.duplicados_route
 from fastapi.middleware.cors import CORSMiddleware
+from crud.comun import ConflictoVersion, PacienteNoEncontrado
+from services.particiones import crear_particiones_iniciales
+from services.clinicas import MiddlewareClinica
+from services.unidad_trabajo import MiddlewareUnidadDeTrabajo
+from services.metricas import MiddlewareMetricas
+from services.trazas import MiddlewareTrazas
+from services.compresion import MiddlewareCompresion
+from services.detector_consultas import DETECTOR_CONSULTAS, MiddlewareDetectorConsultas
+from services.outbox import OUTBOX_FHIR, despachador
+from services.fhir_cliente import FhirNoDisponible
+from services.eventos import detener_escuchas, iniciar_escuchas
 
 
-Base.metadata.create_all(bind=engine)
+# La base principal y cada base o esquema de clínica se preparan igual
+for motor in [engine, *motores_clinicas.values()]:
+    crear_esquema(motor)
+    Base.metadata.create_all(bind=motor)
+    crear_particiones_iniciales(motor)
 
 app = FastAPI()
 app.title = "Nutriologa - API"
@@ -16,6 +31,48 @@ def read_root():
     return RedirectResponse(url="/docs")
 
 
+@app.on_event("startup")
+def iniciar_outbox():
+    if OUTBOX_FHIR:
+        despachador.iniciar()
+
+
+@app.on_event("shutdown")
+def detener_outbox():
+    despachador.detener()
+
+
+@app.on_event("startup")
+def iniciar_eventos():
+    iniciar_escuchas()
+
+
+@app.on_event("shutdown")
+def detener_eventos():
+    detener_escuchas()
+
+
+@app.exception_handler(ConflictoVersion)
+def conflicto_version(request: Request, exc: ConflictoVersion):
+    return JSONResponse(status_code=412, content={"detail": str(exc), "version_actual": exc.version_actual})
+
+
+@app.exception_handler(PacienteNoEncontrado)
+def paciente_no_encontrado(request: Request, exc: PacienteNoEncontrado):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+
+@app.exception_handler(FhirNoDisponible)
+def fhir_no_disponible(request: Request, exc: FhirNoDisponible):
+    encabezados = {"Retry-After": str(max(1, round(exc.reintentar_en)))} if exc.reintentar_en else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=encabezados)
+
+
+app.add_middleware(MiddlewareUnidadDeTrabajo)
+if DETECTOR_CONSULTAS:
+    app.add_middleware(MiddlewareDetectorConsultas)
+app.add_middleware(MiddlewareClinica)
+
 # Configurar CORS
 origins = [
     "http://localhost:4200",
@@ -29,11 +86,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+app.add_middleware(MiddlewareCompresion)
+
+# Métricas y trazas van por fuera de todo para medir la petición completa, incluida la confirmación
+app.add_middleware(MiddlewareMetricas)
+app.add_middleware(MiddlewareTrazas)
         
+# Antes que paciente_route para que /pacientes/duplicados no se tome como un id
+app.include_router(routes.duplicados_route.router)
 app.include_router(routes.paciente_route.router)
 app.include_router(routes.expediente_route.router)
 app.include_router(routes.consulta_route.router)
 app.include_router(routes.medidas_musculos_route.router)
 app.include_router(routes.medidas_huesos_route.router)
 app.include_router(routes.patient_fhir_route.router)
-app.include_router(routes.expediente_fhir_route.router)
\ No newline at end of file
+app.include_router(routes.expediente_fhir_route.router)
+app.include_router(routes.cache_route.router)
+app.include_router(routes.metricas_route.router)
+app.include_router(routes.estado_fhir_route.router)
+# Antes que fhir_route para que /fhir/Patient/$export no se tome como un id
+app.include_router(routes.exportacion_fhir_route.router)
+app.include_router(routes.fhir_route.router)
+app.include_router(routes.importacion_fhir_route.router)
+app.include_router(routes.sincronizacion_route.router)
+app.include_router(routes.eventos_route.router)
+app.include_router(routes.crecimiento_route.router)
@@ -0,0 +1,54 @@
+-- Multi-clínica: columna id_clinica en las tablas clínicas y llaves foráneas
+-- compuestas (id_paciente, id_clinica). create_all no altera tablas que ya
+-- existen, así que una base creada antes de este cambio se migra con
+--   psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migraciones/clinicas.sql
+-- Los registros existentes quedan en la clínica 'principal' (el DEFAULT llena
+-- las filas al agregar la columna); si CLINICA_PREDETERMINADA es otra, cambie
+-- el valor antes de ejecutar. Se ejecuta una sola vez, dentro de una transacción.
+-- Con CLINICAS_ESQUEMAS, ejecútelo también en cada esquema (SET search_path).
+
+BEGIN;
+
+ALTER TABLE pacientes ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+CREATE INDEX IF NOT EXISTS ix_pacientes_id_clinica ON pacientes (id_clinica);
+ALTER TABLE pacientes ADD CONSTRAINT pacientes_id_paciente_id_clinica_key UNIQUE (id_paciente, id_clinica);
+
+ALTER TABLE expedientes ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+CREATE INDEX IF NOT EXISTS ix_expedientes_id_clinica ON expedientes (id_clinica);
+ALTER TABLE expedientes DROP CONSTRAINT IF EXISTS expedientes_id_paciente_fkey;
+ALTER TABLE expedientes ADD CONSTRAINT expedientes_id_paciente_id_clinica_fkey
+    FOREIGN KEY (id_paciente, id_clinica) REFERENCES pacientes (id_paciente, id_clinica) ON DELETE CASCADE;
+
+ALTER TABLE consulta ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+CREATE INDEX IF NOT EXISTS ix_consulta_id_clinica ON consulta (id_clinica);
+ALTER TABLE consulta DROP CONSTRAINT IF EXISTS consulta_id_paciente_fkey;
+ALTER TABLE consulta ADD CONSTRAINT consulta_id_paciente_id_clinica_fkey
+    FOREIGN KEY (id_paciente, id_clinica) REFERENCES pacientes (id_paciente, id_clinica) ON DELETE CASCADE;
+
+ALTER TABLE medidas_musculos ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+CREATE INDEX IF NOT EXISTS ix_medidas_musculos_id_clinica ON medidas_musculos (id_clinica);
+ALTER TABLE medidas_musculos DROP CONSTRAINT IF EXISTS medidas_musculos_id_paciente_fkey;
+ALTER TABLE medidas_musculos ADD CONSTRAINT medidas_musculos_id_paciente_id_clinica_fkey
+    FOREIGN KEY (id_paciente, id_clinica) REFERENCES pacientes (id_paciente, id_clinica) ON DELETE CASCADE;
+
+ALTER TABLE medidas_huesos ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+CREATE INDEX IF NOT EXISTS ix_medidas_huesos_id_clinica ON medidas_huesos (id_clinica);
+ALTER TABLE medidas_huesos DROP CONSTRAINT IF EXISTS medidas_huesos_id_paciente_fkey;
+ALTER TABLE medidas_huesos ADD CONSTRAINT medidas_huesos_id_paciente_id_clinica_fkey
+    FOREIGN KEY (id_paciente, id_clinica) REFERENCES pacientes (id_paciente, id_clinica) ON DELETE CASCADE;
+
+-- Las tablas de archivo copian las columnas de las originales
+ALTER TABLE pacientes_archivo ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+ALTER TABLE expedientes_archivo ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+ALTER TABLE consulta_archivo ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+ALTER TABLE medidas_musculos_archivo ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+ALTER TABLE medidas_huesos_archivo ADD COLUMN IF NOT EXISTS id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+
+COMMIT;
+
+-- SQLite no puede agregar restricciones a una tabla existente. Basta con las
+-- columnas: las llaves foráneas de una sola columna siguen borrando en
+-- cascada y el CRUD revisa la clínica del paciente en cada INSERT y UPDATE.
+--   ALTER TABLE pacientes ADD COLUMN id_clinica VARCHAR NOT NULL DEFAULT 'principal';
+--   (igual para expedientes, consulta, medidas_musculos, medidas_huesos y las *_archivo)
+--   CREATE UNIQUE INDEX pacientes_id_paciente_id_clinica_key ON pacientes (id_paciente, id_clinica);
@@ -1,9 +1,40 @@
-from sqlalchemy import Column, Integer, String, Date, Float, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, ForeignKeyConstraint, Index, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
-from config.database import Base
+from config.database import Base, PARTICIONADO, CLINICA_PREDETERMINADA
+
+
+# Consulta y medidas se pueden particionar por rango de fecha (PostgreSQL). La
+# llave primaria debe incluir la columna de partición, y una tabla particionada
+# no puede ser destino de llaves foráneas sobre su id.
+def args_por_fecha(tabla):
+    indice = Index(f"ix_{tabla}_paciente_fecha", "id_paciente", "fecha")
+    if PARTICIONADO:
+        return (indice, {"postgresql_partition_by": "RANGE (fecha)"})
+    return (indice,)
+
+
+def llave_hija(destino):
+    return [] if PARTICIONADO else [ForeignKey(destino, ondelete="CASCADE")]
+
+
+# Cada registro pertenece a una clínica. Los hijos apuntan al paciente junto con
+# su clínica para que no se pueda ligar un registro a un paciente de otra.
+# Las bases creadas antes de esto se migran con migraciones/clinicas.sql.
+def columna_clinica():
+    return Column(String, nullable=False, index=True, server_default=CLINICA_PREDETERMINADA)
+
+
+def llave_paciente():
+    return ForeignKeyConstraint(
+        ["id_paciente", "id_clinica"],
+        ["pacientes.id_paciente", "pacientes.id_clinica"],
+        ondelete="CASCADE",
+    )
+
 
 class Paciente(Base):
     __tablename__ = "pacientes"
+    __table_args__ = (UniqueConstraint("id_paciente", "id_clinica"),)
     
     id_paciente = Column(Integer, primary_key=True, index=True, autoincrement=True)
     nombre = Column(String, index=True)
@@ -12,35 +43,59 @@ class Paciente(Base):
     genero = Column(String)
     fecha_nacimiento = Column(Date)
     ocupacion = Column(String)
+    id_clinica = columna_clinica()
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
-    expedientes = relationship("Expediente", back_populates="pacientes",  cascade="all, delete-orphan")
-    consultas = relationship("Consulta", back_populates="pacientes", cascade="all, delete-orphan")
-    medidas_musculos = relationship("MedidasMusculos", back_populates="pacientes", cascade="all, delete-orphan")
-    medidas_huesos = relationship("MedidasHuesos", back_populates="pacientes", cascade="all, delete-orphan")
+    expedientes = relationship("Expediente", back_populates="pacientes",  cascade="all, delete-orphan", passive_deletes=True)
+    consultas = relationship("Consulta", back_populates="pacientes", cascade="all, delete-orphan", passive_deletes=True)
+    medidas_musculos = relationship("MedidasMusculos", back_populates="pacientes", cascade="all, delete-orphan", passive_deletes=True)
+    medidas_huesos = relationship("MedidasHuesos", back_populates="pacientes", cascade="all, delete-orphan", passive_deletes=True)
     
     
     
 class Expediente(Base):
     __tablename__ = "expedientes"
+    __table_args__ = (llave_paciente(),)
     
     id_expediente = Column(Integer, primary_key=True, index=True, autoincrement=True)
     fecha_modificacion = Column(Date)
     datos = Column(String) # Este en la bd es tipo json y se debe estructurar en el front
-    id_paciente = Column(Integer, ForeignKey("pacientes.id_paciente"))
+    id_paciente = Column(Integer, index=True)
+    id_clinica = columna_clinica()
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     pacientes = relationship("Paciente", back_populates="expedientes")
     
     
+# Historial de `datos` de cada expediente: la diferencia JSON (RFC 6902) contra
+# la versión anterior y, cada tanto, el documento completo para no tener que
+# aplicar toda la cadena al reconstruir una versión. Sin diferencia, la
+# revisión es una instantánea y `instantanea` tiene el texto completo.
+class RevisionExpediente(Base):
+    __tablename__ = "revisiones_expediente"
+    __table_args__ = (UniqueConstraint("id_expediente", "version"),)
+
+    id_revision = Column(Integer, primary_key=True, autoincrement=True)
+    id_clinica = columna_clinica()
+    id_expediente = Column(Integer, ForeignKey("expedientes.id_expediente", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    fecha_modificacion = Column(Date)
+    creado_en = Column(DateTime, nullable=False)
+    diferencia = Column(String)
+    instantanea = Column(String)
+
+
 paciente_musculos = Table(
     'paciente_musculos',
     Base.metadata,
-    Column('id_paciente', Integer, ForeignKey('pacientes.id_paciente')),
-    Column('id_musculos', Integer, ForeignKey('medidas_musculos.id_musculos'))
+    Column('id_paciente', Integer, ForeignKey('pacientes.id_paciente', ondelete="CASCADE")),
+    Column('id_musculos', Integer, *llave_hija('medidas_musculos.id_musculos'))
 )  
     
     
 class MedidasMusculos(Base):
     __tablename__ = "medidas_musculos"
+    __table_args__ = (llave_paciente(), *args_por_fecha("medidas_musculos"))
     
     id_musculos = Column(Integer, primary_key=True, index=True, autoincrement=True)
     bicep = Column(Float)
@@ -55,8 +110,10 @@ class MedidasMusculos(Base):
     gemelo = Column(Float)
     torax = Column(Float)
     gluteo = Column(Float)
-    fecha = Column(Date)
-    id_paciente  = Column(Integer, ForeignKey('pacientes.id_paciente'))
+    fecha = Column(Date, primary_key=PARTICIONADO)
+    id_paciente  = Column(Integer, index=True)
+    id_clinica = columna_clinica()
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     pacientes = relationship("Paciente", back_populates="medidas_musculos")
     
@@ -64,6 +121,7 @@ class MedidasMusculos(Base):
     
 class MedidasHuesos(Base):
     __tablename__ = "medidas_huesos" 
+    __table_args__ = (llave_paciente(), *args_por_fecha("medidas_huesos"))
     
     id_huesos = Column(Integer, primary_key=True, index=True, autoincrement=True)
     biacromial = Column(Integer)
@@ -74,8 +132,10 @@ class MedidasHuesos(Base):
     carpo = Column(Integer)
     femur = Column(Integer)
     tobillo = Column(Integer)
-    fecha = Column(Date)
-    id_paciente = Column(Integer, ForeignKey('pacientes.id_paciente'))
+    fecha = Column(Date, primary_key=PARTICIONADO)
+    id_paciente = Column(Integer, index=True)
+    id_clinica = columna_clinica()
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     pacientes = relationship("Paciente", back_populates="medidas_huesos")
     
@@ -83,16 +143,17 @@ class MedidasHuesos(Base):
 paciente_consulta = Table(
     'paciente_consulta',
     Base.metadata,
-    Column('id_paciente', Integer, ForeignKey('pacientes.id_paciente')),
-    Column('id_consulta', Integer, ForeignKey('consulta.id_consulta'))
+    Column('id_paciente', Integer, ForeignKey('pacientes.id_paciente', ondelete="CASCADE")),
+    Column('id_consulta', Integer, *llave_hija('consulta.id_consulta'))
 )   
 
     
 class Consulta(Base):
     __tablename__ = "consulta"
+    __table_args__ = (llave_paciente(), *args_por_fecha("consulta"))
     
     id_consulta = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    fecha = Column(Date)
+    fecha = Column(Date, primary_key=PARTICIONADO)
     pesoafuera = Column(Float)
     tallaafuera = Column(Float)
     tallasentado = Column(Float)
@@ -101,7 +162,86 @@ class Consulta(Base):
     frecuencia_cardiaca = Column(Integer)
     nivel_oxigeno = Column(Integer)
     temperatura = Column(Float)
-    id_paciente = Column(Integer, ForeignKey('pacientes.id_paciente'))
+    id_paciente = Column(Integer, index=True)
+    id_clinica = columna_clinica()
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     pacientes = relationship("Paciente", back_populates="consultas")
-    
\ No newline at end of file
+
+
+# Bandeja de salida hacia el servidor FHIR: cada escritura clínica agrega aquí
+# un evento en la misma transacción y services/outbox.py los envía por lotes.
+class EventoSalida(Base):
+    __tablename__ = "eventos_salida"
+
+    id_evento = Column(Integer, primary_key=True, autoincrement=True)
+    id_clinica = columna_clinica()
+    recurso = Column(String, nullable=False)
+    id_registro = Column(Integer, nullable=False)
+    id_paciente = Column(Integer, nullable=False, index=True)
+    operacion = Column(String, nullable=False)
+    creado_en = Column(DateTime, nullable=False)
+    intentos = Column(Integer, nullable=False, default=0, server_default="0")
+    siguiente_intento = Column(DateTime, nullable=False, index=True)
+    ultimo_error = Column(String)
+    # Con valor ya no se reintenta: agotó OUTBOX_MAX_INTENTOS
+    fallido_en = Column(DateTime)
+
+
+# Bitácora de cambios para que las tabletas sincronicen solo lo nuevo (GET /sync).
+# La secuencia es por clínica y se asigna al confirmar la transacción, así que
+# sigue el orden de confirmación; ver services/sincronizacion.py.
+class Cambio(Base):
+    __tablename__ = "cambios"
+
+    id_clinica = Column(String, primary_key=True)
+    secuencia = Column(Integer, primary_key=True, autoincrement=False)
+    tabla = Column(String, nullable=False)
+    id_registro = Column(Integer, nullable=False)
+    id_paciente = Column(Integer, nullable=False)
+    operacion = Column(String, nullable=False)
+    creado_en = Column(DateTime, nullable=False)
+
+
+class SecuenciaCambios(Base):
+    __tablename__ = "secuencias_cambios"
+
+    id_clinica = Column(String, primary_key=True)
+    valor = Column(Integer, nullable=False, default=0, server_default="0")
+    # Los cambios hasta esta secuencia ya se purgaron; un token anterior ya no sirve
+    purgado_hasta = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+# Pares de pacientes que el detector de duplicados cree que son la misma
+# persona; quedan pendientes hasta que alguien los fusiona o los descarta.
+class PosibleDuplicado(Base):
+    __tablename__ = "posibles_duplicados"
+    __table_args__ = (UniqueConstraint("id_clinica", "id_paciente_a", "id_paciente_b"),)
+
+    id_duplicado = Column(Integer, primary_key=True, autoincrement=True)
+    id_clinica = columna_clinica()
+    id_paciente_a = Column(Integer, nullable=False, index=True)
+    id_paciente_b = Column(Integer, nullable=False, index=True)
+    puntaje = Column(Float, nullable=False)
+    motivos = Column(String)
+    estado = Column(String, nullable=False, default="pendiente", server_default="pendiente", index=True)
+    detectado_en = Column(DateTime, nullable=False)
+
+
+# Tablas de archivo: misma estructura que las tablas activas más la fecha en
+# que se archivó. Mantienen pequeñas las tablas consultadas a diario.
+def tabla_archivo(tabla):
+    return Table(
+        f"{tabla.name}_archivo",
+        Base.metadata,
+        *[Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in tabla.columns],
+        Column("fecha_archivo", Date),
+    )
+
+
+pacientes_archivo = tabla_archivo(Paciente.__table__)
+expedientes_archivo = tabla_archivo(Expediente.__table__)
+consulta_archivo = tabla_archivo(Consulta.__table__)
+medidas_musculos_archivo = tabla_archivo(MedidasMusculos.__table__)
+medidas_huesos_archivo = tabla_archivo(MedidasHuesos.__table__)
+revisiones_expediente_archivo = tabla_archivo(RevisionExpediente.__table__)
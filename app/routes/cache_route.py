@@ -0,0 +1,8 @@
+from fastapi import APIRouter
+from services import cache
+
+router = APIRouter()
+
+@router.get("/cache/estadisticas", response_model=dict)
+def obtener_estadisticas_cache():
+    return cache.estadisticas()
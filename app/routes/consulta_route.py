@@ -1,60 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import Consulta, ConsultaCreate, ConsultaUpdate
+from config.database import get_db
+from schemas.schemas import Consulta, ConsultaCreate, ConsultaUpdate, ConsultaPatch
+from services.etag import verificar_etag, verificar_version, version_de_if_match
+from services.detector_consultas import presupuesto_consultas
 from crud.consulta_crud import create_consulta, get_consultas, get_consulta_by_id, update_consulta, delete_consulta, get_consulta_by_id_paciente
-from crud.paciente_crud import get_paciente_by_id
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.post("/consultas/", response_model=Consulta)
 def agregar_consulta(consulta: ConsultaCreate, db: Session = Depends(get_db)):
-    paciente = get_paciente_by_id(db, id_paciente=consulta.id_paciente)
-    if paciente is None:
-        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     db_consulta = create_consulta(db=db, consulta=consulta)
+    if db_consulta is None:
+        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     return db_consulta
 
 @router.get("/consultas/", response_model=list[Consulta])
-def obtener_consultas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_consultas(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    verificar_etag(request, response, "consultas:lista")
     consultas = get_consultas(db, skip=skip, limit=limit)
     return consultas
 
 @router.get("/consultas/{id_consulta}", response_model=Consulta)
-def obtener_consulta_por_id(id_consulta: int, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_consulta_por_id(id_consulta: int, request: Request, response: Response, db: Session = Depends(get_db)):
     db_consulta = get_consulta_by_id(db, id_consulta=id_consulta)
     if db_consulta is None:
         raise HTTPException(status_code=404, detail="El ID de la consulta no existe")
+    verificar_version(request, response, db_consulta.version)
     return db_consulta
 
 @router.get("/consultas/paciente/{id_paciente}", response_model=list[Consulta])
-def obtener_consulta_por_id_paciente(id_paciente: int, db: Session = Depends(get_db)):
-    db_consulta = get_consulta_by_id_paciente(db, id_paciente=id_paciente)
+@presupuesto_consultas(1)
+def obtener_consulta_por_id_paciente(
+    id_paciente: int,
+    request: Request,
+    response: Response,
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: Session = Depends(get_db),
+):
+    verificar_etag(request, response, f"consultas:paciente:{id_paciente}")
+    db_consulta = get_consulta_by_id_paciente(db, id_paciente=id_paciente, desde=desde, hasta=hasta)
     if db_consulta is None:
         raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     return db_consulta
 
 @router.put("/consultas/{id_consulta}", response_model=Consulta)
 def actualizar_consulta(
-    id_consulta: int, consulta_update: ConsultaUpdate, db: Session = Depends(get_db)
+    id_consulta: int,
+    consulta_update: ConsultaUpdate,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
 ):
-    db_consulta = get_consulta_by_id(db, id_consulta=id_consulta)
+    db_consulta = update_consulta(db, id_consulta, consulta_update, version=version_de_if_match(if_match))
+    if db_consulta is None:
+        raise HTTPException(status_code=404, detail="El ID de la consulta no existe")
+    return db_consulta
+
+@router.patch("/consultas/{id_consulta}", response_model=Consulta)
+def modificar_consulta(
+    id_consulta: int,
+    consulta_patch: ConsultaPatch,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    db_consulta = update_consulta(db, id_consulta, consulta_patch, version=version_de_if_match(if_match), parcial=True)
     if db_consulta is None:
         raise HTTPException(status_code=404, detail="El ID de la consulta no existe")
-    db_consulta = update_consulta(db, db_consulta, consulta_update)
     return db_consulta
 
 @router.delete("/consultas/{id_consulta}", response_model=Consulta)
 def eliminar_consulta(id_consulta: int, db: Session = Depends(get_db)):
-    db_consulta = get_consulta_by_id(db, id_consulta=id_consulta)
+    db_consulta = delete_consulta(db, id_consulta)
     if db_consulta is None:
         raise HTTPException(status_code=404, detail="El ID de la consulta no existe")
-    delete_consulta(db, db_consulta)
     return db_consulta
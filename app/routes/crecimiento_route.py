@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from config.database import get_db
+from schemas.schemas import CohorteCrecimiento
+from services.crecimiento import TablasNoDisponibles, calcular, verificar_tablas
+from services.detector_consultas import presupuesto_consultas
+from crud.crecimiento_crud import get_mediciones_cohorte, get_mediciones_paciente
+
+router = APIRouter()
+
+
+# Puntuaciones z y percentiles OMS de peso para la edad, talla para la edad e
+# IMC para la edad en cada consulta. Un indicador es null si falta el dato o la
+# edad queda fuera de la tabla (peso para la edad solo llega a 10 años).
+def tablas_cargadas():
+    try:
+        verificar_tablas()
+    except TablasNoDisponibles as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/crecimiento/paciente/{id_paciente}", response_model=list[dict], dependencies=[Depends(tablas_cargadas)])
+@presupuesto_consultas(1)
+def obtener_crecimiento_paciente(id_paciente: int, db: Session = Depends(get_db)):
+    return calcular(get_mediciones_paciente(db, id_paciente))
+
+
+@router.post("/crecimiento/cohorte", response_model=list[dict], dependencies=[Depends(tablas_cargadas)])
+@presupuesto_consultas(1)
+def obtener_crecimiento_cohorte(cohorte: CohorteCrecimiento, db: Session = Depends(get_db)):
+    return calcular(get_mediciones_cohorte(db, cohorte.ids_pacientes, cohorte.edad_maxima))
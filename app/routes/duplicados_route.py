@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from config.database import get_db
+from schemas.schemas import FusionDuplicado, Paciente
+from services.duplicados import detectar_duplicados
+from services.detector_consultas import presupuesto_consultas
+from crud.duplicados_crud import ExpedientesEnConflicto, descartar_duplicado, fusionar_pacientes, get_posible_duplicado, get_posibles_duplicados
+
+router = APIRouter()
+
+
+def a_respuesta(duplicado, pacientes=None):
+    respuesta = {
+        "id_duplicado": duplicado.id_duplicado,
+        "id_paciente_a": duplicado.id_paciente_a,
+        "id_paciente_b": duplicado.id_paciente_b,
+        "puntaje": duplicado.puntaje,
+        "motivos": duplicado.motivos,
+        "estado": duplicado.estado,
+    }
+    if pacientes is not None:
+        respuesta["pacientes"] = [
+            Paciente.model_validate(pacientes[i]).model_dump(mode="json")
+            for i in (duplicado.id_paciente_a, duplicado.id_paciente_b) if i in pacientes
+        ]
+    return respuesta
+
+
+def duplicado_pendiente(id_duplicado: int, db: Session):
+    duplicado = get_posible_duplicado(db, id_duplicado)
+    if duplicado is None:
+        raise HTTPException(status_code=404, detail="El posible duplicado no existe")
+    if duplicado.estado != "pendiente":
+        raise HTTPException(status_code=409, detail=f"El par ya fue revisado ({duplicado.estado})")
+    return duplicado
+
+
+@router.post("/pacientes/duplicados/detectar", response_model=dict)
+def detectar_pacientes_duplicados(umbral: float | None = Query(None, ge=0.5, le=1), db: Session = Depends(get_db)):
+    return detectar_duplicados(db) if umbral is None else detectar_duplicados(db, umbral)
+
+
+@router.get("/pacientes/duplicados", response_model=list[dict])
+@presupuesto_consultas(2)
+def obtener_pacientes_duplicados(
+    estado: str = Query("pendiente", pattern="^(pendiente|descartado|fusionado)$"),
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    duplicados, pacientes = get_posibles_duplicados(db, estado, skip, limit)
+    return [a_respuesta(d, pacientes) for d in duplicados]
+
+
+@router.post("/pacientes/duplicados/{id_duplicado}/descartar", response_model=dict)
+def descartar_paciente_duplicado(id_duplicado: int, db: Session = Depends(get_db)):
+    return a_respuesta(descartar_duplicado(db, duplicado_pendiente(id_duplicado, db)))
+
+
+@router.post("/pacientes/duplicados/{id_duplicado}/fusionar", response_model=dict)
+def fusionar_paciente_duplicado(id_duplicado: int, fusion: FusionDuplicado | None = None, db: Session = Depends(get_db)):
+    duplicado = duplicado_pendiente(id_duplicado, db)
+    conservar = fusion.conservar if fusion and fusion.conservar is not None else min(duplicado.id_paciente_a, duplicado.id_paciente_b)
+    if conservar not in (duplicado.id_paciente_a, duplicado.id_paciente_b):
+        raise HTTPException(status_code=400, detail="El paciente a conservar debe ser uno de los dos del par")
+    try:
+        resultado = fusionar_pacientes(db, duplicado, conservar)
+    except ExpedientesEnConflicto:
+        raise HTTPException(
+            status_code=409,
+            detail="Los dos pacientes tienen expediente; elimine o combine uno antes de fusionarlos",
+        )
+    if resultado is None:
+        raise HTTPException(status_code=409, detail="Uno de los pacientes del par ya no existe")
+    return resultado
@@ -0,0 +1,8 @@
+from fastapi import APIRouter
+from services import fhir_cliente
+
+router = APIRouter()
+
+@router.get("/estado/fhir", response_model=dict)
+def obtener_estado_fhir():
+    return fhir_cliente.estado()
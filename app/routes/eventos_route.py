@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from config.database import clinica_actual
+from services.eventos import EVENTOS_MAX_CLIENTES, difusor, transmitir
+
+router = APIRouter()
+
+
+# Avisos de cambios por Server-Sent Events: toda la clínica o solo un paciente.
+# Cada evento "cambio" trae tabla, id_registro, id_paciente y operacion; el
+# cliente vuelve a pedir el registro a la ruta de siempre. Al reconectar, el
+# navegador manda Last-Event-ID y se reponen los avisos perdidos; si ya no se
+# puede, llega un evento "reinicio" y el cliente debe sincronizar con /sync.
+@router.get("/eventos")
+async def obtener_eventos(id_paciente: int | None = None, last_event_id: str | None = Header(default=None)):
+    if difusor.clientes() >= EVENTOS_MAX_CLIENTES:
+        raise HTTPException(status_code=503, detail="Hay demasiados clientes conectados a /eventos", headers={"Retry-After": "30"})
+    ultimo_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(
+        transmitir(clinica_actual.get(), id_paciente, ultimo_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
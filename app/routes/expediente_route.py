@@ -1,41 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import Expediente, ExpedienteCreate, ExpedienteUpdate
+from config.database import get_db
+from schemas.schemas import Expediente, ExpedienteCreate, ExpedienteUpdate, ExpedientePatch
+from services.etag import verificar_etag, verificar_version, version_de_if_match
+from services.detector_consultas import presupuesto_consultas
 from crud.expediente_crud import create_expediente, get_expedientes, get_expediente_by_id, update_expediente, delete_expediente, get_expediente_by_id_paciente
-from crud.paciente_crud import get_paciente_by_id
+from crud.revision_expediente_crud import get_revisiones, get_version_expediente
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.post("/expedientes/", response_model=Expediente)
 def agregar_expediente(expediente: ExpedienteCreate, db: Session = Depends(get_db)):
-    db_paciente = get_paciente_by_id(db, id_paciente=expediente.id_paciente)
-    if db_paciente is None:
-        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     db_expediente = create_expediente(db=db, expediente=expediente)
+    if db_expediente is None:
+        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     return db_expediente
 
 @router.get("/expedientes/", response_model=list[Expediente])
-def obtener_expedientes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_expedientes(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    verificar_etag(request, response, "expediente:lista")
     expedientes = get_expedientes(db, skip=skip, limit=limit)
     return expedientes
 
 @router.get("/expedientes/{id_expediente}", response_model=Expediente)
-def obtener_expediente_por_id(id_expediente: int, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_expediente_por_id(id_expediente: int, request: Request, response: Response, db: Session = Depends(get_db)):
     db_expediente = get_expediente_by_id(db, id_expediente=id_expediente)
     if db_expediente is None:
         raise HTTPException(status_code=404, detail="El ID del expediente no existe")
+    verificar_version(request, response, db_expediente.version)
     return db_expediente
 
 @router.get("/expedientes/paciente/{id_paciente}", response_model=Expediente)
-def obtener_expediente_por_id_paciente(id_paciente: int, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_expediente_por_id_paciente(id_paciente: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    verificar_etag(request, response, f"expediente:paciente:{id_paciente}")
     db_expediente = get_expediente_by_id_paciente(db, id_paciente=id_paciente)
     if db_expediente is None:
         raise HTTPException(status_code=404, detail="No se encontró ningún expediente para el ID del paciente")
@@ -43,18 +45,63 @@ def obtener_expediente_por_id_paciente(id_paciente: int, db: Session = Depends(g
 
 @router.put("/expedientes/{id_expediente}", response_model=Expediente)
 def actualizar_expediente(
-    id_expediente: int, expediente_update: ExpedienteUpdate, db: Session = Depends(get_db)
+    id_expediente: int,
+    expediente_update: ExpedienteUpdate,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
 ):
-    db_expediente = get_expediente_by_id(db, id_expediente=id_expediente)
+    db_expediente = update_expediente(db, id_expediente, expediente_update, version=version_de_if_match(if_match))
+    if db_expediente is None:
+        raise HTTPException(status_code=404, detail="El ID del expediente no existe")
+    return db_expediente
+
+@router.patch("/expedientes/{id_expediente}", response_model=Expediente)
+def modificar_expediente(
+    id_expediente: int,
+    expediente_patch: ExpedientePatch,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    db_expediente = update_expediente(db, id_expediente, expediente_patch, version=version_de_if_match(if_match), parcial=True)
     if db_expediente is None:
         raise HTTPException(status_code=404, detail="El ID del expediente no existe")
-    db_expediente = update_expediente(db, db_expediente, expediente_update)
     return db_expediente
 
 @router.delete("/expedientes/{id_expediente}", response_model=Expediente)
 def eliminar_expediente(id_expediente: int, db: Session = Depends(get_db)):
-    db_expediente = get_expediente_by_id(db, id_expediente=id_expediente)
+    db_expediente = delete_expediente(db, id_expediente)
     if db_expediente is None:
         raise HTTPException(status_code=404, detail="El ID del expediente no existe")
-    delete_expediente(db, db_expediente)
     return db_expediente
+
+@router.get("/expedientes/{id_expediente}/revisiones")
+@presupuesto_consultas(1)
+def obtener_revisiones_expediente(id_expediente: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    revisiones = get_revisiones(db, id_expediente, skip=skip, limit=limit)
+    if not revisiones and skip == 0:
+        raise HTTPException(status_code=404, detail="El expediente no existe o no tiene historial")
+    return [
+        {
+            "version": r.version,
+            "fecha_modificacion": r.fecha_modificacion,
+            "creado_en": r.creado_en,
+            "instantanea": r.diferencia is None,
+            "cambios": None if r.diferencia is None else len(json.loads(r.diferencia)),
+        }
+        for r in revisiones
+    ]
+
+@router.get("/expedientes/{id_expediente}/revisiones/{version}")
+@presupuesto_consultas(1)
+def obtener_version_expediente(id_expediente: int, version: int, db: Session = Depends(get_db)):
+    resultado = get_version_expediente(db, id_expediente, version)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="La versión del expediente no existe")
+    revision, datos = resultado
+    return {
+        "id_expediente": id_expediente,
+        "version": revision.version,
+        "fecha_modificacion": revision.fecha_modificacion,
+        "datos": datos,
+        "operaciones": None if revision.diferencia is None else json.loads(revision.diferencia),
+    }
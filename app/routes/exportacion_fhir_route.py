@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
+from config.database import clinica_actual
+from services import exportacion
+
+router = APIRouter()
+
+FORMATOS_NDJSON = ("application/fhir+ndjson", "application/ndjson", "ndjson")
+
+
+def estado_de_la_clinica(id_exportacion: str):
+    # Una clínica no puede ver las exportaciones de otra
+    estado = exportacion.leer_estado(id_exportacion)
+    if estado is None or estado["clinica"] != clinica_actual.get():
+        raise HTTPException(status_code=404, detail="La exportación no existe o ya expiró")
+    return estado
+
+
+@router.get("/fhir/$export")
+@router.get("/fhir/Patient/$export")
+def iniciar_exportacion(
+    request: Request,
+    _type: str | None = None,
+    _outputFormat: str | None = None,
+    _since: str | None = None,
+    prefer: str | None = Header(default=None),
+):
+    if prefer is None or "respond-async" not in prefer:
+        raise HTTPException(status_code=400, detail="La exportación requiere el encabezado Prefer: respond-async")
+    if _outputFormat is not None and _outputFormat not in FORMATOS_NDJSON:
+        raise HTTPException(status_code=400, detail="Solo se exporta en formato application/fhir+ndjson")
+    if _since is not None:
+        raise HTTPException(status_code=400, detail="_since no está soportado; se exporta el conjunto completo")
+    tipos = set(exportacion.TIPOS_EXPORTABLES)
+    if _type:
+        tipos = {t.strip() for t in _type.split(",") if t.strip()}
+        no_soportados = tipos - set(exportacion.TIPOS_EXPORTABLES)
+        if no_soportados:
+            raise HTTPException(status_code=400, detail=f"Tipos no soportados: {', '.join(sorted(no_soportados))}")
+    id_exportacion = exportacion.iniciar(clinica_actual.get(), tipos, str(request.url))
+    return Response(
+        status_code=202,
+        headers={"Content-Location": str(request.url_for("obtener_estado_exportacion", id_exportacion=id_exportacion))},
+    )
+
+
+@router.get("/fhir/exportaciones/{id_exportacion}")
+def obtener_estado_exportacion(id_exportacion: str, request: Request):
+    estado = estado_de_la_clinica(id_exportacion)
+    if estado["estado"] == "en_curso":
+        return Response(status_code=202, headers={"X-Progress": estado["progreso"], "Retry-After": "5"})
+    if estado["estado"] == "error":
+        return JSONResponse(status_code=500, content={
+            "resourceType": "OperationOutcome",
+            "issue": [{"severity": "error", "code": "exception", "diagnostics": estado["error"]}],
+        })
+    return {
+        "transactionTime": estado["transactionTime"],
+        "request": estado["request"],
+        "requiresAccessToken": False,
+        "output": [
+            {
+                "type": salida["type"],
+                "url": str(request.url_for("descargar_exportacion", id_exportacion=id_exportacion, tipo=salida["type"])),
+                "count": salida["count"],
+            }
+            for salida in estado["salida"]
+        ],
+        "error": [],
+    }
+
+
+@router.delete("/fhir/exportaciones/{id_exportacion}", status_code=202)
+def eliminar_exportacion(id_exportacion: str):
+    estado_de_la_clinica(id_exportacion)
+    exportacion.cancelar(id_exportacion)
+    return Response(status_code=202)
+
+
+@router.get("/fhir/exportaciones/{id_exportacion}/{tipo}.ndjson")
+def descargar_exportacion(id_exportacion: str, tipo: str):
+    estado = estado_de_la_clinica(id_exportacion)
+    if estado["estado"] != "completo" or tipo not in {s["type"] for s in estado["salida"]}:
+        raise HTTPException(status_code=404, detail="El archivo no existe")
+    return FileResponse(exportacion.ruta_archivo(id_exportacion, tipo), media_type="application/fhir+ndjson")
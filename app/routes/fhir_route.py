@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
+from fhir.resources.bundle import Bundle
+from config.database import clinica_de_sesion, get_db
+from crud.paciente_crud import get_paciente_by_id
+from crud.consulta_crud import get_consulta_by_id_paciente
+from crud.medidas_musculos_crud import get_medidas_musculos_by_id_paciente
+from crud.medidas_huesos_crud import get_medidas_huesos_by_id_paciente
+from services import cache
+from services.etag import calcular_etag, no_modificado
+from services.detector_consultas import presupuesto_consultas
+from services.fhir_mapeo import id_fhir, paciente_a_fhir, consulta_a_fhir, medidas_musculos_a_fhir, medidas_huesos_a_fhir
+
+# Lectura FHIR servida desde la base local: los recursos se arman al vuelo con
+# los mismos mapeos que se envían al servidor FHIR y se guardan ya serializados
+# en el cache hasta que el CRUD modifica al paciente o sus registros.
+
+router = APIRouter()
+
+TIPO_FHIR = "application/fhir+json"
+
+
+def respuesta_fhir(request: Request, db: Session, clave: str, generar, no_encontrado: str | None = None):
+    # El ETag se lee antes de armar el contenido, como en verificar_etag: si una
+    # escritura se confirma en medio, el contenido nuevo sale con el ETag viejo
+    # y el cliente lo vuelve a pedir, en lugar de guardar datos viejos con el ETag nuevo
+    etag = calcular_etag(clave)
+    if no_modificado(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    contenido = cache.obtener_serializado(db, clave, generar)
+    if contenido is None:
+        raise HTTPException(status_code=404, detail=no_encontrado)
+    return Response(content=contenido, media_type=TIPO_FHIR, headers={"ETag": etag})
+
+
+def id_local(db: Session, referencia: str):
+    # Los recursos usan los mismos ids que el outbox ("principal-123"); también
+    # se acepta el id numérico del paciente
+    referencia = referencia.removeprefix(id_fhir(clinica_de_sesion(db)) + "-")
+    return int(referencia) if referencia.isdigit() else None
+
+
+@router.get("/fhir/Patient/{id_patient}")
+@presupuesto_consultas(1)
+def obtener_patient(id_patient: str, request: Request, db: Session = Depends(get_db)):
+    id_paciente = id_local(db, id_patient)
+    if id_paciente is None:
+        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
+    clave = f"fhir:Patient:{id_paciente}"
+
+    def generar():
+        db_paciente = get_paciente_by_id(db, id_paciente=id_paciente)
+        if db_paciente is None:
+            return None
+        return paciente_a_fhir(db_paciente, id_fhir(clinica_de_sesion(db), id_paciente)).json()
+
+    return respuesta_fhir(request, db, clave, generar, "El ID del paciente no existe")
+
+
+@router.get("/fhir/Observation")
+@presupuesto_consultas(3)
+def buscar_observation(request: Request, subject: str = Query(min_length=1), db: Session = Depends(get_db)):
+    # subject acepta "Patient/principal-123", "Patient/123" o solo el id
+    id_paciente = id_local(db, subject.removeprefix("Patient/"))
+    if id_paciente is None:
+        raise HTTPException(status_code=400, detail="subject debe ser una referencia a Patient, p. ej. Patient/123")
+    clave = f"fhir:Observation:paciente:{id_paciente}"
+
+    def generar():
+        clinica = clinica_de_sesion(db)
+        id_patient = id_fhir(clinica, id_paciente)
+        observaciones = [
+            *(consulta_a_fhir(c, id_fhir(clinica, "consulta", c.id_consulta), id_patient) for c in get_consulta_by_id_paciente(db, id_paciente)),
+            *(medidas_musculos_a_fhir(m, id_fhir(clinica, "musculos", m.id_musculos), id_patient) for m in get_medidas_musculos_by_id_paciente(db, id_paciente)),
+            *(medidas_huesos_a_fhir(h, id_fhir(clinica, "huesos", h.id_huesos), id_patient) for h in get_medidas_huesos_by_id_paciente(db, id_paciente)),
+        ]
+        return Bundle.construct(
+            type="searchset",
+            total=len(observaciones),
+            entry=[{"resource": o, "search": {"mode": "match"}} for o in observaciones],
+        ).json()
+
+    return respuesta_fhir(request, db, clave, generar)
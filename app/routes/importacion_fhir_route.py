@@ -0,0 +1,24 @@
+import tempfile
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from config.database import clinica_actual
+from services.importacion_fhir import IMPORTACION_LOTE, importar
+
+router = APIRouter()
+
+
+@router.post("/importaciones/fhir", response_model=dict)
+async def agregar_importacion_fhir(request: Request, lote: int = Query(IMPORTACION_LOTE, ge=1, le=5000)):
+    # El cuerpo es un Bundle (application/fhir+json) o NDJSON (application/fhir+ndjson).
+    # Se copia a un archivo temporal conforme llega y se importa desde ahí. Pasados
+    # los 8 MB el archivo está en disco, así que la escritura va en el threadpool
+    # para no bloquear el event loop
+    tipo = request.headers.get("content-type", "")
+    formato = "ndjson" if "ndjson" in tipo else "bundle"
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as archivo:
+        async for bloque in request.stream():
+            await run_in_threadpool(archivo.write, bloque)
+        if archivo.tell() == 0:
+            raise HTTPException(status_code=400, detail="El cuerpo de la petición está vacío")
+        archivo.seek(0)
+        return await run_in_threadpool(importar, archivo, formato, clinica_actual.get(), lote)
@@ -1,60 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import MedidasHuesos, MedidasHuesosCreate, MedidasHuesosUpdate
+from config.database import get_db
+from schemas.schemas import MedidasHuesos, MedidasHuesosCreate, MedidasHuesosUpdate, MedidasHuesosPatch
+from services.etag import verificar_etag, verificar_version, version_de_if_match
+from services.detector_consultas import presupuesto_consultas
 from crud.medidas_huesos_crud import create_medidas_huesos, get_medidas_huesos, get_medidas_huesos_by_id, update_medidas_huesos, delete_medidas_huesos, get_medidas_huesos_by_id_paciente
-from crud.paciente_crud import get_paciente_by_id
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.post("/medidas_huesos/", response_model=MedidasHuesos)
 def agregar_medidas_huesos(medidas_huesos: MedidasHuesosCreate, db: Session = Depends(get_db)):
-    paciente = get_paciente_by_id(db, id_paciente=medidas_huesos.id_paciente)
-    if paciente is None:
-        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     db_medida_hueso = create_medidas_huesos(db=db, medidas_huesos=medidas_huesos)
+    if db_medida_hueso is None:
+        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     return db_medida_hueso
 
 @router.get("/medidas_huesos/", response_model=list[MedidasHuesos])
-def obtener_medidas_huesos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_medidas_huesos(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    verificar_etag(request, response, "medidas_huesos:lista")
     medidas_huesos = get_medidas_huesos(db, skip=skip, limit=limit)
     return medidas_huesos
 
 @router.get("/medidas_huesos/{id_huesos}", response_model=MedidasHuesos)
-def obtener_medidas_huesos_por_id(id_huesos: int, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_medidas_huesos_por_id(id_huesos: int, request: Request, response: Response, db: Session = Depends(get_db)):
     db_medida_hueso = get_medidas_huesos_by_id(db, id_huesos=id_huesos)
     if db_medida_hueso is None:
         raise HTTPException(status_code=404, detail="El ID de las medidas de hueso no existe")
+    verificar_version(request, response, db_medida_hueso.version)
     return db_medida_hueso
 
 @router.get("/medidas_huesos/paciente/{id_paciente}", response_model=list[MedidasHuesos])
-def obtener_medidas_huesos_por_id_paciente(id_paciente: int, db: Session = Depends(get_db)):
-    db_medida_hueso = get_medidas_huesos_by_id_paciente(db, id_paciente=id_paciente)
+@presupuesto_consultas(1)
+def obtener_medidas_huesos_por_id_paciente(
+    id_paciente: int,
+    request: Request,
+    response: Response,
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: Session = Depends(get_db),
+):
+    verificar_etag(request, response, f"medidas_huesos:paciente:{id_paciente}")
+    db_medida_hueso = get_medidas_huesos_by_id_paciente(db, id_paciente=id_paciente, desde=desde, hasta=hasta)
     if db_medida_hueso is None:
         raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     return db_medida_hueso
 
 @router.put("/medidas_huesos/{id_huesos}", response_model=MedidasHuesos)
 def actualizar_medidas_huesos(
-    id_medida_hueso: int, medida_hueso_update: MedidasHuesosUpdate, db: Session = Depends(get_db)
+    id_huesos: int,
+    medida_hueso_update: MedidasHuesosUpdate,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    db_medida_hueso = update_medidas_huesos(db, id_huesos, medida_hueso_update, version=version_de_if_match(if_match))
+    if db_medida_hueso is None:
+        raise HTTPException(status_code=404, detail="El ID de la medida del hueso no existe")
+    return db_medida_hueso
+
+@router.patch("/medidas_huesos/{id_huesos}", response_model=MedidasHuesos)
+def modificar_medidas_huesos(
+    id_huesos: int,
+    medida_hueso_patch: MedidasHuesosPatch,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
 ):
-    db_medida_hueso = get_medidas_huesos_by_id(db, id_huesos=id_medida_hueso)
+    db_medida_hueso = update_medidas_huesos(db, id_huesos, medida_hueso_patch, version=version_de_if_match(if_match), parcial=True)
     if db_medida_hueso is None:
         raise HTTPException(status_code=404, detail="El ID de la medida del hueso no existe")
-    db_medida_hueso = update_medidas_huesos(db, db_medida_hueso, medida_hueso_update)
     return db_medida_hueso
 
 @router.delete("/medidas_huesos/{id_huesos}", response_model=MedidasHuesos)
 def eliminar_medidas_huesos(id_huesos: int, db: Session = Depends(get_db)):
-    db_medida_hueso = get_medidas_huesos_by_id(db, id_huesos=id_huesos)
+    db_medida_hueso = delete_medidas_huesos(db, id_huesos)
     if db_medida_hueso is None:
         raise HTTPException(status_code=404, detail="El ID de las medidas de huesos no existe")
-    delete_medidas_huesos(db, db_medida_hueso)
     return db_medida_hueso
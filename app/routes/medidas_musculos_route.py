@@ -1,61 +1,82 @@
+from datetime import date
 from ast import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import MedidasMusculos, MedidasMusculosCreate, MedidasMusculosUpdate
+from config.database import get_db
+from schemas.schemas import MedidasMusculos, MedidasMusculosCreate, MedidasMusculosUpdate, MedidasMusculosPatch
+from services.etag import verificar_etag, verificar_version, version_de_if_match
+from services.detector_consultas import presupuesto_consultas
 from crud.medidas_musculos_crud import create_medidas_musculos, get_medidas_musculos, get_medidas_musculos_by_id, update_medidas_musculos, delete_medidas_musculos, get_medidas_musculos_by_id_paciente
-from crud.paciente_crud import get_paciente_by_id
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.post("/medidas_musculos/", response_model=MedidasMusculos)
 def agregar_medidas_musculos(medidas_musculos: MedidasMusculosCreate, db: Session = Depends(get_db)):
-    paciente = get_paciente_by_id(db, id_paciente=medidas_musculos.id_paciente)
-    if paciente is None:
-        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     db_medida_musculo = create_medidas_musculos(db=db, medidas_musculos=medidas_musculos)
+    if db_medida_musculo is None:
+        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     return db_medida_musculo
 
 @router.get("/medidas_musculos/", response_model=list[MedidasMusculos])
-def obtener_medidas_musculos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_medidas_musculos(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    verificar_etag(request, response, "medidas_musculos:lista")
     medidas_musculos = get_medidas_musculos(db, skip=skip, limit=limit)
     return medidas_musculos
 
 @router.get("/medidas_musculos/{id_musculos}", response_model=MedidasMusculos)
-def obtener_medidas_musculos_por_id(id_musculos: int, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_medidas_musculos_por_id(id_musculos: int, request: Request, response: Response, db: Session = Depends(get_db)):
     db_medida_musculo = get_medidas_musculos_by_id(db, id_musculos=id_musculos)
     if db_medida_musculo is None:
         raise HTTPException(status_code=404, detail="El ID de las medidas de músculo no existe")
+    verificar_version(request, response, db_medida_musculo.version)
     return db_medida_musculo
 
 @router.get("/medidas_musculos/paciente/{id_paciente}", response_model=list[MedidasMusculos])
-def obtener_medidas_musculos_por_id_paciente(id_paciente: int, db: Session = Depends(get_db)):
-    db_medida_musculo = get_medidas_musculos_by_id_paciente(db, id_paciente=id_paciente)
+@presupuesto_consultas(1)
+def obtener_medidas_musculos_por_id_paciente(
+    id_paciente: int,
+    request: Request,
+    response: Response,
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: Session = Depends(get_db),
+):
+    verificar_etag(request, response, f"medidas_musculos:paciente:{id_paciente}")
+    db_medida_musculo = get_medidas_musculos_by_id_paciente(db, id_paciente=id_paciente, desde=desde, hasta=hasta)
     if db_medida_musculo is None:
         raise HTTPException(status_code=404, detail="El ID del paciente no existe")
     return db_medida_musculo
 
 @router.put("/medidas_musculos/{id_musculos}", response_model=MedidasMusculos)
 def actualizar_medidas_musculos(
-    id_medida_musculo: int, medida_musculo_update: MedidasMusculosUpdate, db: Session = Depends(get_db)
+    id_musculos: int,
+    medida_musculo_update: MedidasMusculosUpdate,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    db_medida_musculo = update_medidas_musculos(db, id_musculos, medida_musculo_update, version=version_de_if_match(if_match))
+    if db_medida_musculo is None:
+        raise HTTPException(status_code=404, detail="El ID de la medida del músculo no existe")
+    return db_medida_musculo
+
+@router.patch("/medidas_musculos/{id_musculos}", response_model=MedidasMusculos)
+def modificar_medidas_musculos(
+    id_musculos: int,
+    medida_musculo_patch: MedidasMusculosPatch,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
 ):
-    db_medida_musculo = get_medidas_musculos_by_id(db, id_musculos=id_medida_musculo)
+    db_medida_musculo = update_medidas_musculos(db, id_musculos, medida_musculo_patch, version=version_de_if_match(if_match), parcial=True)
     if db_medida_musculo is None:
         raise HTTPException(status_code=404, detail="El ID de la medida del músculo no existe")
-    db_medida_musculo = update_medidas_musculos(db, db_medida_musculo, medida_musculo_update)
     return db_medida_musculo
 
 @router.delete("/medidas_musculos/{id_musculos}", response_model=MedidasMusculos)
 def eliminar_medidas_musculos(id_musculos: int, db: Session = Depends(get_db)):
-    db_medida_musculo = get_medidas_musculos_by_id(db, id_musculos=id_musculos)
+    db_medida_musculo = delete_medidas_musculos(db, id_musculos)
     if db_medida_musculo is None:
         raise HTTPException(status_code=404, detail="El ID de las medidas de músculos no existe")
-    delete_medidas_musculos(db, db_medida_musculo)
     return db_medida_musculo
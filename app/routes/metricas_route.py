@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services import metricas
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def obtener_metricas():
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4")
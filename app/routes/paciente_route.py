@@ -1,19 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from config.database import SessionLocal
-from schemas.schemas import Paciente, PacienteCreate, PacienteUpdate
-from crud.paciente_crud import create_paciente, get_pacientes, get_paciente_by_id, update_paciente, delete_paciente
+from config.database import clinica_actual, get_db
+from schemas.schemas import Paciente, PacienteCreate, PacienteUpdate, PacientePatch
+from services.etag import verificar_etag, verificar_version, version_de_if_match
+from services.detector_consultas import presupuesto_consultas
+from crud.paciente_crud import create_paciente, get_pacientes, get_paciente_by_id, update_paciente, delete_paciente, buscar_pacientes, archivar_paciente
+from services import archivo
 
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 @router.post("/pacientes/", response_model=Paciente)
 def agregar_paciente(paciente: PacienteCreate, db: Session = Depends(get_db)):
@@ -22,36 +19,77 @@ def agregar_paciente(paciente: PacienteCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/pacientes/", response_model=list[Paciente])
-def obtener_pacientes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_pacientes(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    verificar_etag(request, response, "paciente:lista")
     pacientes = get_pacientes(db, skip=skip, limit=limit)
     return pacientes
 
 
+@router.get("/pacientes/buscar", response_model=list[Paciente])
+@presupuesto_consultas(2)
+def buscar_paciente(
+    request: Request,
+    response: Response,
+    q: str = Query(min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    verificar_etag(request, response, "paciente:lista")
+    pacientes = buscar_pacientes(db, q=q, limit=limit)
+    return pacientes
+
+
 @router.get("/pacientes/{id_paciente}", response_model=Paciente)
-def obtener_paciente_por_id(id_paciente: int, db: Session = Depends(get_db)):
+@presupuesto_consultas(1)
+def obtener_paciente_por_id(id_paciente: int, request: Request, response: Response, db: Session = Depends(get_db)):
     db_paciente = get_paciente_by_id(db, id_paciente=id_paciente)
     if db_paciente is None:
         raise HTTPException(status_code=404, detail="El ID del paciente no existe")
+    verificar_version(request, response, db_paciente.version)
     return db_paciente
 
 
 @router.put("/pacientes/{id_paciente}", response_model=Paciente)
 def actualizar_paciente(
-    id_paciente: int, paciente_update: PacienteUpdate, db: Session = Depends(get_db)
+    id_paciente: int,
+    paciente_update: PacienteUpdate,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
 ):
-    db_paciente = get_paciente_by_id(db, id_paciente=id_paciente)
+    db_paciente = update_paciente(db, id_paciente, paciente_update, version=version_de_if_match(if_match))
     if db_paciente is None:
         raise HTTPException(status_code=404, detail="El ID del paciente no existe")
-    db_paciente = update_paciente(db, db_paciente, paciente_update)
     return db_paciente
 
 
-@router.delete("/pacientes/{id_paciente}", response_model=Paciente)
-def eliminar_paciente(id_paciente: int, db: Session = Depends(get_db)):
-    db_paciente = get_paciente_by_id(db, id_paciente=id_paciente)
+@router.patch("/pacientes/{id_paciente}", response_model=Paciente)
+def modificar_paciente(
+    id_paciente: int,
+    paciente_patch: PacientePatch,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    db_paciente = update_paciente(db, id_paciente, paciente_patch, version=version_de_if_match(if_match), parcial=True)
     if db_paciente is None:
         raise HTTPException(status_code=404, detail="El ID del paciente no existe")
-    else:
-        db_paciente = delete_paciente(db, db_paciente)
-        return db_paciente
+    return db_paciente
+
+
+@router.post("/pacientes/archivar", response_model=dict, status_code=202)
+def archivar_pacientes(antes_de: date, lote: int = Query(500, ge=1, le=5000)):
+    # Los lotes se archivan en segundo plano; ver services/archivo.py
+    if not archivo.iniciar(clinica_actual.get(), antes_de, lote):
+        raise HTTPException(status_code=409, detail="Ya hay un archivo de pacientes en curso")
+    return {"estado": "en_curso", "antes_de": antes_de}
 
+
+@router.delete("/pacientes/{id_paciente}", response_model=Paciente)
+def eliminar_paciente(id_paciente: int, archivar: bool = False, db: Session = Depends(get_db)):
+    if archivar:
+        db_paciente = archivar_paciente(db, id_paciente)
+    else:
+        db_paciente = delete_paciente(db, id_paciente)
+    if db_paciente is None:
+        raise HTTPException(status_code=404, detail="El ID del paciente no existe")
+    return db_paciente
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from config.database import get_db
+from services.detector_consultas import presupuesto_consultas
+from crud.sincronizacion_crud import TABLAS_SYNC, get_cambios_desde, get_secuencia
+
+router = APIRouter()
+
+
+# Sincronización de las tabletas que trabajan sin conexión. Sin `since` solo se
+# devuelve el token actual: la tableta lo guarda, descarga todo con las rutas de
+# siempre y a partir de ahí pide /sync?since=<token> hasta que hay_mas sea false.
+# Al eliminar un paciente la tableta debe borrar también sus registros.
+@router.get("/sync", response_model=dict)
+@presupuesto_consultas(2 + len(TABLAS_SYNC))
+def obtener_cambios(
+    request: Request,
+    since: int | None = Query(None, ge=0),
+    limite: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    actual, purgado_hasta = get_secuencia(db)
+    if since is None:
+        return {"siguiente": actual, "hay_mas": False, "cambios": {}}
+    if since < purgado_hasta or since > actual:
+        raise HTTPException(status_code=410, detail="El token de sincronización ya no es válido; descarga todo de nuevo")
+    return get_cambios_desde(db, since, limite)
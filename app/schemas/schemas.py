@@ -1,5 +1,13 @@
 from datetime import date
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+
+
+# En PATCH omitir un campo lo deja igual; un null explícito en la llave del
+# paciente o en la fecha (columna de partición) no es un valor válido
+def rechazar_nulo(cls, valor):
+    if valor is None:
+        raise ValueError("no puede ser nulo")
+    return valor
 
 ### Pacientes
 
@@ -17,8 +25,12 @@ class PacienteCreate(PacienteBase):
 class PacienteUpdate(PacienteBase):
     pass
 
+class PacientePatch(PacienteBase):
+    pass
+
 class Paciente(PacienteBase):
     id_paciente: int | None=None
+    version: int | None=None
     
     class Config:
         from_attributes = True
@@ -37,8 +49,16 @@ class ExpedienteCreate(ExpedienteBase):
 class ExpedienteUpdate(ExpedienteBase):
     pass
 
+class ExpedientePatch(BaseModel):
+    fecha_modificacion: date | None=None
+    datos: str | None=None
+    id_paciente: int | None=None
+
+    _sin_nulos = field_validator("id_paciente")(rechazar_nulo)
+
 class Expediente(ExpedienteBase):
     id_expediente: int | None=None
+    version: int | None=None
     
     class Config:
         from_attributes = True
@@ -63,8 +83,25 @@ class ConsultaCreate(ConsultaBase):
 class ConsultaUpdate(ConsultaBase):
     pass
 
-class Consulta(ConsultaBase):
+class ConsultaParcial(BaseModel):
+    fecha: date | None=None
+    pesoafuera: float | None=None
+    tallaafuera: float | None=None
+    tallasentado: float | None=None
+    pesoadentro: float | None=None
+    tallaadentro: float | None=None
+    frecuencia_cardiaca: int | None=None
+    nivel_oxigeno: int | None=None
+    temperatura: float | None=None
+    id_paciente: int | None=None
+
+class ConsultaPatch(ConsultaParcial):
+    _sin_nulos = field_validator("fecha", "id_paciente")(rechazar_nulo)
+
+# Las respuestas admiten columnas vacías: las consultas importadas pueden traer solo algunos signos
+class Consulta(ConsultaParcial):
     id_consulta: int | None=None
+    version: int | None=None
     
     class Config:
         from_attributes = True
@@ -93,8 +130,28 @@ class MedidasMusculosCreate(MedidasMusculosBase):
 class MedidasMusculosUpdate(MedidasMusculosBase):
     pass
 
-class MedidasMusculos(MedidasMusculosBase):
+class MedidasMusculosParcial(BaseModel):
+    bicep: float | None=None
+    tricep: float | None=None
+    subescapular: float | None=None
+    supriliaco: float | None=None
+    bicep_relajado: float | None=None
+    bicep_contraido: float | None=None
+    antebrazo: float | None=None
+    abdomen: float | None=None
+    muslo: float | None=None
+    gemelo: float | None=None
+    torax: float | None=None
+    gluteo: float | None=None
+    fecha: date | None=None
+    id_paciente: int | None=None
+
+class MedidasMusculosPatch(MedidasMusculosParcial):
+    _sin_nulos = field_validator("fecha", "id_paciente")(rechazar_nulo)
+
+class MedidasMusculos(MedidasMusculosParcial):
     id_musculos: int | None=None
+    version: int | None=None
     
     class Config:
         from_attributes = True
@@ -120,8 +177,24 @@ class MedidasHuesosCreate(MedidasHuesosBase):
 class MedidasHuesosUpdate(MedidasHuesosBase):
     pass
 
-class MedidasHuesos(MedidasHuesosBase):
+class MedidasHuesosParcial(BaseModel):
+    biacromial: int | None=None
+    bitrocanter: int | None=None
+    biliaco: int | None=None
+    torax: int | None=None
+    humero: int | None=None
+    carpo: int | None=None
+    femur: int | None=None
+    tobillo: int | None=None
+    fecha: date | None=None
+    id_paciente: int | None=None
+
+class MedidasHuesosPatch(MedidasHuesosParcial):
+    _sin_nulos = field_validator("fecha", "id_paciente")(rechazar_nulo)
+
+class MedidasHuesos(MedidasHuesosParcial):
     id_huesos: int | None=None
+    version: int | None=None
     
     class Config:
         from_attributes = True
@@ -154,4 +227,16 @@ class FhirExpedienteCreate(FhirExpedienteBase):
     pass
 
 class FhirExpediente(FhirExpedienteBase):
-    id_patient: int | None=None
\ No newline at end of file
+    id_patient: int | None=None
+### Crecimiento
+
+class CohorteCrecimiento(BaseModel):
+    # Sin ids se toman todos los pacientes de la clínica menores de edad_maxima años
+    ids_pacientes: list[int] | None = Field(default=None, max_length=5000)
+    edad_maxima: int = Field(default=19, ge=1, le=19)
+
+### Duplicados
+
+class FusionDuplicado(BaseModel):
+    # Paciente que se conserva; por omisión el más antiguo del par
+    conservar: int | None = None
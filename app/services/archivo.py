@@ -0,0 +1,69 @@
+import argparse
+import json
+import logging
+import threading
+from datetime import date
+
+from config.database import CLINICA_PREDETERMINADA, SessionLocal
+from crud.paciente_crud import archivar_lote_inactivos
+
+logger = logging.getLogger(__name__)
+
+# Archivo de pacientes inactivos por lotes, cada lote en su propia
+# transacción para no bloquear las tablas mucho tiempo. Corre fuera de las
+# peticiones: POST /pacientes/archivar lo inicia en un hilo de fondo, o bien
+#   cd app
+#   python -m services.archivo --clinica principal --antes-de 2023-01-01
+_en_curso = set()
+_lock = threading.Lock()
+
+
+def archivar_inactivos(clinica: str, antes_de: date, lote: int = 500):
+    total = 0
+    while True:
+        db = SessionLocal(info={"clinica": clinica})
+        try:
+            archivados = archivar_lote_inactivos(db, antes_de, lote)
+            db.commit()
+        finally:
+            db.close()
+        if not archivados:
+            return total
+        total += archivados
+
+
+def _ejecutar(clinica: str, antes_de: date, lote: int):
+    try:
+        total = archivar_inactivos(clinica, antes_de, lote)
+        logger.info("Clínica %s: %s pacientes archivados (inactivos desde %s)", clinica, total, antes_de)
+    except Exception:
+        logger.exception("Falló el archivo de pacientes inactivos de la clínica %s", clinica)
+    finally:
+        with _lock:
+            _en_curso.discard(clinica)
+
+
+def iniciar(clinica: str, antes_de: date, lote: int = 500):
+    # Devuelve False si la clínica ya tiene un archivo en curso en este proceso
+    with _lock:
+        if clinica in _en_curso:
+            return False
+        _en_curso.add(clinica)
+    threading.Thread(
+        target=_ejecutar, args=(clinica, antes_de, lote), name=f"archivo-{clinica}", daemon=True
+    ).start()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiva los pacientes sin actividad desde una fecha")
+    parser.add_argument("--clinica", default=CLINICA_PREDETERMINADA)
+    parser.add_argument("--antes-de", type=date.fromisoformat, required=True)
+    parser.add_argument("--lote", type=int, default=500)
+    argumentos = parser.parse_args()
+    total = archivar_inactivos(argumentos.clinica, argumentos.antes_de, argumentos.lote)
+    print(json.dumps({"archivados": total}))
+
+
+if __name__ == "__main__":
+    main()
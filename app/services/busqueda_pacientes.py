@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config.database import clinica_de_sesion
+
+# Índice de trigramas en memoria para buscar pacientes por nombre sin
+# importar acentos ni mayúsculas. Se actualiza con cada escritura del CRUD y
+# se reconstruye periódicamente para recoger cambios hechos por otros procesos.
+# Los cambios del CRUD se aplican solo cuando la transacción se confirma.
+RECARGA_SEGUNDOS = int(os.getenv("BUSQUEDA_RECARGA_SEGUNDOS", "300"))
+SIMILITUD_MINIMA = float(os.getenv("BUSQUEDA_SIMILITUD_MINIMA", "0.3"))
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def trigramas(texto):
+    resultado = set()
+    for palabra in texto.split():
+        palabra = f"  {palabra} "
+        for i in range(len(palabra) - 2):
+            resultado.add(palabra[i:i + 3])
+    return resultado
+
+
+class IndicePacientes:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._nombres = {}
+        self._trigramas_por_id = {}
+        self._ids_por_trigrama = defaultdict(set)
+        self._cargado_en = None
+
+    def necesita_carga(self):
+        return self._cargado_en is None or time.monotonic() - self._cargado_en > RECARGA_SEGUNDOS
+
+    def cargar(self, filas):
+        nombres = {}
+        trigramas_por_id = {}
+        ids_por_trigrama = defaultdict(set)
+        for id_paciente, nombre in filas:
+            normalizado = normalizar(nombre)
+            tri = trigramas(normalizado)
+            nombres[id_paciente] = normalizado
+            trigramas_por_id[id_paciente] = tri
+            for t in tri:
+                ids_por_trigrama[t].add(id_paciente)
+        with self._lock:
+            self._nombres = nombres
+            self._trigramas_por_id = trigramas_por_id
+            self._ids_por_trigrama = ids_por_trigrama
+            self._cargado_en = time.monotonic()
+
+    def agregar(self, id_paciente, nombre):
+        with self._lock:
+            self._quitar(id_paciente)
+            normalizado = normalizar(nombre)
+            tri = trigramas(normalizado)
+            self._nombres[id_paciente] = normalizado
+            self._trigramas_por_id[id_paciente] = tri
+            for t in tri:
+                self._ids_por_trigrama[t].add(id_paciente)
+
+    def eliminar(self, id_paciente):
+        with self._lock:
+            self._quitar(id_paciente)
+
+    def _quitar(self, id_paciente):
+        for t in self._trigramas_por_id.pop(id_paciente, ()):
+            ids = self._ids_por_trigrama.get(t)
+            if ids is not None:
+                ids.discard(id_paciente)
+                if not ids:
+                    del self._ids_por_trigrama[t]
+        self._nombres.pop(id_paciente, None)
+
+    def buscar(self, consulta, limite=10):
+        consulta = normalizar(consulta)
+        tri_consulta = trigramas(consulta)
+        if not tri_consulta:
+            return []
+        palabras = consulta.split()
+        with self._lock:
+            comunes = Counter()
+            for t in tri_consulta:
+                comunes.update(self._ids_por_trigrama.get(t, ()))
+            resultados = []
+            for id_paciente, n in comunes.items():
+                nombre = self._nombres[id_paciente]
+                similitud = n / (len(tri_consulta) + len(self._trigramas_por_id[id_paciente]) - n)
+                # Cada palabra buscada puede ser el inicio de una palabra del nombre (autocompletado)
+                prefijo = all(
+                    any(p.startswith(q) for p in nombre.split()) for q in palabras
+                )
+                if similitud < SIMILITUD_MINIMA and not prefijo:
+                    continue
+                puntaje = similitud + (0.5 if prefijo else 0) + (0.5 if nombre.startswith(consulta) else 0)
+                resultados.append((puntaje, nombre, id_paciente))
+        resultados.sort(key=lambda r: (-r[0], r[1]))
+        return [(id_paciente, puntaje) for puntaje, _, id_paciente in resultados[:limite]]
+
+
+# Un índice por clínica, creado al primer uso
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def indice_pacientes(clinica):
+    with _indices_lock:
+        indice = _indices.get(clinica)
+        if indice is None:
+            indice = _indices[clinica] = IndicePacientes()
+        return indice
+
+
+def programar_agregar(db: Session, id_paciente, nombre):
+    db.info.setdefault("indice_pacientes", []).append((id_paciente, nombre))
+
+
+def programar_eliminar(db: Session, id_paciente):
+    db.info.setdefault("indice_pacientes", []).append((id_paciente, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_pendientes(db: Session):
+    pendientes = db.info.pop("indice_pacientes", None)
+    if pendientes:
+        indice = indice_pacientes(clinica_de_sesion(db))
+        for id_paciente, nombre in pendientes:
+            if nombre is None:
+                indice.eliminar(id_paciente)
+            else:
+                indice.agregar(id_paciente, nombre)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendientes(db: Session):
+    db.info.pop("indice_pacientes", None)
@@ -0,0 +1,219 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from config.database import clinica_actual, clinica_de_sesion
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def _version_inicial():
+    # Las versiones arrancan en el reloj para no repetir ETags tras un reinicio
+    return time.time_ns() // 1000
+
+
+class CacheMemoria:
+    # LRU con expiración por entrada; es el respaldo local cuando no hay Redis
+    def __init__(self, max_entradas=CACHE_MAX_ENTRADAS):
+        self._datos = OrderedDict()
+        self._versiones = OrderedDict()
+        self._max_entradas = max_entradas
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return False, None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return False, None
+            self._datos.move_to_end(clave)
+            return True, valor
+
+    def set(self, clave, valor, ttl=CACHE_TTL):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self._max_entradas:
+                self._datos.popitem(last=False)
+
+    def delete(self, *claves):
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    # Los contadores de ETag son por proceso: una escritura atendida por otro
+    # worker no los incrementa aquí. Por eso vencen con el mismo TTL y límite
+    # que los datos; al vencer se reinician desde el reloj, que es mayor que
+    # cualquier valor anterior, y el ETag cambia. Con varios workers un ETag
+    # puede seguir vigente a lo más CACHE_TTL segundos, igual que los datos.
+    def _version_vigente(self, clave):
+        entrada = self._versiones.get(clave)
+        if entrada is None or entrada[0] < time.monotonic():
+            return None
+        return entrada[1]
+
+    def _guardar_version(self, clave, valor):
+        self._versiones[clave] = (time.monotonic() + CACHE_TTL, valor)
+        self._versiones.move_to_end(clave)
+        while len(self._versiones) > self._max_entradas:
+            self._versiones.popitem(last=False)
+
+    def version(self, clave):
+        with self._lock:
+            valor = self._version_vigente(clave)
+            if valor is None:
+                valor = _version_inicial()
+                self._guardar_version(clave, valor)
+            return valor
+
+    def incrementar_version(self, *claves):
+        with self._lock:
+            for clave in claves:
+                valor = self._version_vigente(clave)
+                self._guardar_version(clave, _version_inicial() if valor is None else valor + 1)
+
+
+class CacheRedis:
+    # Cache compartido entre procesos; los valores se guardan con pickle
+    def __init__(self, url=REDIS_URL):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._redis.ping()
+
+    def get(self, clave):
+        valor = self._redis.get(clave)
+        if valor is None:
+            return False, None
+        return True, pickle.loads(valor)
+
+    def set(self, clave, valor, ttl=CACHE_TTL):
+        self._redis.set(clave, pickle.dumps(valor), ex=ttl)
+
+    def delete(self, *claves):
+        if claves:
+            self._redis.delete(*claves)
+
+    def version(self, clave):
+        clave = f"version:{clave}"
+        version = self._redis.get(clave)
+        if version is None:
+            self._redis.set(clave, _version_inicial(), nx=True)
+            version = self._redis.get(clave)
+        return int(version)
+
+    def incrementar_version(self, *claves):
+        with self._redis.pipeline() as pipe:
+            for clave in claves:
+                clave = f"version:{clave}"
+                pipe.set(clave, _version_inicial(), nx=True)
+                pipe.incr(clave)
+            pipe.execute()
+
+
+def _crear_backend():
+    if CACHE_BACKEND == "redis":
+        try:
+            return CacheRedis()
+        except Exception as e:
+            logger.warning("No se pudo usar Redis como cache (%s), se usa cache en memoria", e)
+    return CacheMemoria()
+
+
+backend = _crear_backend()
+
+_estadisticas = defaultdict(lambda: {"aciertos": 0, "fallos": 0})
+_estadisticas_lock = threading.Lock()
+
+
+def _registrar(clave, acierto):
+    recurso = clave.split(":", 1)[0]
+    with _estadisticas_lock:
+        _estadisticas[recurso]["aciertos" if acierto else "fallos"] += 1
+
+
+def estadisticas():
+    with _estadisticas_lock:
+        return {recurso: dict(valores) for recurso, valores in _estadisticas.items()}
+
+
+def _a_datos(resultado):
+    if resultado is None:
+        return None
+    if isinstance(resultado, list):
+        return [_a_datos(r) for r in resultado]
+    return {c.key: getattr(resultado, c.key) for c in inspect(resultado).mapper.column_attrs}
+
+
+def _a_instancias(db: Session, modelo, datos):
+    if datos is None:
+        return None
+    if isinstance(datos, list):
+        return [_a_instancias(db, modelo, d) for d in datos]
+    instancia = modelo(**datos)
+    make_transient_to_detached(instancia)
+    return db.merge(instancia, load=False)
+
+
+def _de_clinica(clinica, clave):
+    # Los ids se repiten entre clínicas con base propia, así que cada clínica
+    # tiene su propio espacio de claves
+    return f"{clinica}:{clave}"
+
+
+def obtener(db: Session, clave: str, modelo, cargar):
+    clave_clinica = _de_clinica(clinica_de_sesion(db), clave)
+    encontrado, datos = backend.get(clave_clinica)
+    _registrar(clave, encontrado)
+    if encontrado:
+        return _a_instancias(db, modelo, datos)
+    resultado = cargar()
+    backend.set(clave_clinica, _a_datos(resultado))
+    return resultado
+
+
+def obtener_serializado(db: Session, clave: str, generar):
+    # Para respuestas que ya salen serializadas (p. ej. recursos FHIR) se guarda
+    # el texto tal cual y un acierto no tiene que volver a armarlo
+    clave_clinica = _de_clinica(clinica_de_sesion(db), clave)
+    encontrado, datos = backend.get(clave_clinica)
+    _registrar(clave, encontrado)
+    if encontrado:
+        return datos
+    datos = generar()
+    backend.set(clave_clinica, datos)
+    return datos
+
+
+def invalidar(db: Session, *claves):
+    # Las claves se borran cuando termina la transacción, para que ninguna
+    # lectura posterior vuelva a guardar datos sin confirmar
+    clinica = clinica_de_sesion(db)
+    db.info.setdefault("cache_invalidar", set()).update(_de_clinica(clinica, clave) for clave in claves)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidar_pendientes(db: Session):
+    claves = db.info.pop("cache_invalidar", None)
+    if claves:
+        backend.delete(*claves)
+        backend.incrementar_version(*claves)
+
+
+def version(clave: str):
+    return backend.version(_de_clinica(clinica_actual.get(), clave))
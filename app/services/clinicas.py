@@ -0,0 +1,35 @@
+import re
+
+from fastapi.responses import JSONResponse
+
+from config.database import CLINICAS_PERMITIDAS, clinica_actual
+
+# La clínica se toma del encabezado X-Clinica, que debe fijar el gateway
+# autenticado; sin encabezado se usa la clínica predeterminada
+ENCABEZADO_CLINICA = b"x-clinica"
+# También se usa como nombre de esquema, así que solo se admiten identificadores simples
+PATRON_CLINICA = re.compile(r"^[a-z0-9_]{1,63}$")
+
+
+class MiddlewareClinica:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        valor = dict(scope["headers"]).get(ENCABEZADO_CLINICA)
+        if valor is None:
+            await self.app(scope, receive, send)
+            return
+        clinica = valor.decode("latin-1").strip().lower()
+        if not PATRON_CLINICA.match(clinica) or (CLINICAS_PERMITIDAS and clinica not in CLINICAS_PERMITIDAS):
+            respuesta = JSONResponse(status_code=400, content={"detail": "La clínica indicada no es válida"})
+            await respuesta(scope, receive, send)
+            return
+        token = clinica_actual.set(clinica)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            clinica_actual.reset(token)
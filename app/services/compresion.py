@@ -0,0 +1,155 @@
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compresión de respuestas negociada con Accept-Encoding. Las respuestas más
+# chicas que COMPRESION_MINIMO bytes se envían tal cual; las que llegan por
+# partes (streaming) se comprimen conforme llegan.
+COMPRESION_MINIMO = int(os.getenv("COMPRESION_MINIMO", "1024"))
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+COMPRESION_NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "4"))
+# Orden de preferencia del servidor cuando el cliente acepta varias
+COMPRESION_ALGORITMOS = [a.strip() for a in os.getenv("COMPRESION_ALGORITMOS", "br,gzip").split(",") if a.strip()]
+
+TIPOS_COMPRIMIBLES = ("application/json", "application/fhir+json", "application/x-ndjson", "application/fhir+ndjson",
+                      "application/xml", "application/javascript", "text/")
+# Los eventos SSE deben llegar al cliente en cuanto se emiten
+TIPOS_EXCLUIDOS = ("text/event-stream",)
+
+if "br" in COMPRESION_ALGORITMOS and brotli is None:
+    logger.info("El paquete brotli no está instalado; solo se usará gzip")
+
+
+def elegir_codificacion(accept_encoding: str):
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        if nombre:
+            aceptadas[nombre.strip().lower()] = q
+    disponibles = [a for a in COMPRESION_ALGORITMOS if a != "br" or brotli is not None]
+    candidatas = [
+        (aceptadas.get(a, aceptadas.get("*", 0.0)), -i, a) for i, a in enumerate(disponibles)
+    ]
+    candidatas = [c for c in candidatas if c[0] > 0]
+    return max(candidatas)[2] if candidatas else None
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(COMPRESION_NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def comprimir(self, datos):
+        return self._z.compress(datos)
+
+    def terminar(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._b = brotli.Compressor(quality=COMPRESION_NIVEL_BROTLI)
+
+    def comprimir(self, datos):
+        return self._b.process(datos)
+
+    def terminar(self):
+        return self._b.finish()
+
+
+COMPRESORES = {"gzip": _Gzip, "br": _Brotli}
+
+
+class MiddlewareCompresion:
+    def __init__(self, app, minimo=COMPRESION_MINIMO):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encabezados = dict(scope["headers"])
+        codificacion = elegir_codificacion(encabezados.get(b"accept-encoding", b"").decode("latin-1"))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        pendiente = []
+        compresor = None
+        directo = False
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor, directo
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                if not self._comprimible(mensaje):
+                    directo = True
+                    await send(mensaje)
+                return
+            if mensaje["type"] != "http.response.body" or directo:
+                await send(mensaje)
+                return
+
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+            if compresor is None:
+                pendiente.append(cuerpo)
+                acumulado = sum(len(p) for p in pendiente)
+                if acumulado < self.minimo and mas:
+                    return
+                if acumulado < self.minimo:
+                    # La respuesta completa quedó bajo el mínimo: se envía sin comprimir
+                    await send(self._con_vary(inicio))
+                    await send({"type": "http.response.body", "body": b"".join(pendiente), "more_body": False})
+                    return
+                compresor = COMPRESORES[codificacion]()
+                await send(self._encabezados_comprimidos(inicio, codificacion))
+                cuerpo = b"".join(pendiente)
+            datos = compresor.comprimir(cuerpo)
+            if not mas:
+                datos += compresor.terminar()
+            if datos or not mas:
+                await send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+        await self.app(scope, receive, enviar)
+
+    @staticmethod
+    def _comprimible(inicio):
+        if inicio["status"] < 200 or inicio["status"] in (204, 206, 304):
+            return False
+        encabezados = {k.lower(): v for k, v in inicio.get("headers", [])}
+        if b"content-encoding" in encabezados:
+            return False
+        tipo = encabezados.get(b"content-type", b"").decode("latin-1").lower()
+        if tipo.startswith(TIPOS_EXCLUIDOS):
+            return False
+        return tipo.startswith(TIPOS_COMPRIMIBLES)
+
+    @staticmethod
+    def _con_vary(inicio):
+        encabezados = [(k, v) for k, v in inicio.get("headers", [])]
+        vary = [v for k, v in encabezados if k.lower() == b"vary"]
+        if not any(b"accept-encoding" in v.lower() for v in vary):
+            encabezados.append((b"vary", b"Accept-Encoding"))
+        return {**inicio, "headers": encabezados}
+
+    def _encabezados_comprimidos(self, inicio, codificacion):
+        inicio = self._con_vary(inicio)
+        encabezados = [(k, v) for k, v in inicio["headers"] if k.lower() != b"content-length"]
+        encabezados.append((b"content-encoding", codificacion.encode()))
+        return {**inicio, "headers": encabezados}
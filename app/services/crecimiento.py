@@ -0,0 +1,178 @@
+import argparse
+import math
+import os
+import re
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Puntuaciones z de crecimiento de la OMS (método LMS) para pacientes
+# pediátricos. Las tablas L, M, S no se incluyen en el repositorio: se
+# descargan de la OMS (Child Growth Standards 0-5 años, tablas "expanded" por
+# día, y Growth Reference 2007 de 5-19 años, por mes) y se convierten una vez a
+# arreglos .npy con
+#   cd app
+#   python -m services.crecimiento peso_edad M wfa_boys_z_exp.txt wfa_boys_2007_exp.txt
+# Cada archivo .npy tiene columnas (edad en días, L, M, S) y se abre mapeado en
+# memoria, así que todos los procesos de la API comparten las mismas páginas.
+CRECIMIENTO_DIR = os.getenv("CRECIMIENTO_DIR", os.path.join("datos", "oms"))
+
+INDICADORES = ("peso_edad", "talla_edad", "imc_edad")
+SEXOS = ("M", "F")
+DIAS_POR_MES = 30.4375
+# La OMS corrige las z mayores a 3 en valor absoluto solo para los indicadores de peso
+INDICADORES_AJUSTADOS = ("peso_edad", "imc_edad")
+
+_tablas = {}
+_lock = threading.Lock()
+
+
+class TablasNoDisponibles(Exception):
+    pass
+
+
+def ruta_tabla(indicador: str, sexo: str):
+    return os.path.join(CRECIMIENTO_DIR, f"{indicador}_{sexo}.npy")
+
+
+def tabla(indicador: str, sexo: str):
+    clave = (indicador, sexo)
+    if clave not in _tablas:
+        with _lock:
+            if clave not in _tablas:
+                _tablas[clave] = np.load(ruta_tabla(indicador, sexo), mmap_mode="r")
+    return _tablas[clave]
+
+
+def verificar_tablas():
+    if np is None:
+        raise TablasNoDisponibles("El paquete numpy no está instalado")
+    faltantes = [
+        os.path.basename(ruta_tabla(i, s)) for i in INDICADORES for s in SEXOS if not os.path.exists(ruta_tabla(i, s))
+    ]
+    if faltantes:
+        raise TablasNoDisponibles(
+            "Faltan las tablas de referencia de la OMS: " + ", ".join(faltantes) + "; ver services/crecimiento.py"
+        )
+
+
+def _valor_en_z(l, m, s, k):
+    return m * (1 + l * s * k) ** (1 / l)
+
+
+def puntuacion_z(indicador: str, sexo: str, edad_dias, valor):
+    # Interpola L, M y S a la edad exacta y aplica z = ((x/M)^L - 1) / (L*S).
+    # Fuera del rango de la tabla el resultado es NaN.
+    lms = tabla(indicador, sexo)
+    edades = lms[:, 0]
+    l, m, s = (np.interp(edad_dias, edades, lms[:, i], left=np.nan, right=np.nan) for i in (1, 2, 3))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(np.abs(l) < 1e-9, np.log(valor / m) / s, ((valor / m) ** l - 1) / (l * s))
+        if indicador in INDICADORES_AJUSTADOS:
+            sd2, sd3 = _valor_en_z(l, m, s, 2), _valor_en_z(l, m, s, 3)
+            sd2n, sd3n = _valor_en_z(l, m, s, -2), _valor_en_z(l, m, s, -3)
+            z = np.where(z > 3, 3 + (valor - sd3) / (sd3 - sd2), z)
+            z = np.where(z < -3, -3 + (valor - sd3n) / (sd2n - sd3n), z)
+    return z
+
+
+_erf = None
+
+
+def percentil(z):
+    global _erf
+    if _erf is None:
+        _erf = np.frompyfunc(math.erf, 1, 1)
+    return 50 * (1 + _erf(z / math.sqrt(2)).astype(float))
+
+
+def calcular(mediciones):
+    # mediciones: filas con id_consulta, id_paciente, fecha, pesoafuera,
+    # tallaafuera (metros), fecha_nacimiento y genero. Se calculan todas juntas
+    # por indicador y sexo.
+    verificar_tablas()
+    if not mediciones:
+        return []
+    edad = np.array([
+        (f.fecha - f.fecha_nacimiento).days if f.fecha and f.fecha_nacimiento else np.nan for f in mediciones
+    ], dtype=float)
+    sexo = np.array([f.genero if f.genero in SEXOS else "" for f in mediciones])
+    peso = np.array([f.pesoafuera if f.pesoafuera is not None else np.nan for f in mediciones], dtype=float)
+    talla = np.array([f.tallaafuera if f.tallaafuera is not None else np.nan for f in mediciones], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valores = {"peso_edad": peso, "talla_edad": talla * 100, "imc_edad": peso / talla ** 2}
+
+    puntuaciones = {}
+    for indicador, valor in valores.items():
+        z = np.full(len(mediciones), np.nan)
+        for clave_sexo in SEXOS:
+            filtro = (sexo == clave_sexo) & np.isfinite(edad) & (edad >= 0) & np.isfinite(valor) & (valor > 0)
+            if filtro.any():
+                z[filtro] = puntuacion_z(indicador, clave_sexo, edad[filtro], valor[filtro])
+        puntuaciones[indicador] = (z, percentil(z))
+
+    resultado = []
+    for i, f in enumerate(mediciones):
+        fila = {
+            "id_consulta": f.id_consulta,
+            "id_paciente": f.id_paciente,
+            "fecha": f.fecha.isoformat() if f.fecha else None,
+            "edad_dias": None if math.isnan(edad[i]) else int(edad[i]),
+        }
+        for indicador, (z, p) in puntuaciones.items():
+            fila[indicador] = None if math.isnan(z[i]) else {"z": round(float(z[i]), 2), "percentil": round(float(p[i]), 1)}
+        resultado.append(fila)
+    return resultado
+
+
+def leer_lms(ruta: str):
+    # Lee un archivo de la OMS (texto separado por tabuladores, espacios o comas)
+    # con columna Day o Month y columnas L, M, S; devuelve filas (días, L, M, S)
+    with open(ruta, encoding="utf-8-sig") as archivo:
+        lineas = [linea for linea in archivo if linea.strip()]
+    encabezado = [c.strip().lower() for c in re.split(r"[\t,; ]+", lineas[0].strip())]
+    if "day" in encabezado:
+        columna_edad, factor = encabezado.index("day"), 1.0
+    elif "month" in encabezado:
+        columna_edad, factor = encabezado.index("month"), DIAS_POR_MES
+    else:
+        raise ValueError(f"{ruta}: no tiene columna Day ni Month")
+    columnas = [columna_edad] + [encabezado.index(c) for c in ("l", "m", "s")]
+    filas = []
+    for linea in lineas[1:]:
+        partes = re.split(r"[\t,; ]+", linea.strip())
+        edad, l, m, s = (float(partes[c]) for c in columnas)
+        filas.append((edad * factor, l, m, s))
+    return filas
+
+
+def construir(indicador: str, sexo: str, archivos):
+    filas = {}
+    for ruta in archivos:
+        for fila in leer_lms(ruta):
+            # Donde se traslapan dos tablas gana la primera (los estándares 0-5 años)
+            filas.setdefault(round(fila[0], 4), fila)
+    arreglo = np.array(sorted(filas.values()), dtype=np.float64)
+    os.makedirs(CRECIMIENTO_DIR, exist_ok=True)
+    np.save(ruta_tabla(indicador, sexo), arreglo)
+    return arreglo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte tablas LMS de la OMS a arreglos .npy")
+    parser.add_argument("indicador", choices=INDICADORES)
+    parser.add_argument("sexo", choices=sorted(SEXOS))
+    parser.add_argument("archivos", nargs="+", help="Tablas de la OMS, de menor a mayor edad")
+    argumentos = parser.parse_args()
+    if np is None:
+        parser.error("El paquete numpy no está instalado")
+    arreglo = construir(argumentos.indicador, argumentos.sexo, argumentos.archivos)
+    print(f"{ruta_tabla(argumentos.indicador, argumentos.sexo)}: {len(arreglo)} edades, "
+          f"de {arreglo[0, 0]:.0f} a {arreglo[-1, 0]:.0f} días")
+
+
+if __name__ == "__main__":
+    main()
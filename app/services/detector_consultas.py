@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+import traceback
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Detector de N+1 y consultas lentas para desarrollo y staging. Registra cada
+# sentencia de la petición con el punto del código que la originó, así que solo
+# se activa con DETECTOR_CONSULTAS=1.
+DETECTOR_CONSULTAS = os.getenv("DETECTOR_CONSULTAS", "0") == "1"
+MAX_CONSULTAS = int(os.getenv("DETECTOR_MAX_CONSULTAS", "10"))
+MAX_REPETICIONES = int(os.getenv("DETECTOR_MAX_REPETICIONES", "3"))
+CONSULTA_LENTA_MS = float(os.getenv("DETECTOR_CONSULTA_LENTA_MS", "100"))
+# En pruebas, exceder el presupuesto de una ruta lanza una excepción en vez de solo registrarlo
+DETECTOR_ESTRICTO = os.getenv("DETECTOR_ESTRICTO", "0") == "1"
+
+DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_sentencias = ContextVar("detector_sentencias", default=None)
+
+
+class PresupuestoConsultasExcedido(Exception):
+    pass
+
+
+def presupuesto_consultas(maximo: int):
+    # Declara cuántas sentencias puede ejecutar una ruta, p. ej.
+    #   @router.get(...)
+    #   @presupuesto_consultas(2)
+    def decorar(funcion):
+        funcion.presupuesto_consultas = maximo
+        return funcion
+    return decorar
+
+
+def _origen():
+    # Los marcos más internos del código de la aplicación que llevaron a la sentencia
+    marcos = [
+        m for m in traceback.extract_stack()
+        if m.filename.startswith(DIRECTORIO_APP) and not m.filename.endswith("detector_consultas.py")
+    ]
+    return " <- ".join(
+        f"{os.path.relpath(m.filename, DIRECTORIO_APP)}:{m.lineno} {m.name}" for m in reversed(marcos[-3:])
+    )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_sentencia(conexion, cursor, sentencia, parametros, contexto, varios):
+    if _sentencias.get() is not None:
+        conexion.info.setdefault("detector_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_sentencia(conexion, cursor, sentencia, parametros, contexto, varios):
+    sentencias = _sentencias.get()
+    inicios = conexion.info.get("detector_inicio")
+    if sentencias is None or not inicios:
+        return
+    duracion_ms = (time.perf_counter() - inicios.pop()) * 1000
+    sentencias.append((" ".join(sentencia.split()), duracion_ms, _origen()))
+
+
+@event.listens_for(Engine, "handle_error")
+def _error_de_sentencia(contexto):
+    inicios = contexto.connection.info.get("detector_inicio") if contexto.connection is not None else None
+    if inicios:
+        inicios.pop()
+
+
+def analizar(metodo, ruta, sentencias, presupuesto=None):
+    # Devuelve los problemas encontrados; vacío si la petición está bien
+    problemas = []
+    if presupuesto is not None and len(sentencias) > presupuesto:
+        problemas.append(f"{len(sentencias)} sentencias, el presupuesto de la ruta es {presupuesto}")
+    elif presupuesto is None and len(sentencias) > MAX_CONSULTAS:
+        problemas.append(f"{len(sentencias)} sentencias (máximo {MAX_CONSULTAS})")
+    repetidas = Counter(sql for sql, _, _ in sentencias)
+    for sql, veces in repetidas.items():
+        if veces > MAX_REPETICIONES:
+            problemas.append(f"posible N+1: la misma sentencia se ejecutó {veces} veces: {sql[:200]}")
+    for sql, duracion_ms, origen in sentencias:
+        if duracion_ms > CONSULTA_LENTA_MS:
+            problemas.append(f"sentencia lenta ({duracion_ms:.1f} ms) en {origen}: {sql[:200]}")
+    if problemas:
+        detalle = "\n".join(
+            f"  {i}. ({duracion_ms:.1f} ms) {sql[:200]}\n     {origen}"
+            for i, (sql, duracion_ms, origen) in enumerate(sentencias, 1)
+        )
+        logger.warning("%s %s: %s\n%s", metodo, ruta, "; ".join(problemas), detalle)
+    return problemas
+
+
+class MiddlewareDetectorConsultas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        sentencias = []
+        token = _sentencias.set(sentencias)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _sentencias.reset(token)
+        ruta = scope.get("route")
+        presupuesto = getattr(getattr(ruta, "endpoint", None), "presupuesto_consultas", None)
+        nombre_ruta = getattr(ruta, "path", scope["path"])
+        problemas = analizar(scope["method"], nombre_ruta, sentencias, presupuesto)
+        if DETECTOR_ESTRICTO and presupuesto is not None and len(sentencias) > presupuesto:
+            raise PresupuestoConsultasExcedido(f"{scope['method']} {nombre_ruta}: " + "; ".join(problemas))
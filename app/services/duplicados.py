@@ -0,0 +1,212 @@
+import argparse
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from itertools import combinations
+
+from config.database import CLINICA_PREDETERMINADA, SessionLocal
+from crud.duplicados_crud import get_datos_pacientes, guardar_posibles_duplicados
+from services.busqueda_pacientes import normalizar
+
+logger = logging.getLogger(__name__)
+
+# Detección de pacientes duplicados. Comparar todos contra todos es O(n²); en
+# su lugar cada paciente cae en bloques según claves baratas (pares de códigos
+# fonéticos de las palabras del nombre, fecha de nacimiento y teléfono) y solo
+# se comparan los pacientes que comparten algún bloque. Los bloques más grandes
+# que DUPLICADOS_BLOQUE_MAXIMO se omiten: una clave tan común no distingue.
+# Los pares con puntaje >= DUPLICADOS_UMBRAL quedan en posibles_duplicados para
+# que alguien los revise y los fusione o descarte.
+#   cd app
+#   python -m services.duplicados --clinica principal
+DUPLICADOS_UMBRAL = float(os.getenv("DUPLICADOS_UMBRAL", "0.85"))
+DUPLICADOS_BLOQUE_MAXIMO = int(os.getenv("DUPLICADOS_BLOQUE_MAXIMO", "200"))
+# Sin un nombre parecido no es duplicado aunque coincidan fecha y teléfono
+# (p. ej. hermanos gemelos o familiares con el mismo teléfono)
+DUPLICADOS_NOMBRE_MINIMO = float(os.getenv("DUPLICADOS_NOMBRE_MINIMO", "0.85"))
+# Dos palabras con Jaro-Winkler menor a esto se consideran distintas
+PALABRA_MINIMA = 0.8
+
+PESOS = {"nombre": 0.6, "fecha_nacimiento": 0.25, "telefono": 0.15}
+PALABRAS_VACIAS = {"de", "del", "la", "las", "los", "y"}
+
+# Reglas en orden; aproximan cómo suena el español de México
+REGLAS_FONETICAS = [
+    (r"^x", "j"), (r"ph", "f"), (r"ch", "C"), (r"ll", "y"), (r"qu", "k"), (r"gu(?=[ei])", "g"),
+    (r"g(?=[ei])", "j"), (r"c(?=[ei])", "s"), (r"c", "k"), (r"z", "s"), (r"x", "ks"), (r"[vw]", "b"),
+    (r"h", ""), (r"y(?![aeiou])", "i"),
+]
+
+
+def codigo_fonetico(palabra: str):
+    # Primera letra y luego solo consonantes, sin repetidas
+    palabra = re.sub(r"[^a-z]", "", normalizar(palabra))
+    for patron, reemplazo in REGLAS_FONETICAS:
+        palabra = re.sub(patron, reemplazo, palabra)
+    if not palabra:
+        return ""
+    consonantes = re.sub(r"[aeiou]", "", palabra[1:])
+    codigo = palabra[0] + re.sub(r"(.)\1+", r"\1", consonantes)
+    return codigo[:6]
+
+
+def jaro_winkler(a: str, b: str):
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    ventana = max(len(a), len(b)) // 2 - 1
+    coincide_a, coincide_b = [False] * len(a), [False] * len(b)
+    coincidencias = 0
+    for i, c in enumerate(a):
+        for j in range(max(0, i - ventana), min(len(b), i + ventana + 1)):
+            if not coincide_b[j] and b[j] == c:
+                coincide_a[i] = coincide_b[j] = True
+                coincidencias += 1
+                break
+    if not coincidencias:
+        return 0.0
+    transposiciones, j = 0, 0
+    for i, c in enumerate(a):
+        if coincide_a[i]:
+            while not coincide_b[j]:
+                j += 1
+            transposiciones += c != b[j]
+            j += 1
+    m = coincidencias
+    jaro = (m / len(a) + m / len(b) + (m - transposiciones / 2) / m) / 3
+    prefijo = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefijo += 1
+    return jaro + prefijo * 0.1 * (1 - jaro)
+
+
+def _digitos(telefono):
+    digitos = re.sub(r"\D", "", telefono or "")
+    return digitos[-8:] if len(digitos) >= 7 else None
+
+
+class Registro:
+    def __init__(self, id_paciente, nombre, fecha_nacimiento, telefono, genero):
+        self.id_paciente = id_paciente
+        self.palabras = [p for p in normalizar(nombre).split() if p not in PALABRAS_VACIAS]
+        self.nombre = " ".join(self.palabras)
+        self.codigos = sorted({c for c in (codigo_fonetico(p) for p in self.palabras) if c})
+        self.fecha_nacimiento = fecha_nacimiento
+        self.telefono = _digitos(telefono)
+        self.genero = (genero or "").upper()[:1] or None
+
+    def claves(self):
+        # Dos registros de la misma persona casi siempre comparten al menos dos
+        # palabras del nombre (nombre y primer apellido), aunque cambie la ortografía
+        claves = [("nombre", a, b) for a, b in combinations(self.codigos, 2)]
+        if len(self.codigos) == 1:
+            claves.append(("nombre", self.codigos[0]))
+        if self.fecha_nacimiento:
+            claves.append(("fecha_nacimiento", self.fecha_nacimiento))
+        if self.telefono:
+            claves.append(("telefono", self.telefono))
+        return claves
+
+
+def similitud_nombre(a: Registro, b: Registro):
+    # Promedio entre el nombre completo y la mejor pareja de cada palabra del
+    # nombre más corto; lo segundo tolera un apellido de más o de menos
+    if not a.palabras or not b.palabras:
+        return 0.0
+    corto, largo = sorted((a.palabras, b.palabras), key=len)
+    # Parejas uno a uno, de la más parecida a la menos; una palabra no se usa dos veces
+    similitudes = sorted(
+        ((jaro_winkler(p, q), i, j) for i, p in enumerate(corto) for j, q in enumerate(largo)), reverse=True
+    )
+    usadas_corto, usadas_largo, suma = set(), set(), 0.0
+    for similitud, i, j in similitudes:
+        if similitud < PALABRA_MINIMA:
+            break
+        if i not in usadas_corto and j not in usadas_largo:
+            usadas_corto.add(i)
+            usadas_largo.add(j)
+            suma += similitud
+    por_palabra = suma / len(corto)
+    return (jaro_winkler(a.nombre, b.nombre) + por_palabra) / 2
+
+
+def puntuar(a: Registro, b: Registro):
+    partes = {"nombre": similitud_nombre(a, b)}
+    motivos = [f"nombre {partes['nombre']:.2f}"]
+    if partes["nombre"] < DUPLICADOS_NOMBRE_MINIMO:
+        return 0.0, motivos[0]
+    if a.fecha_nacimiento and b.fecha_nacimiento:
+        if a.fecha_nacimiento == b.fecha_nacimiento:
+            partes["fecha_nacimiento"] = 1.0
+            motivos.append("misma fecha de nacimiento")
+        elif (a.fecha_nacimiento.year, a.fecha_nacimiento.month, a.fecha_nacimiento.day) == (
+            b.fecha_nacimiento.year, b.fecha_nacimiento.day, b.fecha_nacimiento.month
+        ):
+            partes["fecha_nacimiento"] = 0.7
+            motivos.append("día y mes invertidos")
+        else:
+            partes["fecha_nacimiento"] = 0.0
+            motivos.append("otra fecha de nacimiento")
+    if a.telefono and b.telefono:
+        partes["telefono"] = 1.0 if a.telefono == b.telefono else 0.0
+        motivos.append("mismo teléfono" if a.telefono == b.telefono else "otro teléfono")
+    # Los datos que faltan no cuentan a favor ni en contra
+    puntaje = sum(PESOS[k] * v for k, v in partes.items()) / sum(PESOS[k] for k in partes)
+    if a.genero and b.genero and a.genero != b.genero:
+        puntaje -= 0.2
+        motivos.append("otro género")
+    return round(max(puntaje, 0.0), 4), ", ".join(motivos)
+
+
+def detectar(filas, umbral: float = DUPLICADOS_UMBRAL):
+    # filas: (id_paciente, nombre, fecha_nacimiento, telefono, genero)
+    registros = {f[0]: Registro(*f) for f in filas}
+    bloques = defaultdict(list)
+    for registro in registros.values():
+        for clave in registro.claves():
+            bloques[clave].append(registro.id_paciente)
+    candidatos = set()
+    omitidos = 0
+    for ids in bloques.values():
+        if len(ids) > DUPLICADOS_BLOQUE_MAXIMO:
+            omitidos += 1
+            continue
+        candidatos.update(combinations(sorted(ids), 2))
+    pares = []
+    for a, b in candidatos:
+        puntaje, motivos = puntuar(registros[a], registros[b])
+        if puntaje >= umbral:
+            pares.append((a, b, puntaje, motivos))
+    pares.sort(key=lambda p: -p[2])
+    if omitidos:
+        logger.info("Se omitieron %s bloques con más de %s pacientes", omitidos, DUPLICADOS_BLOQUE_MAXIMO)
+    return pares, {"pacientes": len(registros), "comparaciones": len(candidatos), "bloques_omitidos": omitidos}
+
+
+def detectar_duplicados(db, umbral: float = DUPLICADOS_UMBRAL):
+    pares, resumen = detectar(get_datos_pacientes(db), umbral)
+    resumen.update(encontrados=len(pares), nuevos=guardar_posibles_duplicados(db, pares))
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca pacientes duplicados y los deja pendientes de revisión")
+    parser.add_argument("--clinica", default=CLINICA_PREDETERMINADA)
+    parser.add_argument("--umbral", type=float, default=DUPLICADOS_UMBRAL)
+    argumentos = parser.parse_args()
+    db = SessionLocal(info={"clinica": argumentos.clinica})
+    try:
+        resumen = detectar_duplicados(db, argumentos.umbral)
+        db.commit()
+    finally:
+        db.close()
+    print(json.dumps(resumen, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
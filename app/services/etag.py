@@ -0,0 +1,49 @@
+from fastapi import HTTPException, Request, Response
+from services import cache
+
+
+def calcular_etag(*claves):
+    # ETag débil armado con los contadores de cambios de cada clave, así una
+    # petición condicional se resuelve sin consultar la base de datos
+    return 'W/"' + ".".join(str(cache.version(clave)) for clave in claves) + '"'
+
+
+def _sin_prefijo_debil(etiqueta):
+    etiqueta = etiqueta.strip()
+    return etiqueta[2:] if etiqueta.startswith("W/") else etiqueta
+
+
+def no_modificado(request: Request, etag: str):
+    encabezado = request.headers.get("if-none-match")
+    if not encabezado:
+        return False
+    if encabezado.strip() == "*":
+        return True
+    etiqueta = _sin_prefijo_debil(etag)
+    return any(_sin_prefijo_debil(e) == etiqueta for e in encabezado.split(","))
+
+
+def verificar_etag(request: Request, response: Response, *claves):
+    etag = calcular_etag(*claves)
+    if no_modificado(request, etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+
+def verificar_version(request: Request, response: Response, version: int):
+    # Los GET de un solo registro usan la versión de la fila como ETag, la
+    # misma que If-Match espera en PUT y PATCH
+    etag = f'W/"{version}"'
+    if no_modificado(request, etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+
+def version_de_if_match(if_match: str | None):
+    # If-Match lleva el número de versión del registro, p. ej. "3" o W/"3"
+    if if_match is None or if_match.strip() == "*":
+        return None
+    valor = _sin_prefijo_debil(if_match).strip('"')
+    if not valor.isdigit():
+        raise HTTPException(status_code=400, detail="El encabezado If-Match debe contener la versión del registro")
+    return int(valor)
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config.database import SessionLocal
+from crud.sincronizacion_crud import get_cambios_posteriores, get_secuencia
+from services.outbox import motores
+# Debe importarse antes de registrar los eventos de este módulo: sus cambios se
+# guardan en before_commit y aquí se leen en el mismo evento
+import services.sincronizacion  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# Avisos de cambios para los clientes (GET /eventos, Server-Sent Events). Los
+# cambios salen de la bitácora de /sync. Con PostgreSQL se publican con NOTIFY
+# dentro de la transacción, así que solo se entregan si se confirma y llegan a
+# todos los nodos de la API; cada nodo tiene un hilo con LISTEN que los reparte
+# entre sus suscriptores. Con SQLite (un solo nodo) se reparten en el proceso
+# después del COMMIT. Para no usar NOTIFY en PostgreSQL: EVENTOS_NOTIFY=0.
+EVENTOS_NOTIFY = os.getenv("EVENTOS_NOTIFY", "1") == "1"
+EVENTOS_COLA = int(os.getenv("EVENTOS_COLA", "1000"))
+EVENTOS_MAX_CLIENTES = int(os.getenv("EVENTOS_MAX_CLIENTES", "500"))
+EVENTOS_LATIDO = float(os.getenv("EVENTOS_LATIDO", "15"))
+EVENTOS_REPOSICION = int(os.getenv("EVENTOS_REPOSICION", "1000"))
+
+CANAL = "cambios_api"
+# PostgreSQL limita la carga de un NOTIFY a 8000 bytes
+NOTIFY_MAXIMO = 7000
+CAMPOS = ("secuencia", "tabla", "id_registro", "id_paciente", "operacion")
+
+
+class DemasiadosClientes(Exception):
+    pass
+
+
+class Suscripcion:
+    def __init__(self, clinica: str, id_paciente: int | None):
+        self.clinica = clinica
+        self.id_paciente = id_paciente
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(EVENTOS_COLA)
+        self.reiniciar = False
+
+    def interesa(self, clinica: str, cambio: dict):
+        return clinica == self.clinica and (self.id_paciente is None or cambio["id_paciente"] == self.id_paciente)
+
+    def _entregar(self, cambio):
+        # Corre en el loop del cliente. None le indica que debe reiniciar: se
+        # llenó su cola o se perdieron avisos y tiene que reponerlos con /sync
+        if self.reiniciar:
+            return
+        if cambio is None or self.cola.full():
+            self.reiniciar = True
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+        else:
+            self.cola.put_nowait(cambio)
+
+
+class Difusor:
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self, clinica: str, id_paciente: int | None = None):
+        with self._lock:
+            if len(self._suscripciones) >= EVENTOS_MAX_CLIENTES:
+                raise DemasiadosClientes()
+            suscripcion = Suscripcion(clinica, id_paciente)
+            self._suscripciones.add(suscripcion)
+            return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def clientes(self):
+        return len(self._suscripciones)
+
+    def _enviar(self, suscripcion, cambio):
+        try:
+            suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, cambio)
+        except RuntimeError:
+            # El loop ya se cerró; la suscripción se cancela al terminar su respuesta
+            pass
+
+    def publicar(self, clinica: str, cambios):
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            for cambio in cambios:
+                if suscripcion.interesa(clinica, cambio):
+                    self._enviar(suscripcion, cambio)
+
+    def reiniciar_todas(self):
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            self._enviar(suscripcion, None)
+
+
+difusor = Difusor()
+
+
+def _usa_notify(db: Session):
+    return EVENTOS_NOTIFY and db.get_bind().dialect.name == "postgresql"
+
+
+def _cargas(clinica: str, filas):
+    # Agrupa los cambios en cargas JSON que quepan en un NOTIFY
+    cambios = [[fila[c] for c in CAMPOS] for fila in filas]
+    inicio = 0
+    while inicio < len(cambios):
+        fin = len(cambios)
+        while True:
+            carga = json.dumps({"clinica": clinica, "cambios": cambios[inicio:fin]}, separators=(",", ":"))
+            if len(carga.encode()) <= NOTIFY_MAXIMO or fin - inicio == 1:
+                break
+            fin = inicio + max(1, (fin - inicio) // 2)
+        yield carga
+        inicio = fin
+
+
+@event.listens_for(Session, "before_commit")
+def _notificar(db: Session):
+    if "cambios_guardados" not in db.info or not _usa_notify(db):
+        return
+    clinica, filas = db.info.pop("cambios_guardados")
+    for carga in _cargas(clinica, filas):
+        db.execute(text("SELECT pg_notify(:canal, :carga)"), {"canal": CANAL, "carga": carga})
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar(db: Session):
+    guardados = db.info.pop("cambios_guardados", None)
+    if guardados is not None:
+        clinica, filas = guardados
+        difusor.publicar(clinica, [{c: fila[c] for c in CAMPOS} for fila in filas])
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(db: Session):
+    db.info.pop("cambios_guardados", None)
+
+
+class Escucha:
+    # Un hilo por base PostgreSQL con una conexión dedicada en LISTEN
+    def __init__(self, motor):
+        self.motor = motor
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name=f"eventos-{self.motor.url.database}", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout=5)
+        self._hilo = None
+
+    def _ciclo(self):
+        conectada_antes = False
+        while not self._detener.is_set():
+            conexion = None
+            try:
+                conexion = self.motor.raw_connection()
+                pg = conexion.driver_connection
+                # Fuera del pool: queda ocupada mientras viva el hilo
+                conexion.detach()
+                pg.autocommit = True
+                with pg.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CANAL}")
+                if conectada_antes:
+                    # Mientras no hubo conexión se pudieron perder avisos
+                    difusor.reiniciar_todas()
+                conectada_antes = True
+                while not self._detener.is_set():
+                    if select.select([pg], [], [], 1.0) == ([], [], []):
+                        continue
+                    pg.poll()
+                    while pg.notifies:
+                        self._recibir(pg.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Se perdió la conexión LISTEN de eventos; se reintenta")
+                self._detener.wait(5)
+            finally:
+                if conexion is not None:
+                    try:
+                        conexion.close()
+                    except Exception:
+                        pass
+
+    def _recibir(self, carga: str):
+        try:
+            datos = json.loads(carga)
+            cambios = [dict(zip(CAMPOS, cambio)) for cambio in datos["cambios"]]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Aviso de cambios inválido: %s", carga[:200])
+            return
+        difusor.publicar(datos["clinica"], cambios)
+
+
+_escuchas = []
+
+
+def iniciar_escuchas():
+    if not EVENTOS_NOTIFY:
+        return
+    urls = set()
+    for motor in motores():
+        # Las clínicas por esquema comparten la base y el canal de la principal
+        if motor.dialect.name != "postgresql" or str(motor.url) in urls:
+            continue
+        urls.add(str(motor.url))
+        escucha = Escucha(motor)
+        escucha.iniciar()
+        _escuchas.append(escucha)
+
+
+def detener_escuchas():
+    while _escuchas:
+        _escuchas.pop().detener()
+
+
+def _reponer(clinica: str, desde: int, id_paciente: int | None):
+    # Devuelve los cambios posteriores a `desde`, o None si ya no se pueden reponer
+    db = SessionLocal(info={"clinica": clinica})
+    try:
+        actual, purgado_hasta = get_secuencia(db)
+        if desde < purgado_hasta or desde > actual:
+            return None
+        cambios = get_cambios_posteriores(db, desde, id_paciente, EVENTOS_REPOSICION + 1)
+        return None if len(cambios) > EVENTOS_REPOSICION else cambios
+    finally:
+        db.close()
+
+
+def _formatear(cambio: dict):
+    datos = {c: cambio[c] for c in CAMPOS if c != "secuencia"}
+    return f"id: {cambio['secuencia']}\nevent: cambio\ndata: {json.dumps(datos)}\n\n"
+
+
+REINICIO = "event: reinicio\ndata: {}\n\n"
+
+
+async def transmitir(clinica: str, id_paciente: int | None, ultimo_id: int | None):
+    # La suscripción se abre antes de reponer para no perder lo que se confirme
+    # mientras tanto; lo repuesto se descarta cuando vuelve a llegar en vivo
+    try:
+        suscripcion = difusor.suscribir(clinica, id_paciente)
+    except DemasiadosClientes:
+        yield REINICIO
+        return
+    try:
+        yield "retry: 3000\n\n"
+        repuesto_hasta = -1
+        if ultimo_id is not None:
+            cambios = await run_in_threadpool(_reponer, clinica, ultimo_id, id_paciente)
+            if cambios is None:
+                yield REINICIO
+                return
+            for cambio in cambios:
+                yield _formatear(cambio)
+            repuesto_hasta = cambios[-1]["secuencia"] if cambios else ultimo_id
+        while True:
+            try:
+                cambio = await asyncio.wait_for(suscripcion.cola.get(), EVENTOS_LATIDO)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": latido\n\n"
+                continue
+            if cambio is None:
+                yield REINICIO
+                return
+            if cambio["secuencia"] > repuesto_hasta:
+                yield _formatear(cambio)
+    finally:
+        difusor.cancelar(suscripcion)
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from config.database import motor_de_clinica
+from models.models import Consulta, Expediente, MedidasHuesos, MedidasMusculos, Paciente
+from services.fhir_mapeo import (
+    construir_bundle_expediente, consulta_a_fhir, id_fhir, medidas_huesos_a_fhir, medidas_musculos_a_fhir, paciente_a_fhir,
+)
+
+logger = logging.getLogger(__name__)
+
+# Exportación masiva FHIR ($export de Bulk Data). Cada exportación corre en un
+# hilo de fondo y escribe un archivo NDJSON por tipo de recurso en
+# EXPORTACIONES_DIR/<id>/. Las filas se leen con cursores del lado del servidor
+# y se escriben conforme llegan, así que la memoria no crece con la base. El
+# estado se guarda en estado.json junto a los archivos para que cualquier
+# proceso de la API pueda responder la consulta de estado.
+EXPORTACIONES_DIR = os.getenv("EXPORTACIONES_DIR", "exportaciones")
+EXPORTACIONES_HORAS = float(os.getenv("EXPORTACIONES_HORAS", "24"))
+EXPORTACION_LOTE = int(os.getenv("EXPORTACION_LOTE", "1000"))
+
+TIPOS_EXPORTABLES = ("Patient", "Observation", "Condition", "Procedure", "MedicationStatement")
+
+
+class ExportacionCancelada(Exception):
+    pass
+
+
+def _carpeta(id_exportacion):
+    return os.path.join(EXPORTACIONES_DIR, id_exportacion)
+
+
+def _guardar_estado(id_exportacion, estado):
+    # Se escribe a un temporal y se renombra para no leer nunca un JSON a medias
+    ruta = os.path.join(_carpeta(id_exportacion), "estado.json")
+    with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+        json.dump(estado, archivo)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def leer_estado(id_exportacion):
+    if not id_exportacion.isalnum():
+        return None
+    try:
+        with open(os.path.join(_carpeta(id_exportacion), "estado.json"), encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def ruta_archivo(id_exportacion, tipo):
+    return os.path.join(_carpeta(id_exportacion), f"{tipo}.ndjson")
+
+
+def cancelar(id_exportacion):
+    # Si sigue en curso el hilo ve la marca y borra la carpeta al detenerse
+    estado = leer_estado(id_exportacion)
+    if estado is None:
+        return False
+    if estado["estado"] == "en_curso":
+        open(os.path.join(_carpeta(id_exportacion), "cancelado"), "w").close()
+    else:
+        shutil.rmtree(_carpeta(id_exportacion), ignore_errors=True)
+    return True
+
+
+def limpiar_vencidas():
+    if not os.path.isdir(EXPORTACIONES_DIR):
+        return
+    limite = time.time() - EXPORTACIONES_HORAS * 3600
+    for nombre in os.listdir(EXPORTACIONES_DIR):
+        carpeta = _carpeta(nombre)
+        if os.path.isdir(carpeta) and os.path.getmtime(carpeta) < limite:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def iniciar(clinica: str, tipos, solicitud: str):
+    limpiar_vencidas()
+    id_exportacion = uuid.uuid4().hex
+    os.makedirs(_carpeta(id_exportacion))
+    estado = {
+        "estado": "en_curso",
+        "clinica": clinica,
+        "tipos": sorted(tipos),
+        "request": solicitud,
+        "transactionTime": datetime.now(timezone.utc).isoformat(),
+        "progreso": "iniciando",
+        "salida": [],
+        "error": None,
+    }
+    _guardar_estado(id_exportacion, estado)
+    threading.Thread(
+        target=_ejecutar, args=(id_exportacion, estado), name=f"exportacion-{id_exportacion}", daemon=True
+    ).start()
+    return id_exportacion
+
+
+def _filas(conexion, modelo, clinica):
+    # yield_per usa un cursor del lado del servidor en PostgreSQL y lee por lotes
+    consulta = select(modelo.__table__).where(modelo.id_clinica == clinica).order_by(*modelo.__table__.primary_key)
+    return conexion.execution_options(yield_per=EXPORTACION_LOTE).execute(consulta)
+
+
+def _recursos(conexion, clinica, tipos):
+    # Genera (tipo, recurso) en orden: pacientes, consultas, medidas y expedientes.
+    # Los ids son los mismos que usa el outbox y la lectura FHIR
+    if "Patient" in tipos:
+        for p in _filas(conexion, Paciente, clinica):
+            yield "Patient", paciente_a_fhir(p, id_fhir(clinica, p.id_paciente))
+    if "Observation" in tipos:
+        for c in _filas(conexion, Consulta, clinica):
+            yield "Observation", consulta_a_fhir(c, id_fhir(clinica, "consulta", c.id_consulta), id_fhir(clinica, c.id_paciente))
+        for m in _filas(conexion, MedidasMusculos, clinica):
+            yield "Observation", medidas_musculos_a_fhir(m, id_fhir(clinica, "musculos", m.id_musculos), id_fhir(clinica, m.id_paciente))
+        for h in _filas(conexion, MedidasHuesos, clinica):
+            yield "Observation", medidas_huesos_a_fhir(h, id_fhir(clinica, "huesos", h.id_huesos), id_fhir(clinica, h.id_paciente))
+    if tipos & {"Observation", "Condition", "Procedure", "MedicationStatement"}:
+        for e in _filas(conexion, Expediente, clinica):
+            try:
+                datos = json.loads(e.datos or "{}")
+            except ValueError:
+                logger.warning("El expediente %s no tiene JSON válido; no se exporta", e.id_expediente)
+                continue
+            bundle = construir_bundle_expediente(datos, id_fhir(clinica, e.id_paciente))
+            for i, entrada in enumerate(bundle.entry):
+                tipo = entrada["request"]["url"]
+                if tipo in tipos:
+                    yield tipo, {**json.loads(entrada["resource"].json()), "id": id_fhir(clinica, "exp", e.id_expediente, i)}
+
+
+def _ejecutar(id_exportacion, estado):
+    carpeta = _carpeta(id_exportacion)
+    archivos = {}
+    conteos = {}
+    try:
+        with motor_de_clinica(estado["clinica"]).connect() as conexion:
+            for n, (tipo, recurso) in enumerate(_recursos(conexion, estado["clinica"], set(estado["tipos"])), 1):
+                archivo = archivos.get(tipo)
+                if archivo is None:
+                    archivo = archivos[tipo] = open(ruta_archivo(id_exportacion, tipo), "w", encoding="utf-8")
+                    conteos[tipo] = 0
+                archivo.write((recurso.json() if hasattr(recurso, "json") else json.dumps(recurso)) + "\n")
+                conteos[tipo] += 1
+                if n % EXPORTACION_LOTE == 0:
+                    if os.path.exists(os.path.join(carpeta, "cancelado")):
+                        raise ExportacionCancelada()
+                    estado["progreso"] = f"{n} recursos escritos"
+                    _guardar_estado(id_exportacion, estado)
+    except ExportacionCancelada:
+        shutil.rmtree(carpeta, ignore_errors=True)
+        return
+    except Exception as e:
+        logger.exception("Falló la exportación %s", id_exportacion)
+        estado.update(estado="error", error=f"{type(e).__name__}: {e}")
+        _guardar_estado(id_exportacion, estado)
+        return
+    finally:
+        for archivo in archivos.values():
+            archivo.close()
+    estado.update(
+        estado="completo",
+        progreso="completo",
+        salida=[{"type": tipo, "count": conteos[tipo]} for tipo in sorted(conteos)],
+    )
+    _guardar_estado(id_exportacion, estado)
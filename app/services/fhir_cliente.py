@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+
+import requests
+
+from services import metricas, trazas
+
+FHIR_SERVER_URL = os.getenv("FHIR_SERVER_URL", "http://localhost:8080/fhir")
+FHIR_TIMEOUT_CONEXION = float(os.getenv("FHIR_TIMEOUT_CONEXION", "3"))
+FHIR_TIMEOUT_LECTURA = float(os.getenv("FHIR_TIMEOUT_LECTURA", "30"))
+# Aislamiento: como máximo FHIR_MAX_CONCURRENTES llamadas a la vez; las demás
+# esperan un cupo hasta FHIR_ESPERA_CUPO segundos y luego fallan, para que un
+# servidor lento no acapare los hilos que también usan las rutas del CRUD
+FHIR_MAX_CONCURRENTES = int(os.getenv("FHIR_MAX_CONCURRENTES", "8"))
+FHIR_ESPERA_CUPO = float(os.getenv("FHIR_ESPERA_CUPO", "0.5"))
+# Interruptor: tras FHIR_FALLOS_PARA_ABRIR fallos seguidos se deja de llamar al
+# servidor durante FHIR_SEGUNDOS_ABIERTO; después se deja pasar una sola
+# llamada de prueba que decide si se vuelve a cerrar
+FHIR_FALLOS_PARA_ABRIR = int(os.getenv("FHIR_FALLOS_PARA_ABRIR", "5"))
+FHIR_SEGUNDOS_ABIERTO = float(os.getenv("FHIR_SEGUNDOS_ABIERTO", "30"))
+
+
+class FhirNoDisponible(Exception):
+    def __init__(self, motivo, reintentar_en=None):
+        super().__init__(f"El servidor FHIR no está disponible ({motivo})")
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+
+class Interruptor:
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, fallos_para_abrir=FHIR_FALLOS_PARA_ABRIR, segundos_abierto=FHIR_SEGUNDOS_ABIERTO):
+        self.fallos_para_abrir = fallos_para_abrir
+        self.segundos_abierto = segundos_abierto
+        self._lock = threading.Lock()
+        self.estado = self.CERRADO
+        self.fallos_seguidos = 0
+        self.aperturas = 0
+        self._abierto_en = None
+        self._prueba_en_curso = False
+
+    def permitir(self):
+        # Devuelve True si la llamada es la prueba del circuito semiabierto
+        with self._lock:
+            if self.estado == self.ABIERTO:
+                restante = self.segundos_abierto - (time.monotonic() - self._abierto_en)
+                if restante > 0:
+                    raise FhirNoDisponible("circuito abierto", restante)
+                self.estado = self.SEMIABIERTO
+            if self.estado == self.SEMIABIERTO:
+                if self._prueba_en_curso:
+                    raise FhirNoDisponible("circuito a prueba", self.segundos_abierto)
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def exito(self, prueba: bool = False):
+        with self._lock:
+            # Una llamada que empezó antes de abrirse el circuito no lo cierra;
+            # solo la prueba decide
+            if self.estado != self.CERRADO and not prueba:
+                return
+            self.estado = self.CERRADO
+            self.fallos_seguidos = 0
+
+    def terminar_prueba(self):
+        # Se llama siempre al terminar la prueba, aunque falle con una excepción
+        # que no sea de red; si no, el circuito rechazaría todo para siempre
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos_seguidos += 1
+            if self.estado == self.SEMIABIERTO or self.fallos_seguidos >= self.fallos_para_abrir:
+                if self.estado != self.ABIERTO:
+                    self.aperturas += 1
+                self.estado = self.ABIERTO
+                self._abierto_en = time.monotonic()
+
+    def a_dict(self):
+        with self._lock:
+            restante = None
+            if self.estado == self.ABIERTO:
+                restante = round(max(0.0, self.segundos_abierto - (time.monotonic() - self._abierto_en)), 1)
+            return {
+                "estado": self.estado,
+                "fallos_seguidos": self.fallos_seguidos,
+                "fallos_para_abrir": self.fallos_para_abrir,
+                "aperturas": self.aperturas,
+                "segundos_para_prueba": restante,
+            }
+
+
+class Compartimento:
+    def __init__(self, maximo=FHIR_MAX_CONCURRENTES, espera=FHIR_ESPERA_CUPO):
+        self.maximo = maximo
+        self.espera = espera
+        self._cupos = threading.BoundedSemaphore(maximo)
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.rechazadas = 0
+
+    def entrar(self):
+        if not self._cupos.acquire(timeout=self.espera):
+            with self._lock:
+                self.rechazadas += 1
+            raise FhirNoDisponible("sin cupo para más llamadas", self.espera)
+        with self._lock:
+            self.en_curso += 1
+
+    def salir(self):
+        with self._lock:
+            self.en_curso -= 1
+        self._cupos.release()
+
+    def a_dict(self):
+        with self._lock:
+            return {"maximo": self.maximo, "en_curso": self.en_curso, "rechazadas": self.rechazadas}
+
+
+interruptor = Interruptor()
+compartimento = Compartimento()
+
+
+def estado():
+    return {"url": FHIR_SERVER_URL, "interruptor": interruptor.a_dict(), "concurrencia": compartimento.a_dict()}
+
+
+def solicitar(metodo: str, ruta: str = "", **kwargs):
+    # Todas las llamadas al servidor FHIR pasan por aquí para medir su duración,
+    # propagar la traza de la petición y protegerse de un servidor caído o lento
+    url = f"{FHIR_SERVER_URL}/{ruta}" if ruta else FHIR_SERVER_URL
+    recurso = ruta.split("/", 1)[0].split("?", 1)[0] or "transaccion"
+    kwargs.setdefault("timeout", (FHIR_TIMEOUT_CONEXION, FHIR_TIMEOUT_LECTURA))
+    try:
+        compartimento.entrar()
+    except FhirNoDisponible as e:
+        metricas.fhir_rechazos.incrementar(motivo=e.motivo)
+        raise
+    try:
+        try:
+            prueba = interruptor.permitir()
+        except FhirNoDisponible as e:
+            metricas.fhir_rechazos.incrementar(motivo=e.motivo)
+            raise
+        try:
+            return _llamar(metodo, url, recurso, prueba, **kwargs)
+        finally:
+            if prueba:
+                interruptor.terminar_prueba()
+    finally:
+        compartimento.salir()
+
+
+def _llamar(metodo, url, recurso, prueba, **kwargs):
+    estado = "error"
+    inicio = time.perf_counter()
+    with trazas.span(f"FHIR {metodo} {recurso}", "cliente", {"http.method": metodo, "http.url": url}) as span:
+        if span is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "traceparent": span.traceparent()}
+        try:
+            respuesta = requests.request(metodo, url, **kwargs)
+            estado = str(respuesta.status_code)
+        except requests.RequestException:
+            interruptor.fallo()
+            raise
+        finally:
+            metricas.fhir_duracion.observar(time.perf_counter() - inicio, metodo=metodo, recurso=recurso, estado=estado)
+        # Los 4xx son errores de la petición, no del servidor
+        if respuesta.status_code >= 500:
+            interruptor.fallo()
+        else:
+            interruptor.exito(prueba)
+        if span is not None:
+            span.atributos["http.status_code"] = respuesta.status_code
+        return respuesta
+
+
+def get(ruta: str = "", **kwargs):
+    return solicitar("GET", ruta, **kwargs)
+
+
+def post(ruta: str = "", **kwargs):
+    return solicitar("POST", ruta, **kwargs)
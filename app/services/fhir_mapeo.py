@@ -0,0 +1,671 @@
+from fhir.resources.bundle import Bundle
+from fhir.resources.observation import Observation
+from fhir.resources.condition import Condition
+from fhir.resources.procedure import Procedure
+from fhir.resources.medicationstatement import MedicationStatement
+from fhir.resources.codeableconcept import CodeableConcept
+from fhir.resources.reference import Reference
+from fhir.resources.patient import Patient
+from fhir.resources.humanname import HumanName
+from fhir.resources.contactpoint import ContactPoint
+from services.trazas import trazado
+
+GENEROS_FHIR = {
+    'M': 'male',
+    'F': 'female',
+}
+
+# Signos de la consulta como componentes de una Observation; el código LOINC
+# solo se pone donde corresponde sin ambigüedad
+CAMPOS_CONSULTA = [
+    ("pesoafuera", "Peso (afuera)", "29463-7", "kg", "kg"),
+    ("pesoadentro", "Peso (adentro)", "29463-7", "kg", "kg"),
+    ("tallaafuera", "Talla (afuera)", None, None, None),
+    ("tallaadentro", "Talla (adentro)", None, None, None),
+    ("tallasentado", "Talla sentado", None, None, None),
+    ("frecuencia_cardiaca", "Frecuencia cardiaca", "8867-4", "/min", "/min"),
+    ("nivel_oxigeno", "Saturación de oxígeno", "59408-5", "%", "%"),
+    ("temperatura", "Temperatura corporal", "8310-5", "°C", "Cel"),
+]
+
+# Medidas antropométricas, una Observation por registro
+CAMPOS_MUSCULOS = [
+    ("bicep", "Bíceps"),
+    ("tricep", "Tríceps"),
+    ("subescapular", "Subescapular"),
+    ("supriliaco", "Suprailiaco"),
+    ("bicep_relajado", "Bíceps relajado"),
+    ("bicep_contraido", "Bíceps contraído"),
+    ("antebrazo", "Antebrazo"),
+    ("abdomen", "Abdomen"),
+    ("muslo", "Muslo"),
+    ("gemelo", "Gemelo"),
+    ("torax", "Tórax"),
+    ("gluteo", "Glúteo"),
+]
+CAMPOS_HUESOS = [
+    ("biacromial", "Biacromial"),
+    ("bitrocanter", "Bitrocantéreo"),
+    ("biliaco", "Biiliaco"),
+    ("torax", "Tórax"),
+    ("humero", "Húmero"),
+    ("carpo", "Carpo"),
+    ("femur", "Fémur"),
+    ("tobillo", "Tobillo"),
+]
+
+
+def id_fhir(clinica: str, *partes):
+    # Ids estables para PUT en el servidor FHIR; los ids FHIR no admiten "_"
+    return "-".join([clinica.replace("_", "-"), *(str(p) for p in partes)])
+
+
+def paciente_a_fhir(db_paciente, id_patient: str):
+    return Patient.construct(
+        id=id_patient,
+        name=[HumanName.construct(given=[db_paciente.nombre])],
+        telecom=(
+            [ContactPoint.construct(system="phone", value=db_paciente.telefono, use="mobile")]
+            if db_paciente.telefono
+            else None
+        ),
+        gender=GENEROS_FHIR.get(db_paciente.genero, 'unknown'),
+        extension=(
+            [{"url": "http://example.org/fhir/StructureDefinition/occupation", "valueString": db_paciente.ocupacion}]
+            if db_paciente.ocupacion
+            else None
+        ),
+        birthDate = db_paciente.fecha_nacimiento
+    )
+
+
+def _componente(texto, loinc, valor, unidad, codigo_unidad):
+    cantidad = {"value": valor}
+    if unidad:
+        cantidad.update(unit=unidad, system="http://unitsofmeasure.org", code=codigo_unidad)
+    codigo = {"text": texto}
+    if loinc:
+        codigo["coding"] = [{"system": "http://loinc.org", "code": loinc}]
+    return {"code": codigo, "valueQuantity": cantidad}
+
+
+def _observacion(id_observacion, id_patient, texto, categoria, fecha, componentes):
+    return Observation.construct(
+        id=id_observacion,
+        status="final",
+        category=[{"coding": [{
+            "system": "http://terminology.hl7.org/CodeSystem/observation-category", "code": categoria,
+        }]}],
+        code=CodeableConcept.construct(text=texto),
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        effectiveDateTime=fecha.isoformat() if fecha else None,
+        component=componentes,
+    )
+
+
+def consulta_a_fhir(consulta, id_observacion: str, id_patient: str):
+    return _observacion(id_observacion, id_patient, "Consulta nutricional", "vital-signs", consulta.fecha, [
+        _componente(texto, loinc, getattr(consulta, campo), unidad, codigo_unidad)
+        for campo, texto, loinc, unidad, codigo_unidad in CAMPOS_CONSULTA
+        if getattr(consulta, campo) is not None
+    ])
+
+
+def _medidas_a_fhir(registro, campos, texto, id_observacion, id_patient):
+    # Las medidas se guardan sin unidad, así que se envían sin ella
+    return _observacion(id_observacion, id_patient, texto, "exam", registro.fecha, [
+        _componente(etiqueta, None, getattr(registro, campo), None, None)
+        for campo, etiqueta in campos
+        if getattr(registro, campo) is not None
+    ])
+
+
+def medidas_musculos_a_fhir(medidas, id_observacion: str, id_patient: str):
+    return _medidas_a_fhir(medidas, CAMPOS_MUSCULOS, "Medidas musculares", id_observacion, id_patient)
+
+
+def medidas_huesos_a_fhir(medidas, id_observacion: str, id_patient: str):
+    return _medidas_a_fhir(medidas, CAMPOS_HUESOS, "Medidas óseas", id_observacion, id_patient)
+
+
+@trazado("fhir.construir_bundle_expediente")
+def construir_bundle_expediente(datos: dict, id_patient: str):
+    # Arma el Bundle de transacción con los antecedentes del expediente (`datos`
+    # ya decodificado) para el Patient `id_patient` del servidor FHIR
+    antecedentes_medicos = datos.get("antecedentesMedicos", {}) 
+    motivo = antecedentes_medicos.get("motivo")
+    saludActual = antecedentes_medicos.get("saludActual")
+    
+    antecedentes_patologicos = datos.get("antecedentesPatologicos", {})
+    enfermedadesInfecciosas = antecedentes_patologicos.get("enfermedadesInfecciosas", [])
+    texto_enfermedadesInfecciosas = ", ".join(enfermedadesInfecciosas)
+    otrosInfecciosos = antecedentes_patologicos.get("otrosInfecciosos")
+    
+    enfermedadesCronicas = antecedentes_patologicos.get("enfermedadesCronicas", [])
+    texto_enfermedadesCronicas = ", ".join(enfermedadesCronicas)
+    otrosCronicos = antecedentes_patologicos.get("otrosCronicos") 
+    
+    consumoSustancias = antecedentes_patologicos.get("consumo", [])
+    texto_consumoSustancias = ", ".join(consumoSustancias)
+    otrosConsumos = antecedentes_patologicos.get("otroConsumo")
+    
+    alergias = antecedentes_patologicos.get("alergias")
+    
+    cirugias = antecedentes_patologicos.get("cirugias")
+        
+    antecedentesObstetricos = datos.get("antecedentesObstetricos", {})
+    opcionesObstetricos = antecedentesObstetricos.get("opciones",[])
+    texto_opcionesObstetricos = ", ".join(opcionesObstetricos) 
+    
+    periodosMenstruales = antecedentesObstetricos.get("periodosMenstruales") 
+    
+    usoAnticonceptivos = antecedentesObstetricos.get("anticonceptivos") 
+    
+    nombreAnticonceptivos = antecedentesObstetricos.get("cuales") 
+    
+    tiempoUso = antecedentesObstetricos.get("tiempoUso") 
+    
+    condicionClimaterio = antecedentesObstetricos.get("climaterio") 
+    
+    tratamientoTipo = datos.get("tratamiento", {})
+    opcionesTratamiento = tratamientoTipo.get("opciones", [])
+    texto_opcionesTratamiento = ", ".join(opcionesTratamiento)
+    otrosTratamientos = tratamientoTipo.get("otros")
+    alopatas = tratamientoTipo.get("alopatas")
+    
+    farmacosNutricion = datos.get("farmacosNutricion", {})
+    cambiosApetito = farmacosNutricion.get("cambiosApetito")
+    bocaSeca = farmacosNutricion.get("bocaSeca")
+    nauseas = farmacosNutricion.get("nauseas")
+    hiperglucemia = farmacosNutricion.get("hiperglucemia")
+    
+    sintomasActuales = datos.get("sintomasActuales", {})
+    opcionesSintomas = sintomasActuales.get("opciones", [])
+    texto_opcionesSintomas = ", ".join(opcionesSintomas)
+    
+    problemasNutricion = datos.get("problemasNutricion", {})
+    dietas = problemasNutricion.get("dietas")
+    trastornos = problemasNutricion.get("transtornos")
+    
+    estiloVida = datos.get("estiloVida", {})
+    actividadFisica = estiloVida.get("actividadFisica")
+    ejercicio = estiloVida.get("ejercicio", {})
+    tipoEjercicio = ejercicio.get("tipo")
+    frecuenciaEjercicio = ejercicio.get("frecuencia")
+
+    indicadoresDieteticos = estiloVida.get("indicadoresDieteticos", {})
+    comidasDia = indicadoresDieteticos.get("comidasDia")
+    preparacionComidas = indicadoresDieteticos.get("preparacionComidas")
+    
+    apetito = estiloVida.get("apetito", {})
+    tipoApetito = apetito.get("tipo")
+
+    controlPeso = apetito.get("controlPeso", {})
+    opcionControlPeso = controlPeso.get("opcion")
+    razonTratamiento = controlPeso.get("razon")
+    resultados = controlPeso.get("resultados")
+    medicamentos = controlPeso.get("medicamentos")
+    nombreMedicamentos = controlPeso.get("cuales")
+    cambioPeso = controlPeso.get("cambioPeso")
+    cirugiaPeso = controlPeso.get("cirugiaPeso")
+    consumoAgua = controlPeso.get("consumoAgua")
+        
+    # print(f"Motivo: {motivo}")
+    # print(f"Salud Actual: {saludActual}")
+    # print(f"Enfermedades Infecciosas:{enfermedadesInfecciosas}")
+    # print(f"Otros Infecciosos: {otrosInfecciosos}")
+    # print(f"Enfermedades Crónicas:{enfermedadesCronicas}")
+    # print(f"Otros Crónicos: {otrosCronicos}")
+    # print(f"Consumo: {consumoSustancias}")
+    # print(f"Otras sustancias: {otrosConsumos}")
+    # print(f"Alergías: {alergias}")
+    # print(f"Cirugías: {cirugias}")
+    # print(f"Obstetricos: {opcionesObstetricos}") 
+    # print(f"Periodos: {periodosMenstruales}") 
+    # print(f"Anticonceptivos: {usoAnticonceptivos}") 
+    # print(f"Cuales: {nombreAnticonceptivos}") 
+    # print(f"Tiempo de uso: {tiempoUso}") 
+    # print(f"Climaterio: {condicionClimaterio}")
+    # print(f"Tratamiento: {opcionesTratamiento}")
+    # print(f"Otros tratamientos: {otrosTratamientos}")
+    # print(f"Alopatas: {alopatas}")
+    # print(f"Cambios en el apetito: {cambiosApetito}")
+    # print(f"Boca seca: {bocaSeca}")
+    # print(f"Nauseas: {nauseas}")
+    # print(f"Hiperglucemia: {hiperglucemia}")
+    # print(f"Sintomas actuales (opciones): {opcionesSintomas}")
+    # print(f"Dietas: {dietas}")
+    # print(f"Trastornos: {trastornos}")
+    # print(f"Actividad fisica: {actividadFisica}")
+    # print(f"Tipo: {tipoEjercicio}")
+    # print(f"Frecuencia: {frecuenciaEjercicio}")
+    # print(f"Comidas al día: {comidasDia}")
+    # print(f"Quien prepara la comida: {preparacionComidas}")
+    # print(f"Tipo de apetito: {tipoApetito}")
+    # print(f"Tratamiento de control de peso: {opcionControlPeso}")
+    # print(f"Razon del tratamiento: {razonTratamiento}")
+    # print(f"Resultados esperados del tratamiento: {resultados}")
+    # print(f"Uso de medicamentos para bajar de peso: {medicamentos}")
+    # print(f"Nombre de los medicamentos: {nombreMedicamentos}")
+    # print(f"Cambio de peso: {cambioPeso}")
+    # print(f"Cirugia para perder peso: {cirugiaPeso}")
+    # print(f"Consumo de agua: {consumoAgua}") 
+
+    #Recursos
+    motivo_consulta = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Motivo de consulta: {motivo}"),
+    )
+
+    salud_actual = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Salud actual: {saludActual}")
+    )
+
+    enfermedades_infecciosas = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Enfermedades infeccionas: {texto_enfermedadesInfecciosas}"),
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    otros_infecciosos = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Otras enfermedades infecciosas: {otrosInfecciosos}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    enfermedades_cronicas = Condition.construct(
+         code=CodeableConcept.construct(
+            text=(f"Enfermedades crónicas: {texto_enfermedadesCronicas}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    otros_cronicos = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Otras enfermedades crónicas: {otrosCronicos}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    consumo_sustancias = Condition.construct( ###CAMBIAR A OBSERVATION
+        code=CodeableConcept.construct(
+            text=(f"Consumo de sustancias: {texto_consumoSustancias}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    otros_consumos = Condition.construct( ###CAMBIAR A OBSERVATION
+        code = CodeableConcept.construct(
+            text=(f"Otras sustancias: {otrosConsumos}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    alergias_resource = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Alergias: {alergias}"),
+    )
+    
+    cirugias_resource = Procedure.construct(
+        status="completed",
+        code=CodeableConcept.construct(
+        text=(f"Cirugías: {cirugias}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        reportedBoolean=True,
+    )
+    
+    gineco_obstetricos = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Antecedentes gineco-obstétricos: {texto_opcionesObstetricos}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    periodos_menstruales = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Períodos menstruales: {periodosMenstruales}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    uso_anticonceptivos = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Uso de anticonceptivos: {usoAnticonceptivos}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    nombre_anticonceptivos = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"¿Cuáles anticonceptivos?: {nombreAnticonceptivos}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    tiempo_uso = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Tiempo usando anticonceptivos: {tiempoUso}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    climaterio = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Climaterio: {condicionClimaterio}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    tratamiento = MedicationStatement.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        dosage=[
+            {
+                "text": (f"Tratamiento: {texto_opcionesTratamiento}")
+            }
+        ]
+    )
+            
+    otros_tratamientos = MedicationStatement.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        dosage=[
+            {
+                "text": (f"Otros tratamientos: {otrosTratamientos}")
+            }
+        ]
+    )
+    
+    tratamientos_alopatas = MedicationStatement.construct(
+       subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        dosage=[
+            {
+                "text": (f"Medicamentos alópatas: {alopatas}")
+            }
+        ]
+    )
+         
+    cambios_apetito = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Cambios en el apetito: {cambiosApetito}"),
+    )
+    
+    boca_seca = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Boca seca: {bocaSeca}"),
+    )
+    
+    efecto_nauseas = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Nauseas: {nauseas}"),
+    )
+    
+    efecto_hiperglucemia = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Hiperglucemia: {hiperglucemia}"),
+    )
+    
+    sintomas_actuales = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Síntomas actuales: {texto_opcionesSintomas}"),
+    )
+    
+    nutricion_dietas = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Dietas o tratamientos realizados anteriormente: {dietas}"),
+    )
+    
+    nutricion_trastornos = Condition.construct(
+        code=CodeableConcept.construct(
+            text=(f"Trastornos de alimentación: {trastornos}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}")
+    )
+    
+    actividad_fisica = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Actividad fisica: {actividadFisica}"),
+    )
+    
+    tipo_ejercicio = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Tipo de ejercicio: {tipoEjercicio}"),
+    )
+    
+    frecuencia_ejercicio = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Frecuencia de ejercicio: {frecuenciaEjercicio}"),
+    )
+    
+    comidas_dia = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"¿Cuántas comidas hace al día?: {comidasDia}"),
+    )
+    
+    preparacion_comidas = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"¿Quién prepara sus alimentos?: {preparacionComidas}"),
+    )
+    
+    tipo_apetito = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Apetito: {tipoApetito}"),
+    )
+    
+    control_peso = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"¿Ha llevado un tratamiento para control de peso?: {opcionControlPeso}"),
+    )
+    
+    razon_tratamiento = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Razón del tratamiendo de control de peso: {razonTratamiento}"),
+    )
+    
+    resultados_tratamiento = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"¿Obtuvo los resultados esperados del control de peso?: {resultados}"),
+    )
+    
+    medicamentos_peso = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"¿Ha utilizado medicamentos para bajar de peso?: {medicamentos}"),
+    )
+    
+    nombre_medicamentos = MedicationStatement.construct(
+       subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        dosage=[
+            {
+                "text": (f"Nombre de medicamentos para bajar de peso: {nombreMedicamentos}")
+            }
+        ]
+    )
+    
+    cambio_peso = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"¿Cómo ha fluctuado su peso a lo largo de su vida?: {cambioPeso}"),
+    )
+    
+    cirugia_peso = Procedure.construct(
+        status="completed",
+        code=CodeableConcept.construct(
+        text=(f"¿Se ha sometido a alguna cirugía para perder peso?: {cirugiaPeso}")
+        ),
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        reportedBoolean=True,
+    )
+    
+    consumo_agua = Observation.construct(
+        subject=Reference.construct(reference=f"Patient/{id_patient}"),
+        valueString=(f"Consumo regular de agua simple al día: {consumoAgua}"),
+    )
+    
+    bundle = Bundle.construct(
+        type="transaction",
+        entry=[
+            {
+                "resource": motivo_consulta,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": salud_actual,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": enfermedades_infecciosas,
+                "request": {"method": "POST", "url": "Condition"}
+             },
+            {
+                "resource": otros_infecciosos,
+                "request": {"method": "POST", "url": "Condition"}  
+            },
+            {
+                "resource": enfermedades_cronicas,
+                "request": {"method": "POST", "url": "Condition"}
+             },
+            {
+                "resource": otros_cronicos,
+                "request": {"method": "POST", "url": "Condition"}  
+            },
+            {
+                "resource": consumo_sustancias,
+                "request": {"method": "POST", "url": "Condition"}  
+            },
+            {
+                "resource": otros_consumos,
+                "request": {"method": "POST", "url": "Condition"}  
+            },
+            {
+                "resource": alergias_resource,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": cirugias_resource,
+                "request": {"method": "POST", "url": "Procedure"}
+            },
+            {
+                "resource": gineco_obstetricos,
+                "request": {"method": "POST", "url": "Condition"}
+            },
+            {
+                "resource": periodos_menstruales,
+                "request": {"method": "POST", "url": "Condition"}
+            },
+            {
+                "resource": uso_anticonceptivos,
+                "request": {"method": "POST", "url": "Condition"}
+            },
+            {
+                "resource": nombre_anticonceptivos,
+                "request": {"method": "POST", "url": "Condition"}
+            },
+            {
+                "resource": tiempo_uso,
+                "request": {"method": "POST", "url": "Condition"}
+            },
+            {
+                "resource": climaterio,
+                "request": {"method": "POST", "url": "Condition"}
+            },
+            {
+                "resource": tratamiento,
+                "request": {"method": "POST", "url": "MedicationStatement"}
+            },
+            {
+                "resource": otros_tratamientos,
+                "request": {"method": "POST", "url": "MedicationStatement"}
+            },
+            {
+                "resource": tratamientos_alopatas,
+                "request": {"method": "POST", "url": "MedicationStatement"}
+            },
+            {
+                "resource": cambios_apetito,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": boca_seca,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": efecto_nauseas,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": efecto_hiperglucemia,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": sintomas_actuales,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": nutricion_dietas,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": nutricion_trastornos,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": actividad_fisica,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": tipo_ejercicio,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": frecuencia_ejercicio,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": comidas_dia,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": preparacion_comidas,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": tipo_apetito,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": control_peso,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": razon_tratamiento,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": resultados_tratamiento,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": medicamentos_peso,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": nombre_medicamentos,
+                "request": {"method": "POST", "url": "MedicationStatement"}
+            },
+            {
+                "resource": cambio_peso,
+                "request": {"method": "POST", "url": "Observation"}
+            },
+            {
+                "resource": cirugia_peso,
+                "request": {"method": "POST", "url": "Procedure"}
+            },
+            {
+                "resource": consumo_agua,
+                "request": {"method": "POST", "url": "Observation"}
+            }
+        ],
+    )
+
+    return bundle
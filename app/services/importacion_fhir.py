@@ -0,0 +1,372 @@
+import argparse
+import codecs
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date
+
+from config.database import CLINICA_PREDETERMINADA, SessionLocal
+from crud.importacion_crud import asegurar_particiones, insertar_medidas, insertar_pacientes
+from services.fhir_mapeo import CAMPOS_CONSULTA, CAMPOS_HUESOS, CAMPOS_MUSCULOS
+
+logger = logging.getLogger(__name__)
+
+# Importación de Patients y Observations desde un Bundle FHIR o NDJSON. El
+# Bundle se lee por bloques y cada elemento de "entry" se procesa en cuanto
+# está completo, sin cargar el documento entero. Las filas se insertan por
+# lotes, cada lote en su propia transacción.
+#
+#   cd app
+#   python -m services.importacion_fhir pacientes.json --clinica norte
+IMPORTACION_LOTE = int(os.getenv("IMPORTACION_LOTE", "500"))
+TAM_BLOQUE = 64 * 1024
+MAX_RECHAZOS_REPORTADOS = 100
+
+GENEROS_LOCALES = {"male": "M", "female": "F"}
+
+# Códigos LOINC de los signos que se guardan en la consulta
+LOINC_CONSULTA = {
+    "29463-7": "pesoafuera",
+    "8302-2": "tallaafuera",
+    "8867-4": "frecuencia_cardiaca",
+    "59408-5": "nivel_oxigeno",
+    "2708-6": "nivel_oxigeno",
+    "8310-5": "temperatura",
+}
+# Las Observations que genera esta API se reconocen por el texto de cada componente
+TEXTOS_CONSULTA = {texto: campo for campo, texto, *_ in CAMPOS_CONSULTA}
+TEXTOS_MUSCULOS = {texto: campo for campo, texto in CAMPOS_MUSCULOS}
+TEXTOS_HUESOS = {texto: campo for campo, texto in CAMPOS_HUESOS}
+CAMPOS_ENTEROS = {"frecuencia_cardiaca", "nivel_oxigeno", *(campo for campo, _ in CAMPOS_HUESOS)}
+
+# Conversión de las unidades UCUM más comunes a metros, kg y °C; una medida
+# con otra unidad se rechaza
+TALLA = {
+    "m": lambda v: v,
+    "cm": lambda v: v / 100,
+    "mm": lambda v: v / 1000,
+    "[in_i]": lambda v: v * 0.0254,
+}
+PESO = {
+    "kg": lambda v: v,
+    "g": lambda v: v / 1000,
+    "[lb_av]": lambda v: v * 0.45359237,
+}
+TEMPERATURA = {
+    "Cel": lambda v: v,
+    "[degF]": lambda v: (v - 32) * 5 / 9,
+}
+UNIDADES = {
+    "tallaafuera": ("talla", TALLA),
+    "tallaadentro": ("talla", TALLA),
+    "tallasentado": ("talla", TALLA),
+    "pesoafuera": ("peso", PESO),
+    "pesoadentro": ("peso", PESO),
+    "temperatura": ("temperatura", TEMPERATURA),
+}
+
+
+class JsonIncompleto(ValueError):
+    pass
+
+
+class LectorJson:
+    # Lee un documento JSON por bloques; valor() decodifica el siguiente valor
+    # completo y pide más texto solo si el que hay no alcanza
+    def __init__(self, archivo, tam_bloque=TAM_BLOQUE):
+        self.archivo = archivo
+        self.tam_bloque = tam_bloque
+        self.texto = ""
+        self.pos = 0
+        self.fin_archivo = False
+        self._decodificador = json.JSONDecoder()
+
+    def _leer(self, minimo):
+        if self.pos > self.tam_bloque:
+            self.texto = self.texto[self.pos:]
+            self.pos = 0
+        bloque = self.archivo.read(max(minimo, self.tam_bloque))
+        if not bloque:
+            self.fin_archivo = True
+        self.texto += bloque
+
+    def caracter(self):
+        while True:
+            while self.pos < len(self.texto) and self.texto[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.texto) or self.fin_archivo:
+                return self.texto[self.pos:self.pos + 1]
+            self._leer(self.tam_bloque)
+
+    def esperar(self, c):
+        if self.caracter() != c:
+            raise ValueError(f"JSON inválido cerca de la posición {self.pos}: se esperaba {c!r}")
+        self.pos += 1
+
+    def consumir_si(self, c):
+        if self.caracter() == c:
+            self.pos += 1
+            return True
+        return False
+
+    def valor(self):
+        self.caracter()
+        necesario = self.tam_bloque
+        while True:
+            try:
+                valor, fin = self._decodificador.raw_decode(self.texto, self.pos)
+                # Un número al final del bloque podría seguir en el siguiente
+                if fin < len(self.texto) or self.fin_archivo:
+                    self.pos = fin
+                    return valor
+            except json.JSONDecodeError:
+                if self.fin_archivo:
+                    raise JsonIncompleto(f"JSON inválido o incompleto cerca de la posición {self.pos}")
+            # Cada intento lee el doble para no volver a decodificar muchas veces un valor grande
+            self._leer(necesario)
+            necesario *= 2
+
+
+def entradas_bundle(archivo):
+    # Entrega cada elemento de "entry" del Bundle; las demás claves se descartan
+    lector = LectorJson(archivo)
+    lector.esperar("{")
+    if lector.consumir_si("}"):
+        return
+    while True:
+        clave = lector.valor()
+        lector.esperar(":")
+        if clave == "entry":
+            lector.esperar("[")
+            if not lector.consumir_si("]"):
+                while True:
+                    yield lector.valor()
+                    if lector.consumir_si("]"):
+                        break
+                    lector.esperar(",")
+        else:
+            lector.valor()
+        if lector.consumir_si("}"):
+            return
+        lector.esperar(",")
+
+
+def recursos(archivo, formato: str):
+    # Genera (número, entrada) con entrada = {"fullUrl"?, "resource"}; las líneas
+    # NDJSON que no son JSON válido se entregan como ValueError
+    if formato == "ndjson":
+        for numero, linea in enumerate(archivo, 1):
+            if not linea.strip():
+                continue
+            try:
+                yield numero, {"resource": json.loads(linea)}
+            except ValueError as e:
+                yield numero, ValueError(f"Línea que no es JSON: {e}")
+    else:
+        yield from enumerate(entradas_bundle(archivo), 1)
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor[:10]) if isinstance(valor, str) and len(valor) >= 10 else None
+    except ValueError:
+        return None
+
+
+def paciente_de_fhir(recurso: dict):
+    nombres = recurso.get("name") or []
+    nombre = None
+    if nombres:
+        nombre = nombres[0].get("text") or " ".join([*nombres[0].get("given", []), nombres[0].get("family") or ""]).strip()
+    if not nombre:
+        raise ValueError("Patient sin nombre")
+    fecha_nacimiento = _fecha(recurso.get("birthDate"))
+    edad = None
+    if fecha_nacimiento:
+        hoy = date.today()
+        edad = hoy.year - fecha_nacimiento.year - ((hoy.month, hoy.day) < (fecha_nacimiento.month, fecha_nacimiento.day))
+    telefono = next((t.get("value") for t in recurso.get("telecom") or [] if t.get("system") == "phone"), None)
+    ocupacion = next(
+        (e.get("valueString") for e in recurso.get("extension") or [] if str(e.get("url", "")).endswith("/occupation")),
+        None,
+    )
+    return {
+        "nombre": nombre,
+        "edad": edad,
+        "telefono": telefono,
+        "genero": GENEROS_LOCALES.get(recurso.get("gender")),
+        "fecha_nacimiento": fecha_nacimiento,
+        "ocupacion": ocupacion,
+    }
+
+
+def _valor(cantidad: dict, campo: str, propia: bool = False):
+    # `propia`: el componente se reconoció por el texto que pone esta API; solo
+    # entonces se acepta un valor sin unidad (las tallas se envían así, en metros)
+    valor = cantidad.get("value")
+    if not isinstance(valor, (int, float)):
+        return None
+    if campo in UNIDADES:
+        nombre, conversiones = UNIDADES[campo]
+        codigo = cantidad.get("code") or cantidad.get("unit")
+        if codigo is None and propia:
+            return valor
+        if codigo not in conversiones:
+            raise ValueError(f"Unidad de {nombre} no reconocida: {codigo}")
+        return round(conversiones[codigo](valor), 4)
+    return round(valor) if campo in CAMPOS_ENTEROS else valor
+
+
+def medidas_de_fhir(recurso: dict):
+    # Devuelve (tabla, fecha, valores) de una Observation de signos o medidas
+    fecha = _fecha(recurso.get("effectiveDateTime") or (recurso.get("effectivePeriod") or {}).get("start"))
+    if fecha is None:
+        raise ValueError("Observation sin fecha")
+    texto = (recurso.get("code") or {}).get("text")
+    tabla, textos = {
+        "Medidas musculares": ("medidas_musculos", TEXTOS_MUSCULOS),
+        "Medidas óseas": ("medidas_huesos", TEXTOS_HUESOS),
+    }.get(texto, ("consulta", TEXTOS_CONSULTA))
+
+    valores = {}
+    for parte in [recurso, *(recurso.get("component") or [])]:
+        codigo = parte.get("code") or {}
+        campo = textos.get(codigo.get("text"))
+        propia = campo is not None
+        if campo is None and tabla == "consulta":
+            campo = next(
+                (LOINC_CONSULTA[c.get("code")] for c in codigo.get("coding") or []
+                 if c.get("system") == "http://loinc.org" and c.get("code") in LOINC_CONSULTA),
+                None,
+            )
+        if campo is None or "valueQuantity" not in parte:
+            continue
+        valor = _valor(parte["valueQuantity"], campo, propia)
+        if valor is not None:
+            valores.setdefault(campo, valor)
+    if not valores:
+        raise ValueError("Observation sin signos ni medidas reconocidos")
+    return tabla, fecha, valores
+
+
+def _referencia_paciente(recurso: dict):
+    return ((recurso.get("subject") or {}).get("reference")) or ""
+
+
+class Importacion:
+    def __init__(self, clinica: str, lote: int = IMPORTACION_LOTE):
+        self.clinica = clinica
+        self.lote = lote
+        # Referencias del archivo (Patient/<id> y fullUrl) a ids locales
+        self.pacientes = {}
+        self.conteos = {"pacientes": 0, "consulta": 0, "medidas_musculos": 0, "medidas_huesos": 0}
+        self.entradas = 0
+        self.rechazadas = 0
+        self.rechazos = []
+
+    def rechazar(self, numero, motivo):
+        self.rechazadas += 1
+        if len(self.rechazos) < MAX_RECHAZOS_REPORTADOS:
+            self.rechazos.append({"entrada": numero, "motivo": motivo})
+
+    def ejecutar(self, archivo, formato: str):
+        inicio = time.perf_counter()
+        pendientes = []
+        try:
+            for numero, entrada in recursos(archivo, formato):
+                self.entradas += 1
+                if isinstance(entrada, Exception):
+                    self.rechazar(numero, str(entrada))
+                    continue
+                pendientes.append((numero, entrada))
+                if len(pendientes) >= self.lote:
+                    self._procesar(pendientes)
+                    pendientes = []
+        except ValueError as e:
+            # El documento se corta o no es JSON: lo leído hasta ahí sí se importa
+            self.rechazar(self.entradas + 1, str(e))
+        self._procesar(pendientes)
+        segundos = time.perf_counter() - inicio
+        return {
+            "entradas": self.entradas,
+            "importadas": self.conteos,
+            "rechazadas": self.rechazadas,
+            "rechazos": self.rechazos,
+            "segundos": round(segundos, 3),
+            "entradas_por_segundo": round(self.entradas / segundos, 1) if segundos else None,
+        }
+
+    def _procesar(self, pendientes):
+        if not pendientes:
+            return
+        pacientes, referencias, observaciones = [], [], []
+        for numero, entrada in pendientes:
+            recurso = entrada.get("resource") if isinstance(entrada, dict) else None
+            tipo = recurso.get("resourceType") if isinstance(recurso, dict) else None
+            try:
+                if tipo == "Patient":
+                    pacientes.append(paciente_de_fhir(recurso))
+                    referencias.append([r for r in (f"Patient/{recurso.get('id')}", entrada.get("fullUrl")) if r])
+                elif tipo == "Observation":
+                    observaciones.append((numero, recurso, medidas_de_fhir(recurso)))
+                else:
+                    self.rechazar(numero, f"Tipo de recurso no soportado: {tipo}")
+            except ValueError as e:
+                self.rechazar(numero, str(e))
+
+        db = SessionLocal(info={"clinica": self.clinica})
+        try:
+            for tabla in ("consulta", "medidas_musculos", "medidas_huesos"):
+                asegurar_particiones(db, tabla, (fecha for _, _, (t, fecha, _) in observaciones if t == tabla))
+            ids = insertar_pacientes(db, pacientes)
+            nuevos = {r: id_paciente for id_paciente, refs in zip(ids, referencias) for r in refs}
+            filas = {tabla: {} for tabla in ("consulta", "medidas_musculos", "medidas_huesos")}
+            for numero, recurso, (tabla, fecha, valores) in observaciones:
+                id_paciente = nuevos.get(_referencia_paciente(recurso)) or self.pacientes.get(_referencia_paciente(recurso))
+                if id_paciente is None:
+                    self.rechazar(numero, f"Paciente no importado: {_referencia_paciente(recurso) or 'sin subject'}")
+                    continue
+                # Los signos de un mismo día suelen venir en Observations separadas; se juntan en una fila
+                fila = filas[tabla].setdefault((id_paciente, fecha), {"id_paciente": id_paciente, "fecha": fecha})
+                for campo, valor in valores.items():
+                    fila.setdefault(campo, valor)
+            for tabla, por_dia in filas.items():
+                self.conteos[tabla] += len(insertar_medidas(db, tabla, list(por_dia.values())))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.exception("No se pudo guardar un lote de la importación")
+            for numero, _ in pendientes:
+                self.rechazar(numero, f"Error al guardar el lote: {type(e).__name__}: {e}")
+            return
+        finally:
+            db.close()
+        self.pacientes.update(nuevos)
+        self.conteos["pacientes"] += len(ids)
+
+
+def importar(archivo, formato: str = "bundle", clinica: str = CLINICA_PREDETERMINADA, lote: int = IMPORTACION_LOTE):
+    if "b" in getattr(archivo, "mode", "b"):
+        # Decodificador incremental: un carácter puede quedar partido entre dos bloques
+        archivo = codecs.getreader("utf-8")(archivo)
+    return Importacion(clinica, lote).ejecutar(archivo, formato)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa Patients y Observations de un Bundle FHIR o NDJSON")
+    parser.add_argument("archivo")
+    parser.add_argument("--formato", choices=["bundle", "ndjson"], help="por defecto según la extensión")
+    parser.add_argument("--clinica", default=CLINICA_PREDETERMINADA)
+    parser.add_argument("--lote", type=int, default=IMPORTACION_LOTE)
+    args = parser.parse_args()
+    formato = args.formato or ("ndjson" if args.archivo.endswith(".ndjson") else "bundle")
+    with open(args.archivo, encoding="utf-8") as archivo:
+        reporte = importar(archivo, formato, args.clinica, args.lote)
+    json.dump(reporte, sys.stdout, indent=2, ensure_ascii=False, default=str)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
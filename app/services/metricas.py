@@ -0,0 +1,184 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Métricas en formato de texto de Prometheus, sin dependencias externas. Cada
+# proceso lleva sus propios contadores; con varios workers, Prometheus debe
+# consultar a cada uno.
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_SQL_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+BUCKETS_CONTEO = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_registro = []
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in pares) + "}"
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def incrementar(self, valor=1, **etiquetas):
+        clave = tuple(etiquetas[e] for e in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(etiquetas[e] for e in self.etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for clave, (conteos, suma, total) in sorted(self._series.items()):
+                for limite, conteo in zip(self.buckets, conteos):
+                    lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, [('le', limite)])} {conteo}")
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, [('le', '+Inf')])} {total}")
+                lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma}")
+                lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}")
+        return lineas
+
+
+def exponer():
+    return "\n".join(linea for metrica in _registro for linea in metrica.exponer()) + "\n"
+
+
+peticiones_total = Contador(
+    "http_peticiones_total", "Peticiones HTTP atendidas", ("metodo", "ruta", "estado")
+)
+peticion_duracion = Histograma(
+    "http_peticion_duracion_segundos", "Duración de las peticiones HTTP", ("metodo", "ruta")
+)
+sql_duracion = Histograma(
+    "sql_sentencia_duracion_segundos", "Duración de cada sentencia SQL", ("tipo",), BUCKETS_SQL_SEGUNDOS
+)
+sql_por_peticion = Histograma(
+    "sql_sentencias_por_peticion", "Sentencias SQL ejecutadas en cada petición", ("ruta",), BUCKETS_CONTEO
+)
+sql_tiempo_por_peticion = Histograma(
+    "sql_tiempo_por_peticion_segundos", "Tiempo total en SQL de cada petición", ("ruta",)
+)
+fhir_duracion = Histograma(
+    "fhir_peticion_duracion_segundos", "Duración de las llamadas al servidor FHIR", ("metodo", "recurso", "estado")
+)
+fhir_rechazos = Contador(
+    "fhir_llamadas_rechazadas_total", "Llamadas al servidor FHIR que no se hicieron por el interruptor o la concurrencia", ("motivo",)
+)
+outbox_eventos = Contador(
+    "outbox_eventos_total", "Eventos de la bandeja de salida procesados", ("resultado",)
+)
+
+# [sentencias, segundos] de la petición en curso; el middleware lo crea y los
+# eventos del motor lo actualizan desde el hilo que ejecute la consulta
+_sql_peticion = ContextVar("sql_peticion", default=None)
+
+
+def _tipo_sentencia(sentencia):
+    palabra = sentencia.lstrip().split(None, 1)[0].upper() if sentencia.strip() else ""
+    return palabra if palabra in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "otro"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_sentencia(conexion, cursor, sentencia, parametros, contexto, varios):
+    conexion.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_sentencia(conexion, cursor, sentencia, parametros, contexto, varios):
+    inicios = conexion.info.get("metricas_inicio")
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    sql_duracion.observar(duracion, tipo=_tipo_sentencia(sentencia))
+    actual = _sql_peticion.get()
+    if actual is not None:
+        actual[0] += 1
+        actual[1] += duracion
+
+
+@event.listens_for(Engine, "handle_error")
+def _error_de_sentencia(contexto):
+    # Una sentencia que falla no llega a after_cursor_execute
+    inicios = contexto.connection.info.get("metricas_inicio") if contexto.connection is not None else None
+    if inicios:
+        inicios.pop()
+
+
+def _ruta(scope):
+    # Se usa la plantilla de la ruta (/pacientes/{id_paciente}) para no crear
+    # una serie por cada id
+    ruta = scope.get("route")
+    return getattr(ruta, "path", None) or "sin_ruta"
+
+
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        estado = 500
+        sql = [0, 0.0]
+        token = _sql_peticion.set(sql)
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _sql_peticion.reset(token)
+            metodo, ruta = scope["method"], _ruta(scope)
+            peticion_duracion.observar(time.perf_counter() - inicio, metodo=metodo, ruta=ruta)
+            peticiones_total.incrementar(metodo=metodo, ruta=ruta, estado=str(estado))
+            sql_por_peticion.observar(sql[0], ruta=ruta)
+            sql_tiempo_por_peticion.observar(sql[1], ruta=ruta)
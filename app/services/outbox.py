@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+
+from config.database import clinica_de_sesion, engine, motores_clinicas
+from models.models import Consulta, EventoSalida, Expediente, Paciente
+from services import fhir_cliente, metricas
+from services.fhir_mapeo import construir_bundle_expediente, consulta_a_fhir, id_fhir, paciente_a_fhir
+from services.trazas import span
+
+logger = logging.getLogger(__name__)
+
+# Bandeja de salida transaccional hacia el servidor FHIR. El CRUD registra un
+# evento en la misma transacción que la escritura clínica; un hilo de fondo los
+# junta por paciente, lee el estado actual de cada registro y lo envía en un
+# Bundle de transacción con PUT/DELETE sobre ids estables, así que reenviar un
+# lote es idempotente. Si el envío falla los eventos se reintentan con espera
+# exponencial; tras OUTBOX_MAX_INTENTOS fallos quedan marcados como fallidos
+# (fallido_en) y ya no se reintentan. Solo se activa si se configura
+# FHIR_SERVER_URL; OUTBOX_FHIR=0 o 1 lo fuerza. Desactivado no se registran eventos.
+OUTBOX_FHIR = os.getenv("OUTBOX_FHIR", "1" if os.getenv("FHIR_SERVER_URL") else "0") == "1"
+OUTBOX_MAX_INTENTOS = int(os.getenv("OUTBOX_MAX_INTENTOS", "20"))
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", "200"))
+OUTBOX_INTERVALO = float(os.getenv("OUTBOX_INTERVALO", "5"))
+OUTBOX_ESPERA_BASE = float(os.getenv("OUTBOX_ESPERA_BASE", "2"))
+OUTBOX_ESPERA_MAXIMA = float(os.getenv("OUTBOX_ESPERA_MAXIMA", "300"))
+
+_despertar = threading.Event()
+
+
+def _ahora():
+    # Se guarda en UTC sin zona para que SQLite y PostgreSQL comparen igual
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def registrar_evento(db: Session, recurso: str, id_registro: int, id_paciente: int, operacion: str):
+    registrar_eventos(db, recurso, operacion, [(id_registro, id_paciente)])
+
+
+def registrar_eventos(db: Session, recurso: str, operacion: str, registros):
+    # registros: pares (id_registro, id_paciente); se insertan en una sola sentencia
+    if not OUTBOX_FHIR:
+        return
+    ahora = _ahora()
+    clinica = clinica_de_sesion(db)
+    filas = [
+        {
+            "id_clinica": clinica,
+            "recurso": recurso,
+            "id_registro": id_registro,
+            "id_paciente": id_paciente,
+            "operacion": operacion,
+            "creado_en": ahora,
+            "siguiente_intento": ahora,
+        }
+        for id_registro, id_paciente in registros
+    ]
+    if filas:
+        db.execute(insert(EventoSalida), filas)
+        db.info["outbox"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _avisar_despachador(db: Session):
+    if db.info.pop("outbox", None):
+        _despertar.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_aviso(db: Session):
+    db.info.pop("outbox", None)
+
+
+_tipos_expediente = None
+
+
+def tipos_expediente():
+    # construir_bundle_expediente siempre genera las mismas entradas en el mismo
+    # orden; se necesita su tipo para borrarlas cuando se elimina el expediente
+    global _tipos_expediente
+    if _tipos_expediente is None:
+        _tipos_expediente = [e["request"]["url"] for e in construir_bundle_expediente({}, "_").entry]
+    return _tipos_expediente
+
+
+def _put(recurso, tipo, id_recurso):
+    datos = json.loads(recurso.json()) if hasattr(recurso, "json") else dict(recurso)
+    datos["id"] = id_recurso
+    return {"resource": datos, "request": {"method": "PUT", "url": f"{tipo}/{id_recurso}"}}
+
+
+def _delete(tipo, id_recurso):
+    return {"request": {"method": "DELETE", "url": f"{tipo}/{id_recurso}"}}
+
+
+def _entradas_expediente(db, clinica, id_expediente, id_patient):
+    ids = [id_fhir(clinica, "exp", id_expediente, i) for i in range(len(tipos_expediente()))]
+    expediente = db.execute(
+        select(Expediente).where(Expediente.id_clinica == clinica, Expediente.id_expediente == id_expediente)
+    ).scalar_one_or_none()
+    if expediente is None:
+        return [_delete(tipo, id_recurso) for tipo, id_recurso in zip(tipos_expediente(), ids)]
+    try:
+        datos = json.loads(expediente.datos or "{}")
+    except ValueError:
+        logger.warning("El expediente %s de la clínica %s no tiene JSON válido; no se envía", id_expediente, clinica)
+        return []
+    bundle = construir_bundle_expediente(datos, id_patient)
+    return [
+        _put(entrada["resource"], entrada["request"]["url"], id_recurso)
+        for entrada, id_recurso in zip(bundle.entry, ids)
+    ]
+
+
+def _entradas_consulta(db, clinica, id_consulta, id_patient):
+    id_observacion = id_fhir(clinica, "consulta", id_consulta)
+    consulta = db.execute(
+        select(Consulta).where(Consulta.id_clinica == clinica, Consulta.id_consulta == id_consulta)
+    ).scalar_one_or_none()
+    if consulta is None:
+        return [_delete("Observation", id_observacion)]
+    return [_put(consulta_a_fhir(consulta, id_observacion, id_patient), "Observation", id_observacion)]
+
+
+def entradas_de_paciente(db: Session, clinica: str, id_paciente: int, eventos):
+    # Varios eventos del mismo registro se reducen a su estado actual
+    id_patient = id_fhir(clinica, id_paciente)
+    paciente = db.execute(
+        select(Paciente).where(Paciente.id_clinica == clinica, Paciente.id_paciente == id_paciente)
+    ).scalar_one_or_none()
+    if paciente is None:
+        # El servidor borra también los recursos que apuntan al paciente
+        return [{"request": {"method": "DELETE", "url": f"Patient/{id_patient}?_cascade=delete"}}]
+
+    # El Patient va siempre para que las referencias del lote sean válidas
+    entradas = [_put(paciente_a_fhir(paciente, id_patient), "Patient", id_patient)]
+    registros = {(e.recurso, e.id_registro) for e in eventos if e.recurso != "paciente"}
+    for recurso, id_registro in sorted(registros):
+        if recurso == "expediente":
+            entradas += _entradas_expediente(db, clinica, id_registro, id_patient)
+        elif recurso == "consulta":
+            entradas += _entradas_consulta(db, clinica, id_registro, id_patient)
+    return entradas
+
+
+def _enviar(entradas):
+    # Devuelve None si el servidor aceptó el lote, o (rechazado, mensaje)
+    with span("outbox.serializar_bundle"):
+        cuerpo = json.dumps({"resourceType": "Bundle", "type": "transaction", "entry": entradas}, default=str)
+    try:
+        respuesta = fhir_cliente.post(headers={"Content-Type": "application/fhir+json"}, data=cuerpo)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+    if respuesta.status_code >= 300:
+        return 400 <= respuesta.status_code < 500, f"{respuesta.status_code}: {respuesta.text[:500]}"
+    return None
+
+
+def despachar(motor, lote: int = OUTBOX_LOTE):
+    # Procesa un lote de eventos pendientes de un motor; devuelve cuántos se enviaron
+    ahora = _ahora()
+    with Session(motor) as db, span("outbox.despachar", atributos={"db.motor": str(motor.url)}):
+        # SKIP LOCKED deja que varios procesos despachen a la vez sin repetir eventos
+        eventos = db.execute(
+            select(EventoSalida)
+            .where(EventoSalida.fallido_en.is_(None), EventoSalida.siguiente_intento <= ahora)
+            .order_by(EventoSalida.id_evento)
+            .limit(lote)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not eventos:
+            return 0
+
+        grupos = defaultdict(list)
+        for evento in eventos:
+            grupos[(evento.id_clinica, evento.id_paciente)].append(evento)
+        entradas = {
+            (clinica, id_paciente): entradas_de_paciente(db, clinica, id_paciente, eventos_paciente)
+            for (clinica, id_paciente), eventos_paciente in grupos.items()
+        }
+
+        error = _enviar([e for lista in entradas.values() for e in lista])
+        if error is None:
+            fallidos = {}
+        elif error[0] and len(grupos) > 1:
+            # El servidor rechazó el lote: se reenvía por paciente para que uno
+            # inválido no detenga a los demás
+            fallidos = {}
+            for clave, lista in entradas.items():
+                error_paciente = _enviar(lista)
+                if error_paciente is not None:
+                    fallidos[clave] = error_paciente[1]
+        else:
+            fallidos = {clave: error[1] for clave in grupos}
+
+        enviados = [e.id_evento for clave, lista in grupos.items() if clave not in fallidos for e in lista]
+        if enviados:
+            db.execute(delete(EventoSalida).where(EventoSalida.id_evento.in_(enviados)))
+        descartados = 0
+        for clave, mensaje in fallidos.items():
+            logger.warning("No se pudieron enviar al servidor FHIR los cambios del paciente %s/%s: %s", *clave, mensaje)
+            for evento in grupos[clave]:
+                evento.intentos += 1
+                evento.ultimo_error = mensaje
+                if evento.intentos >= OUTBOX_MAX_INTENTOS:
+                    evento.fallido_en = ahora
+                    descartados += 1
+                    continue
+                espera = min(OUTBOX_ESPERA_MAXIMA, OUTBOX_ESPERA_BASE * 2 ** (evento.intentos - 1))
+                evento.siguiente_intento = ahora + timedelta(seconds=espera)
+        db.commit()
+
+    if descartados:
+        logger.error("%s eventos de la bandeja de salida se marcaron como fallidos tras %s intentos",
+                     descartados, OUTBOX_MAX_INTENTOS)
+    metricas.outbox_eventos.incrementar(len(enviados), resultado="enviado")
+    metricas.outbox_eventos.incrementar(len(eventos) - len(enviados) - descartados, resultado="reintento")
+    metricas.outbox_eventos.incrementar(descartados, resultado="fallido")
+    return len(enviados)
+
+
+def motores():
+    # La base principal y cada base o esquema de clínica tienen su propia bandeja
+    return [engine, *motores_clinicas.values()]
+
+
+class Despachador:
+    def __init__(self, intervalo: float = OUTBOX_INTERVALO, lote: int = OUTBOX_LOTE):
+        self.intervalo = intervalo
+        self.lote = lote
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name="outbox-fhir", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is None:
+            return
+        self._detener.set()
+        _despertar.set()
+        self._hilo.join(timeout=10)
+        self._hilo = None
+
+    def _ciclo(self):
+        # Despierta al confirmarse una escritura con eventos o cada `intervalo`
+        # segundos para los reintentos y los eventos de otros procesos
+        while not self._detener.is_set():
+            _despertar.wait(self.intervalo)
+            _despertar.clear()
+            for motor in motores():
+                try:
+                    while not self._detener.is_set() and despachar(motor, self.lote) >= self.lote:
+                        pass
+                except Exception:
+                    logger.exception("Error al despachar la bandeja de salida de %s", motor.url)
+
+
+despachador = Despachador()
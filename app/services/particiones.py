@@ -0,0 +1,84 @@
+import logging
+import threading
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+from sqlalchemy.orm import Session
+
+from config.database import PARTICIONADO, PARTICIONES_FECHA
+
+logger = logging.getLogger(__name__)
+
+TABLAS_PARTICIONADAS = ("consulta", "medidas_musculos", "medidas_huesos")
+MESES_ATRAS = 12
+MESES_ADELANTE = 3
+
+_creadas = set()
+_lock = threading.Lock()
+
+
+def _sumar_meses(fecha: date, meses: int):
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def rango_particion(fecha: date):
+    if PARTICIONES_FECHA == "anual":
+        inicio = date(fecha.year, 1, 1)
+        return inicio, date(fecha.year + 1, 1, 1), f"{fecha.year}"
+    inicio = date(fecha.year, fecha.month, 1)
+    return inicio, _sumar_meses(inicio, 1), f"{fecha.year}_{fecha.month:02d}"
+
+
+def crear_particion(motor, tabla: str, fecha: date):
+    if not PARTICIONADO or fecha is None:
+        return
+    inicio, fin, sufijo = rango_particion(fecha)
+    nombre = f"{tabla}_{sufijo}"
+    # Las clínicas con esquema propio tienen sus propias tablas particionadas
+    esquema = (motor.get_execution_options().get("schema_translate_map") or {}).get(None)
+    if esquema:
+        tabla, nombre = f"{esquema}.{tabla}", f"{esquema}.{nombre}"
+    clave = (str(motor.url), nombre)
+    if clave in _creadas:
+        return
+    with _lock:
+        if clave in _creadas:
+            return
+        # Conexión aparte: el DDL toma un candado fuerte sobre la tabla padre y no
+        # debe quedar abierto hasta el final de la transacción de la petición
+        try:
+            with motor.begin() as conexion:
+                conexion.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {nombre} PARTITION OF {tabla} "
+                    f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fin.isoformat()}')"
+                ))
+        except (ProgrammingError, IntegrityError) as e:
+            # Normalmente otro proceso la creó al mismo tiempo; si no existe es
+            # otro problema (p. ej. rangos traslapados tras cambiar
+            # PARTICIONES_FECHA) y se vuelve a intentar en la siguiente inserción
+            if not _existe(motor, nombre):
+                logger.error("No se pudo crear la partición %s: %s", nombre, e.orig)
+                return
+        _creadas.add(clave)
+
+
+def _existe(motor, nombre: str):
+    with motor.connect() as conexion:
+        return conexion.execute(text("SELECT to_regclass(:nombre)"), {"nombre": nombre}).scalar() is not None
+
+
+def asegurar_particion(db: Session, tabla: str, fecha: date | None):
+    if PARTICIONADO and fecha is not None:
+        crear_particion(db.get_bind(), tabla, fecha)
+
+
+def crear_particiones_iniciales(motor, hoy: date | None = None):
+    if not PARTICIONADO:
+        return
+    hoy = hoy or date.today()
+    paso = 12 if PARTICIONES_FECHA == "anual" else 1
+    for tabla in TABLAS_PARTICIONADAS:
+        for meses in range(-MESES_ATRAS, MESES_ADELANTE + 1, paso):
+            crear_particion(motor, tabla, _sumar_meses(hoy, meses))
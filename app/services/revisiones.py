@@ -0,0 +1,90 @@
+import copy
+import json
+import os
+
+# Diferencias JSON al estilo RFC 6902 para el historial de expedientes. Solo se
+# generan operaciones add, remove y replace; las listas se comparan posición
+# por posición y lo que sobra o falta al final se agrega o se quita.
+#
+# Se guarda el documento completo en la primera revisión, cada
+# REVISIONES_INSTANTANEA versiones y cuando la diferencia ocupa más de la mitad
+# del documento; así reconstruir una versión nunca aplica más de
+# REVISIONES_INSTANTANEA diferencias.
+REVISIONES_INSTANTANEA = int(os.getenv("REVISIONES_INSTANTANEA", "20"))
+
+
+def _escapar(clave):
+    return str(clave).replace("~", "~0").replace("/", "~1")
+
+
+def _desescapar(parte):
+    return parte.replace("~1", "/").replace("~0", "~")
+
+
+def diferencias(anterior, nuevo, ruta: str = ""):
+    if isinstance(anterior, dict) and isinstance(nuevo, dict):
+        operaciones = []
+        for clave in anterior:
+            if clave not in nuevo:
+                operaciones.append({"op": "remove", "path": f"{ruta}/{_escapar(clave)}"})
+        for clave, valor in nuevo.items():
+            if clave not in anterior:
+                operaciones.append({"op": "add", "path": f"{ruta}/{_escapar(clave)}", "value": valor})
+            else:
+                operaciones.extend(diferencias(anterior[clave], valor, f"{ruta}/{_escapar(clave)}"))
+        return operaciones
+    if isinstance(anterior, list) and isinstance(nuevo, list):
+        operaciones = []
+        for i in range(min(len(anterior), len(nuevo))):
+            operaciones.extend(diferencias(anterior[i], nuevo[i], f"{ruta}/{i}"))
+        for i in range(len(anterior), len(nuevo)):
+            operaciones.append({"op": "add", "path": f"{ruta}/{i}", "value": nuevo[i]})
+        # Se quita de atrás hacia adelante para que los índices sigan siendo válidos
+        for i in range(len(anterior) - 1, len(nuevo) - 1, -1):
+            operaciones.append({"op": "remove", "path": f"{ruta}/{i}"})
+        return operaciones
+    if anterior != nuevo or type(anterior) is not type(nuevo):
+        return [{"op": "replace", "path": ruta, "value": nuevo}]
+    return []
+
+
+def aplicar(documento, operaciones):
+    documento = copy.deepcopy(documento)
+    for operacion in operaciones:
+        partes = [_desescapar(p) for p in operacion["path"].split("/")[1:]]
+        if not partes:
+            # La ruta vacía es el documento completo
+            documento = copy.deepcopy(operacion.get("value"))
+            continue
+        padre = documento
+        for parte in partes[:-1]:
+            padre = padre[int(parte)] if isinstance(padre, list) else padre[parte]
+        ultima = partes[-1]
+        if isinstance(padre, list):
+            indice = len(padre) if ultima == "-" else int(ultima)
+            if operacion["op"] == "add":
+                padre.insert(indice, copy.deepcopy(operacion["value"]))
+            elif operacion["op"] == "remove":
+                del padre[indice]
+            else:
+                padre[indice] = copy.deepcopy(operacion["value"])
+        elif operacion["op"] == "remove":
+            del padre[ultima]
+        else:
+            padre[ultima] = copy.deepcopy(operacion["value"])
+    return documento
+
+
+def a_json(datos):
+    # `datos` es texto libre del front; si está vacío o no es JSON válido no
+    # hay diferencia posible y se guarda el texto completo
+    if datos is None:
+        return None, False
+    try:
+        return json.loads(datos), True
+    except ValueError:
+        return None, False
+
+
+def compactar(operaciones):
+    return json.dumps(operaciones, ensure_ascii=False, separators=(",", ":"))
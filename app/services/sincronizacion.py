@@ -0,0 +1,106 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from config.database import clinica_de_sesion
+from models.models import Cambio, SecuenciaCambios
+
+# Bitácora de cambios para la sincronización de las tabletas. El CRUD anota cada
+# alta, cambio o baja en la sesión y justo antes del COMMIT se reserva un bloque
+# de secuencias en el contador de la clínica y se insertan los cambios. El
+# UPDATE del contador bloquea su fila hasta que termina el COMMIT, así que las
+# secuencias quedan visibles en orden y un cliente que pide "desde N" nunca se
+# salta un cambio que se confirmó tarde. Solo se serializa el último paso de
+# cada transacción de escritura, no la transacción completa.
+CAMBIOS_DIAS = float(os.getenv("CAMBIOS_DIAS", "90"))
+CAMBIOS_PURGA_SEGUNDOS = 3600
+
+_ultima_purga = {}
+
+
+def _ahora():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def registrar_cambios(db: Session, tabla: str, operacion: str, registros):
+    # registros: pares (id_registro, id_paciente)
+    db.info.setdefault("cambios", []).extend(
+        (tabla, id_registro, id_paciente, operacion) for id_registro, id_paciente in registros
+    )
+
+
+def _crear_contador(db: Session, clinica: str):
+    dialecto = {"postgresql": postgresql, "sqlite": sqlite}[db.get_bind().dialect.name]
+    db.execute(dialecto.insert(SecuenciaCambios).values(id_clinica=clinica).on_conflict_do_nothing())
+
+
+def _reservar(db: Session, clinica: str, cantidad: int):
+    # Devuelve la última secuencia del bloque reservado
+    consulta = (
+        update(SecuenciaCambios)
+        .where(SecuenciaCambios.id_clinica == clinica)
+        .values(valor=SecuenciaCambios.valor + cantidad)
+        .returning(SecuenciaCambios.valor)
+    )
+    opciones = {"synchronize_session": False}
+    valor = db.execute(consulta, execution_options=opciones).scalar_one_or_none()
+    if valor is None:
+        _crear_contador(db, clinica)
+        valor = db.execute(consulta, execution_options=opciones).scalar_one()
+    return valor
+
+
+def _purgar(db: Session, clinica: str):
+    # Se aprovecha que la fila del contador ya está bloqueada por esta transacción
+    ahora = time.monotonic()
+    ultima = _ultima_purga.get(clinica)
+    if ultima is not None and ahora - ultima < CAMBIOS_PURGA_SEGUNDOS:
+        return
+    _ultima_purga[clinica] = ahora
+    limite = _ahora() - timedelta(days=CAMBIOS_DIAS)
+    hasta = db.execute(
+        select(func.max(Cambio.secuencia)).where(Cambio.id_clinica == clinica, Cambio.creado_en < limite)
+    ).scalar()
+    if hasta is None:
+        return
+    db.execute(delete(Cambio).where(Cambio.id_clinica == clinica, Cambio.secuencia <= hasta))
+    db.execute(
+        update(SecuenciaCambios).where(SecuenciaCambios.id_clinica == clinica).values(purgado_hasta=hasta),
+        execution_options={"synchronize_session": False},
+    )
+
+
+@event.listens_for(Session, "before_commit")
+def _guardar_cambios(db: Session):
+    pendientes = db.info.pop("cambios", None)
+    if not pendientes:
+        return
+    clinica = clinica_de_sesion(db)
+    ultima = _reservar(db, clinica, len(pendientes))
+    primera = ultima - len(pendientes) + 1
+    creado_en = _ahora()
+    filas = [
+        {
+            "id_clinica": clinica,
+            "secuencia": primera + i,
+            "tabla": tabla,
+            "id_registro": id_registro,
+            "id_paciente": id_paciente,
+            "operacion": operacion,
+            "creado_en": creado_en,
+        }
+        for i, (tabla, id_registro, id_paciente, operacion) in enumerate(pendientes)
+    ]
+    db.execute(insert(Cambio), filas)
+    _purgar(db, clinica)
+    # services/eventos.py los difunde a los clientes suscritos
+    db.info["cambios_guardados"] = (clinica, filas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_cambios(db: Session):
+    db.info.pop("cambios", None)
@@ -0,0 +1,248 @@
+import functools
+import json
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Trazas al estilo OpenTelemetry: un span por petición, por llamada al CRUD, por
+# decodificación y armado de recursos FHIR y por cada llamada al servidor FHIR.
+# El contexto se propaga con el encabezado W3C `traceparent`. Exportadores:
+# "consola", "archivo" (JSON por línea) u "otlp" (OTLP/HTTP JSON, p. ej. un
+# collector local); sin TRAZAS_EXPORTADOR no se registra nada.
+TRAZAS_EXPORTADOR = os.getenv("TRAZAS_EXPORTADOR", "")
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "trazas.jsonl")
+TRAZAS_OTLP_URL = os.getenv("TRAZAS_OTLP_URL", "http://localhost:4318/v1/traces")
+TRAZAS_SERVICIO = os.getenv("TRAZAS_SERVICIO", "api-nutriologa")
+
+TIPOS_OTLP = {"interno": 1, "servidor": 2, "cliente": 3}
+
+_actual = ContextVar("span_actual", default=None)
+
+
+class Span:
+    def __init__(self, nombre, tipo="interno", padre=None, trace_id=None, parent_id=None, atributos=None):
+        self.nombre = nombre
+        self.tipo = tipo
+        self.trace_id = padre.trace_id if padre else trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = padre.span_id if padre else parent_id
+        # Todos los spans de la traza se juntan para exportarlos al cerrar la raíz
+        self.spans = padre.spans if padre else []
+        self.raiz = padre is None
+        self.atributos = dict(atributos or {})
+        self.error = None
+        self.inicio_ns = time.time_ns()
+        self.fin_ns = None
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def terminar(self):
+        self.fin_ns = time.time_ns()
+        self.spans.append(self)
+        if self.raiz:
+            exportador.exportar(list(self.spans))
+
+    def a_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "nombre": self.nombre,
+            "tipo": self.tipo,
+            "inicio_ns": self.inicio_ns,
+            "duracion_ms": round((self.fin_ns - self.inicio_ns) / 1e6, 3),
+            "atributos": self.atributos,
+            "error": self.error,
+        }
+
+
+def span_actual():
+    return _actual.get()
+
+
+@contextmanager
+def span(nombre, tipo="interno", atributos=None):
+    if exportador is None:
+        yield None
+        return
+    nuevo = Span(nombre, tipo, padre=_actual.get(), atributos=atributos)
+    token = _actual.set(nuevo)
+    try:
+        yield nuevo
+    except BaseException as e:
+        nuevo.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _actual.reset(token)
+        nuevo.terminar()
+
+
+def trazado(nombre=None):
+    # Decorador para registrar un span por cada llamada a la función
+    def decorar(funcion):
+        etiqueta = nombre or f"{funcion.__module__}.{funcion.__name__}"
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if exportador is None:
+                return funcion(*args, **kwargs)
+            with span(etiqueta):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorar
+
+
+def leer_traceparent(valor):
+    # Devuelve (trace_id, parent_id) de un encabezado traceparent válido
+    partes = (valor or "").strip().split("-")
+    if len(partes) != 4 or len(partes[1]) != 32 or len(partes[2]) != 16:
+        return None, None
+    trace_id, parent_id = partes[1].lower(), partes[2].lower()
+    try:
+        int(trace_id, 16), int(parent_id, 16)
+    except ValueError:
+        return None, None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None, None
+    return trace_id, parent_id
+
+
+class ExportadorConsola:
+    def exportar(self, spans):
+        for s in spans:
+            sys.stdout.write(json.dumps(s.a_dict(), default=str) + "\n")
+        sys.stdout.flush()
+
+
+class ExportadorArchivo:
+    def __init__(self, ruta=TRAZAS_ARCHIVO):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+    def exportar(self, spans):
+        lineas = "".join(json.dumps(s.a_dict(), default=str) + "\n" for s in spans)
+        with self._lock, open(self.ruta, "a", encoding="utf-8") as archivo:
+            archivo.write(lineas)
+
+
+class ExportadorOtlp:
+    # Envía en segundo plano, por lotes, para no sumar la exportación a la petición
+    def __init__(self, url=TRAZAS_OTLP_URL, lote=256, intervalo=2.0):
+        self.url = url
+        self.lote = lote
+        self.intervalo = intervalo
+        self._cola = queue.Queue(maxsize=10000)
+        threading.Thread(target=self._enviar_continuamente, daemon=True).start()
+
+    def exportar(self, spans):
+        for s in spans:
+            try:
+                self._cola.put_nowait(s)
+            except queue.Full:
+                return
+
+    def _enviar_continuamente(self):
+        while True:
+            pendientes = [self._cola.get()]
+            limite = time.monotonic() + self.intervalo
+            while len(pendientes) < self.lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    pendientes.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            try:
+                self._enviar(pendientes)
+            except Exception as e:
+                logger.warning("No se pudieron exportar %d spans a %s: %s", len(pendientes), self.url, e)
+
+    def _enviar(self, spans):
+        cuerpo = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRAZAS_SERVICIO}}]},
+            "scopeSpans": [{"scope": {"name": "services.trazas"}, "spans": [self._a_otlp(s) for s in spans]}],
+        }]}
+        peticion = urllib.request.Request(
+            self.url, data=json.dumps(cuerpo).encode(), headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(peticion, timeout=5):
+            pass
+
+    @staticmethod
+    def _a_otlp(s):
+        otlp = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.nombre,
+            "kind": TIPOS_OTLP[s.tipo],
+            "startTimeUnixNano": str(s.inicio_ns),
+            "endTimeUnixNano": str(s.fin_ns),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in s.atributos.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            otlp["parentSpanId"] = s.parent_id
+        return otlp
+
+
+def _crear_exportador():
+    if TRAZAS_EXPORTADOR == "consola":
+        return ExportadorConsola()
+    if TRAZAS_EXPORTADOR == "archivo":
+        return ExportadorArchivo()
+    if TRAZAS_EXPORTADOR == "otlp":
+        return ExportadorOtlp()
+    return None
+
+
+exportador = _crear_exportador()
+
+
+class MiddlewareTrazas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or exportador is None:
+            await self.app(scope, receive, send)
+            return
+        encabezados = dict(scope["headers"])
+        trace_id, parent_id = leer_traceparent(encabezados.get(b"traceparent", b"").decode("latin-1"))
+        raiz = Span(
+            f"{scope['method']} {scope['path']}", "servidor", trace_id=trace_id, parent_id=parent_id,
+            atributos={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        token = _actual.set(raiz)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                raiz.atributos["http.status_code"] = mensaje["status"]
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [
+                    (b"traceresponse", raiz.traceparent().encode()),
+                    (b"x-trace-id", raiz.trace_id.encode()),
+                ]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        except BaseException as e:
+            raiz.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _actual.reset(token)
+            ruta = getattr(scope.get("route"), "path", None)
+            if ruta:
+                raiz.nombre = f"{scope['method']} {ruta}"
+                raiz.atributos["http.route"] = ruta
+            raiz.terminar()
@@ -0,0 +1,68 @@
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from config.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class UnidadDeTrabajo:
+    # La sesión se crea al primer uso, así las peticiones que no tocan la base
+    # (p. ej. un 304 por ETag) no abren conexión
+    def __init__(self):
+        self.db = None
+
+    def sesion(self):
+        if self.db is None:
+            self.db = SessionLocal()
+        return self.db
+
+    def terminar(self, confirmar: bool):
+        if self.db is None:
+            return
+        db, self.db = self.db, None
+        try:
+            if confirmar:
+                db.commit()
+            else:
+                db.rollback()
+        finally:
+            db.close()
+
+
+class MiddlewareUnidadDeTrabajo:
+    # Confirma la transacción de la petición antes de enviar la respuesta: un
+    # error al confirmar se reporta como 500 en lugar de perderse después de
+    # haber respondido 200. Las respuestas con estado >= 400 se revierten.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        unidad = UnidadDeTrabajo()
+        scope.setdefault("state", {})["unidad_de_trabajo"] = unidad
+        fallo = False
+
+        async def enviar(mensaje):
+            nonlocal fallo
+            if fallo:
+                return
+            if mensaje["type"] == "http.response.start":
+                try:
+                    await run_in_threadpool(unidad.terminar, mensaje["status"] < 400)
+                except Exception:
+                    logger.exception("No se pudo confirmar la transacción de la petición")
+                    fallo = True
+                    respuesta = JSONResponse(status_code=500, content={"detail": "No se pudieron guardar los cambios"})
+                    await respuesta(scope, receive, send)
+                    return
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            await run_in_threadpool(unidad.terminar, False)
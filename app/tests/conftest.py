@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Las pruebas importan los módulos igual que la API (desde app/) y usan una
+# base SQLite temporal; DATABASE_URL se lee al importar config.database
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "pruebas.db")
+os.environ["OUTBOX_FHIR"] = "0"
+
+import main  # noqa: E402  crea las tablas
+from config.database import SessionLocal  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.rollback()
+        sesion.close()
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+import crud.revision_expediente_crud as revision_expediente_crud
+from crud.expediente_crud import create_expediente, update_expediente
+from crud.paciente_crud import create_paciente
+from crud.revision_expediente_crud import get_version_expediente
+from schemas.schemas import ExpedienteCreate, ExpedientePatch, PacienteCreate
+from services.revisiones import aplicar, diferencias
+
+
+@pytest.mark.parametrize("anterior, nuevo", [
+    # Listas que se acortan, también dentro de otra lista
+    ({"notas": [1, 2, 3, 4, 5]}, {"notas": [1]}),
+    ([{"x": 1}, {"x": 2}, {"x": 3}], [{"x": 9}]),
+    ({"a": [[1, 2, 3], [4]]}, {"a": [[1]]}),
+    ({"a": [1]}, {"a": [1, 2, 3]}),
+    # Claves con "~" y "/"
+    ({"a/b": 1, "c~d": {"~1": 2}}, {"a/b": 2, "c~d": {"~1": 3, "e/~f": 4}}),
+    ({"~0/~1": [1, 2]}, {}),
+    # Cambio de tipo en la raíz y dentro del documento
+    ({"a": 1}, [1, 2]),
+    ([1, 2], "texto"),
+    (None, {"a": 1}),
+    ({"a": {"b": 1}}, {"a": [1]}),
+    ({"a": "1"}, {"a": 1}),
+])
+def test_aplicar_diferencias_devuelve_el_nuevo(anterior, nuevo):
+    assert aplicar(anterior, diferencias(anterior, nuevo)) == nuevo
+
+
+def test_las_listas_se_recortan_de_atras_hacia_adelante():
+    operaciones = diferencias({"a": [1, 2, 3, 4]}, {"a": [1]})
+    assert [o["path"] for o in operaciones] == ["/a/3", "/a/2", "/a/1"]
+
+
+def test_aplicar_no_modifica_el_documento():
+    anterior = {"a": [1, 2, 3], "b": {"c": 1}}
+    aplicar(anterior, diferencias(anterior, {"a": [], "b": {"c": 2}}))
+    assert anterior == {"a": [1, 2, 3], "b": {"c": 1}}
+
+
+def test_get_version_expediente_cruza_instantaneas(db, monkeypatch):
+    monkeypatch.setattr(revision_expediente_crud, "REVISIONES_INSTANTANEA", 3)
+    paciente = create_paciente(db, PacienteCreate(nombre="Prueba Revisiones"))
+    datos = {
+        "antecedentes": {"familiares": "diabetes", "alergias/otros": "ninguna"},
+        "habitos": ["agua", "caminar", "leer", "dormir"],
+        "notas": "texto largo para que cada cambio sea menor a la mitad del documento " * 3,
+    }
+    expediente = create_expediente(db, ExpedienteCreate(id_paciente=paciente.id_paciente, datos=json.dumps(datos)))
+    versiones = {expediente.version: json.loads(json.dumps(datos))}
+    for i in range(10):
+        datos["antecedentes"]["familiares"] = f"revisión {i}"
+        if i % 3 == 0:
+            datos["habitos"].pop()
+        else:
+            datos["habitos"].append(f"hábito {i}")
+        expediente = update_expediente(
+            db, expediente.id_expediente, ExpedientePatch(datos=json.dumps(datos, ensure_ascii=False)), parcial=True
+        )
+        versiones[expediente.version] = json.loads(json.dumps(datos))
+
+    revisiones = db.query(revision_expediente_crud.models).filter_by(id_expediente=expediente.id_expediente).all()
+    instantaneas = [r.version for r in revisiones if r.diferencia is None]
+    assert len(instantaneas) > 1 and len(instantaneas) < len(revisiones)
+
+    for version, esperado in versiones.items():
+        revision, texto = get_version_expediente(db, expediente.id_expediente, version)
+        assert revision.version == version
+        assert json.loads(texto) == esperado
+    assert get_version_expediente(db, expediente.id_expediente, 0) is None